@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class PersonnelBackend(ModelBackend):
+    """
+    Backend d'authentification qui charge le profil personnel avec l'utilisateur.
+
+    L'utilisateur de chaque requête est récupéré avec select_related('personnel'),
+    ce qui évite une requête supplémentaire à chaque lecture de user.personnel.
+    """
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('personnel').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
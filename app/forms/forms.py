@@ -8,6 +8,10 @@ from ..models import (
     MouvementStock, Prescription, LignePrescription, Facture, LigneFacture,
     Personnel
 )
+from ..services.disponibilite import fin_rdv, rdv_chevauchants
+from ..services.agenda import HORS_HORAIRES, etat_creneau
+from ..services.reservation import FREQUENCE_CHOICES, OCCURRENCES_MAX, occurrences, verifier_serie
+from ..services.stock import enregistrer_mouvement
 
 # --------------------------------------------------------
 # Formulaires d'authentification et de gestion utilisateur
@@ -177,7 +181,7 @@ class RendezVousForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Filtrer les médecins uniquement
-        self.fields['medecin'].queryset = Personnel.objects.filter(role='MEDECIN')
+        self.fields['medecin'].queryset = Personnel.objects.avec_relations().filter(role='MEDECIN')
         
     def clean_date_heure(self):
         date_heure = self.cleaned_data.get('date_heure')
@@ -192,21 +196,59 @@ class RendezVousForm(forms.ModelForm):
         medecin = cleaned_data.get('medecin')
         
         if date_heure and duree and medecin:
-            # Vérifier la disponibilité du médecin
-            fin_rdv = date_heure + timezone.timedelta(minutes=duree)
-            
-            rdv_conflits = RendezVous.objects.filter(
-                medecin=medecin,
-                date_heure__lt=fin_rdv,
-                statut__in=['PLANIFIE', 'CONFIRME']
-            ).exclude(pk=self.instance.pk if self.instance.pk else None)
-            
-            for rdv in rdv_conflits:
-                fin_existant = rdv.date_heure + timezone.timedelta(minutes=rdv.duree)
-                if fin_existant > date_heure:
-                    raise forms.ValidationError(
-                        f"Le médecin a déjà un rendez-vous prévu à cette heure."
-                    )
+            # Vérifier la disponibilité du médecin (voir services/disponibilite.py)
+            fin = fin_rdv(date_heure, duree)
+            # Les horaires ne sont contrôlés que si le créneau change, pour ne pas
+            # bloquer la mise à jour d'un rendez-vous pris avant un changement de planning
+            creneau_modifie = not self.instance.pk or {'date_heure', 'duree', 'medecin'} & set(self.changed_data)
+            if creneau_modifie and etat_creneau(medecin.pk, date_heure, fin) == HORS_HORAIRES:
+                raise forms.ValidationError(
+                    "Le médecin ne consulte pas à cette heure."
+                )
+            if rdv_chevauchants(medecin.pk, date_heure, fin, exclure=self.instance.pk).exists():
+                raise forms.ValidationError(
+                    f"Le médecin a déjà un rendez-vous prévu à cette heure."
+                )
+        
+        return cleaned_data
+
+
+class SerieRendezVousForm(RendezVousForm):
+    """Formulaire de création d'une série de rendez-vous récurrents (suivis chroniques)"""
+    frequence = forms.ChoiceField(
+        choices=FREQUENCE_CHOICES, initial='HEBDOMADAIRE',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    intervalle = forms.IntegerField(
+        min_value=1, max_value=12, initial=1,
+        help_text="Répéter tous les N jours, semaines ou mois",
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    nombre = forms.IntegerField(
+        min_value=2, max_value=OCCURRENCES_MAX, initial=4,
+        help_text="Nombre de rendez-vous de la série",
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    
+    def clean(self):
+        # La vérification unitaire de RendezVousForm est remplacée par celle de la série
+        cleaned_data = super(RendezVousForm, self).clean()
+        date_heure = cleaned_data.get('date_heure')
+        duree = cleaned_data.get('duree')
+        medecin = cleaned_data.get('medecin')
+        frequence = cleaned_data.get('frequence')
+        intervalle = cleaned_data.get('intervalle')
+        nombre = cleaned_data.get('nombre')
+        
+        self.debuts = []
+        if date_heure and duree and medecin and frequence and intervalle and nombre:
+            self.debuts = occurrences(date_heure, frequence, intervalle, nombre)
+            erreurs = verifier_serie(medecin.pk, self.debuts, duree)
+            if erreurs:
+                raise forms.ValidationError([
+                    f"{timezone.localtime(self.debuts[position]).strftime('%d/%m/%Y à %H:%M')} : {message}"
+                    for position, message in sorted(erreurs.items())
+                ])
         
         return cleaned_data
 
@@ -306,9 +348,10 @@ class MedicamentForm(forms.ModelForm):
     
     class Meta:
         model = Medicament
-        fields = ('nom', 'description', 'categorie', 'fabricant', 'prix_unitaire')
+        fields = ('nom', 'code', 'description', 'categorie', 'fabricant', 'prix_unitaire')
         widgets = {
             'nom': forms.TextInput(attrs={'class': 'form-control'}),
+            'code': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'categorie': forms.TextInput(attrs={'class': 'form-control'}),
             'fabricant': forms.TextInput(attrs={'class': 'form-control'}),
@@ -357,6 +400,7 @@ class MouvementStockForm(forms.ModelForm):
         quantite = cleaned_data.get('quantite')
         type_mouvement = cleaned_data.get('type_mouvement')
         
+        # Vérification indicative : le stock est revérifié par l'UPDATE conditionnel à l'enregistrement
         if medicament and quantite and type_mouvement == 'SORTIE':
             try:
                 stock = StockMedicament.objects.get(medicament=medicament)
@@ -370,31 +414,16 @@ class MouvementStockForm(forms.ModelForm):
         return cleaned_data
     
     def save(self, commit=True):
+        """
+        Enregistre le mouvement et met à jour le stock en une transaction.
+        Lève StockInsuffisant si le stock a baissé depuis la validation.
+        """
         mouvement = super().save(commit=False)
         if self.personnel:
             mouvement.personnel = self.personnel
         
         if commit:
-            mouvement.save()
-            
-            # Mettre à jour le stock
-            medicament = mouvement.medicament
-            try:
-                stock = StockMedicament.objects.get(medicament=medicament)
-                
-                if mouvement.type_mouvement == 'ENTREE':
-                    stock.quantite += mouvement.quantite
-                else:  # SORTIE
-                    stock.quantite -= mouvement.quantite
-                
-                stock.save()
-            except StockMedicament.DoesNotExist:
-                if mouvement.type_mouvement == 'ENTREE':
-                    StockMedicament.objects.create(
-                        medicament=medicament,
-                        quantite=mouvement.quantite,
-                        seuil_alerte=5
-                    )
+            enregistrer_mouvement(mouvement)
         
         return mouvement
 
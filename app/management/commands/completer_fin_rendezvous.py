@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app.models import RendezVous
+
+
+class Command(BaseCommand):
+    help = "Renseigne la date de fin (date_fin) des rendez-vous qui n'en ont pas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lot', type=int, default=1000, help="Nombre de rendez-vous mis à jour par requête")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            lot = list(
+                RendezVous.objects.filter(date_fin__isnull=True)
+                .only('pk', 'date_heure', 'duree')[:options['lot']]
+            )
+            if not lot:
+                break
+            for rdv in lot:
+                rdv.date_fin = rdv.calculer_date_fin()
+            RendezVous.objects.bulk_update(lot, ['date_fin'])
+            total += len(lot)
+        self.stdout.write(self.style.SUCCESS(f"{total} rendez-vous mis à jour."))
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.services.historique_stock import enregistrer_instantanes, reconstruire_instantanes
+
+
+class Command(BaseCommand):
+    help = (
+        "Enregistre les stocks de fin de journée (par défaut ceux de la veille, à lancer chaque nuit), "
+        "ou reconstruit les instantanés depuis l'historique des mouvements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jour', help="Jour à enregistrer (AAAA-MM-JJ), par défaut la veille")
+        parser.add_argument(
+            '--reconstruire', action='store_true',
+            help="Recalcule les instantanés de tous les jours comportant des mouvements"
+        )
+        parser.add_argument('--debut', help="Avec --reconstruire : premier jour recalculé (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        try:
+            jour = self._parse_date(options['jour'])
+            debut = self._parse_date(options['debut'])
+        except ValueError:
+            raise CommandError("Format de date invalide, utilisez AAAA-MM-JJ.")
+        
+        if options['reconstruire']:
+            nombre = reconstruire_instantanes(debut)
+            depuis = f" depuis le {debut:%d/%m/%Y}" if debut else ""
+            self.stdout.write(self.style.SUCCESS(f"{nombre} instantané(s) de stock reconstruit(s){depuis}."))
+            return
+        
+        jour = jour or timezone.localdate() - timedelta(days=1)
+        if jour >= timezone.localdate():
+            raise CommandError("Seule une journée terminée peut être enregistrée.")
+        nombre = enregistrer_instantanes(jour)
+        self.stdout.write(self.style.SUCCESS(f"{nombre} instantané(s) de stock enregistré(s) pour le {jour:%d/%m/%Y}."))
+
+    def _parse_date(self, valeur):
+        if not valeur:
+            return None
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
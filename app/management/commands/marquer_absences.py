@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.models import BalayageAbsences
+from app.services.transitions import marquer_absents
+
+
+class Command(BaseCommand):
+    help = "Marque absents les rendez-vous passés restés planifiés ou confirmés (à lancer par cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delai', type=int, default=getattr(settings, 'RDV_DELAI_ABSENCE', 120),
+            help="Minutes après la fin du rendez-vous avant de le marquer absent"
+        )
+        parser.add_argument('--lot', type=int, default=500, help="Nombre de rendez-vous mis à jour par requête")
+
+    def handle(self, *args, **options):
+        if options['delai'] < 0 or options['lot'] < 1:
+            raise CommandError("Le délai doit être positif et la taille de lot d'au moins 1.")
+        
+        limite = timezone.now() - timedelta(minutes=options['delai'])
+        debut = time.monotonic()
+        nombre, lots = marquer_absents(limite, options['lot'])
+        balayage = BalayageAbsences.objects.create(
+            limite=limite, nombre=nombre, lots=lots, duree=time.monotonic() - debut
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{nombre} rendez-vous marqué(s) absent(s) en {lots} lot(s) ({balayage.duree:.2f} s)."
+        ))
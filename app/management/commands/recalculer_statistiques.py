@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.services.statistiques import reconstruire
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la table StatistiqueJournaliere pour une plage de dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Première date (AAAA-MM-JJ), par défaut il y a 30 jours")
+        parser.add_argument('--fin', help="Dernière date incluse (AAAA-MM-JJ), par défaut aujourd'hui")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            debut = self._parse_date(options['debut']) or today - timedelta(days=30)
+            fin = self._parse_date(options['fin']) or today
+        except ValueError:
+            raise CommandError("Format de date invalide, utilisez AAAA-MM-JJ.")
+        
+        if debut > fin:
+            raise CommandError("La date de début doit précéder la date de fin.")
+        
+        lignes = reconstruire(debut, fin)
+        self.stdout.write(self.style.SUCCESS(
+            f"{lignes} ligne(s) de statistiques reconstruite(s) du {debut:%d/%m/%Y} au {fin:%d/%m/%Y}."
+        ))
+
+    def _parse_date(self, valeur):
+        if not valeur:
+            return None
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.services.recherche import moteur_recherche
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche des patients."
+
+    def handle(self, *args, **options):
+        total = moteur_recherche().reindexer()
+        self.stdout.write(self.style.SUCCESS(f"{total} patient(s) indexé(s)."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.services.reapprovisionnement import METHODES, appliquer_seuils, suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche les médicaments à commander, classés par jours de stock restants, "
+        "d'après leur consommation récente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, help="Jours d'historique de consommation")
+        parser.add_argument('--methode', choices=METHODES, help="Estimation de la demande")
+        parser.add_argument('--delai', type=int, help="Délai de livraison (jours)")
+        parser.add_argument('--couverture', type=int, help="Couverture visée après livraison (jours)")
+        parser.add_argument('--limite', type=int, default=50, help="Nombre de médicaments affichés")
+        parser.add_argument(
+            '--appliquer-seuils', action='store_true',
+            help="Remplace les seuils d'alerte des médicaments consommés par leur point de commande"
+        )
+
+    def handle(self, *args, **options):
+        parametres = {
+            cle: options[cle] for cle in ('jours', 'methode', 'delai', 'couverture') if options[cle] is not None
+        }
+        if any(parametres.get(cle, 1) <= 0 for cle in ('jours', 'delai')) or parametres.get('couverture', 0) < 0:
+            raise CommandError("Les durées doivent être positives.")
+        
+        if options['appliquer_seuils']:
+            nombre = appliquer_seuils(**parametres)
+            self.stdout.write(self.style.SUCCESS(f"{nombre} seuil(s) d'alerte mis à jour."))
+            return
+        
+        lignes = suggestions(options['limite'], **parametres)
+        if not lignes:
+            self.stdout.write(self.style.SUCCESS("Aucun médicament à commander."))
+            return
+        self.stdout.write(f"{'Médicament':<40} {'Stock':>7} {'Demande/j':>10} {'Jours':>7} {'À commander':>12}")
+        for ligne in lignes:
+            self.stdout.write(
+                f"{ligne.nom[:40]:<40} {ligne.stock:>7} {ligne.demande:>10} {ligne.couverture:>7} {ligne.quantite:>12}"
+            )
@@ -4,28 +4,48 @@ from django.contrib import messages
 from django.conf import settings
 import logging
 
+from .permissions import moteur_permissions, nom_de_vue
+
 # Configurer le logger pour tracer les tentatives d'accès non autorisé
 logger = logging.getLogger('access_control')
 
+def resoudre_personnel(request):
+    """
+    Retourne le couple (personnel, role) de l'utilisateur de la requête.
+    
+    Le résultat est mémorisé sur la requête : le profil n'est lu qu'une fois,
+    quel que soit le nombre de vues, mixins ou décorateurs qui le demandent.
+    Un superutilisateur sans profil personnel a le rôle ADMIN.
+    """
+    if not hasattr(request, '_personnel_role'):
+        personnel = None
+        role = None
+        user = request.user
+        if user.is_authenticated:
+            try:
+                personnel = user.personnel
+                role = personnel.role
+            except AttributeError:
+                role = 'ADMIN' if user.is_superuser else None
+        request._personnel_role = (personnel, role)
+    return request._personnel_role
+
+
 class AccessControlMiddleware:
     """
     Middleware pour gérer le contrôle d'accès basé sur les rôles dans tout le système.
     
     Ce middleware vérifie si l'utilisateur connecté a le droit d'accéder
     à une vue spécifique en fonction de son rôle.
+    
+    Il expose aussi request.personnel et request.role, résolus une seule fois
+    par requête, pour que les vues n'aient pas à relire user.personnel.
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
-        # Dictionnaire qui définit les URL accessibles sans authentification
-        self.public_urls = [
-            '/login/',
-            '/logout/',
-            '/password_reset/',
-            '/admin/login/',
-            '/static/',
-            '/media/'
-        ]
+        # Moteur de permissions compilé une seule fois au démarrage
+        self.permissions = moteur_permissions
 
     def __call__(self, request):
         # Exécution avant la vue
@@ -38,7 +58,7 @@ class AccessControlMiddleware:
         path = request.path_info
         
         # Vérifier si le chemin est une URL publique (accessible sans authentification)
-        if any(path.startswith(url) for url in self.public_urls):
+        if self.permissions.est_publique(path):
             return None
         
         # Vérifier si l'utilisateur est authentifié
@@ -46,144 +66,24 @@ class AccessControlMiddleware:
             messages.error(request, "Veuillez vous connecter pour accéder à cette page.")
             return redirect(settings.LOGIN_URL)
         
+        # Résoudre une seule fois le profil et le rôle pour toute la requête
+        request.personnel, request.role = resoudre_personnel(request)
+        
         # Accès pour les superutilisateurs (administrateurs Django)
         if request.user.is_superuser:
             return None
             
         # Vérifier si l'utilisateur a un profil de personnel associé
-        try:
-            role = request.user.personnel.role
-        except AttributeError:
+        role = request.role
+        if request.personnel is None:
             logger.warning(f"L'utilisateur {request.user.username} n'a pas de profil personnel associé")
             messages.error(request, "Votre compte n'a pas de rôle attribué. Contactez l'administrateur.")
             return redirect(settings.LOGIN_URL)
         
-        # Obtenir le nom de la vue à partir de view_func
-        view_name = view_func.__name__
-        view_class = view_func.__class__.__name__ if hasattr(view_func, '__class__') else ""
-        
-        # Définir les permissions par rôle
-        # Ces dictionnaires associent chaque rôle à une liste de vues auxquelles il a accès
-        view_permissions = {
-            'ADMIN': [],  # Accès à tout pour les administrateurs
-            'MEDECIN': [
-                # Dashboard
-                'DashboardView', 'index',
-                
-                # Patients
-                'PatientListView', 'PatientDetailView', 'PatientSearchView',
-                
-                # Dossiers médicaux
-                'DossierMedicalView', 'ConsultationCreateView', 'ConsultationDetailView', 
-                'ConsultationListView', 'consultation_create', 'consultation_detail',
-                
-                # Rendez-vous
-                'CalendrierRendezVousView', 'RendezVousListView', 'RendezVousCreateView', 
-                'RendezVousUpdateView', 'RendezVousDuJourView', 'rendez_vous_create',
-                
-                # Examens
-                'ExamenListView', 'ExamenCreateView', 'ExamenDetailView', 'ResultatExamenView',
-                'examen_create', 'examen_detail',
-                
-                # Prescriptions
-                'PrescriptionListView', 'PrescriptionCreateView', 'PrescriptionDetailView', 
-                'PrescriptionPrintView', 'prescription_create', 'prescription_print'
-            ],
-            'INFIRMIER': [
-                # Dashboard
-                'DashboardView', 'index',
-                
-                # Patients
-                'PatientListView', 'PatientDetailView', 'PatientSearchView',
-                
-                # Dossiers médicaux
-                'DossierMedicalView', 'ConsultationDetailView', 'ConsultationListView',
-                
-                # Rendez-vous
-                'CalendrierRendezVousView', 'RendezVousListView', 'RendezVousDuJourView'
-            ],
-            'LABORANTIN': [
-                # Dashboard
-                'DashboardView', 'index',
-                
-                # Examens
-                'ExamenListView', 'ExamenDetailView', 'ResultatExamenCreateView', 
-                'ResultatExamenView', 'resultat_create'
-            ],
-            'PHARMACIEN': [
-                # Dashboard
-                'DashboardView', 'index',
-                
-                # Pharmacie
-                'MedicamentListView', 'MedicamentCreateView', 'StockView', 
-                'MouvementStockCreateView', 'MouvementStockListView', 'POSView',
-                'medicament_create', 'stock_update', 'pos_vente',
-                
-                # Prescriptions
-                'PrescriptionListView', 'PrescriptionDetailView', 'PrescriptionPrintView',
-                
-                # Facturation liée à la pharmacie
-                'FactureListView'
-            ],
-            'RECEPTION': [
-                # Dashboard
-                'DashboardView', 'index',
-                
-                # Patients
-                'PatientListView', 'PatientDetailView', 'PatientCreateView', 
-                'PatientUpdateView', 'PatientSearchView', 'patient_create',
-                
-                # Rendez-vous
-                'CalendrierRendezVousView', 'RendezVousListView', 'RendezVousCreateView', 
-                'RendezVousUpdateView', 'RendezVousDuJourView', 'rendez_vous_create',
-                
-                # Facturation
-                'FactureListView', 'FactureCreateView', 'FactureDetailView', 
-                'FacturePrintView', 'PaiementCreateView', 'facture_create', 'facture_print'
-            ]
-        }
-        
-        # Les URL spécifiques qui sont accessibles à certains rôles
-        # Ceci est un niveau supplémentaire de contrôle pour des URL précises
-        url_permissions = {
-            'ADMIN': [],  # Accès complet aux administrateurs
-            'MEDECIN': [
-                '/patients/',
-                '/dossiers/',
-                '/rendezvous/',
-                '/examens/',
-                '/prescriptions/'
-            ],
-            'INFIRMIER': [
-                '/patients/',
-                '/dossiers/',
-                '/rendezvous/'
-            ],
-            'LABORANTIN': [
-                '/examens/'
-            ],
-            'PHARMACIEN': [
-                '/pharmacie/',
-                '/prescriptions/',
-                '/facturation/liste/'
-            ],
-            'RECEPTION': [
-                '/patients/',
-                '/rendezvous/',
-                '/facturation/'
-            ]
-        }
-        
-        # 1. Vérification basée sur le nom de la vue
-        if role == 'ADMIN':
-            return None  # Accès total pour les administrateurs
-        
-        # Pour les autres rôles, vérifier si la vue est dans la liste des vues autorisées
-        if view_permissions.get(role) and (view_name in view_permissions[role] or view_class in view_permissions[role]):
-            return None  # Accès autorisé
-        
-        # 2. Vérification basée sur l'URL si la vérification par vue a échoué
-        if url_permissions.get(role) and any(path.startswith(url) for url in url_permissions[role]):
+        # Vérification par nom de vue puis par préfixe d'URL (voir permissions.py)
+        resolver_match = request.resolver_match
+        nom_route = resolver_match.view_name if resolver_match else None
+        if self.permissions.autorise(role, nom_de_vue(view_func), path, nom_route):
             return None  # Accès autorisé
         
         # Si nous arrivons ici, l'accès est refusé
@@ -195,47 +95,79 @@ class AccessControlMiddleware:
 
 
 # Décorateurs et Mixins pour un contrôle d'accès plus précis
-from django.contrib.auth.decorators import user_passes_test
+from django.contrib.auth.views import redirect_to_login
 from functools import wraps
+from asgiref.sync import iscoroutinefunction
 from django.contrib.auth.mixins import UserPassesTestMixin
 
-def role_required(roles):
+def role_required(roles=None):
     """
     Décorateur pour restreindre l'accès aux vues basées sur des fonctions.
-    Utilisation: @role_required(['ADMIN', 'MEDECIN'])
+    Utilisation: @role_required() ou @role_required(['ADMIN', 'MEDECIN'])
     
     Args:
-        roles: Liste des rôles autorisés à accéder à la vue
+        roles: Liste des rôles autorisés à accéder à la vue. Si omis, les rôles
+            sont lus dans la table des permissions à partir du nom de la fonction.
     """
-    def check_role(user):
-        if user.is_superuser:
-            return True
-        try:
-            return user.personnel.role in roles
-        except AttributeError:
-            return False
+    def decorator(view_func):
+        if roles is None:
+            roles_autorises = moteur_permissions.roles_pour_vue(view_func.__name__)
+        else:
+            roles_autorises = frozenset(roles)
+        
+        def autorise(request):
+            if request.user.is_superuser:
+                return True
+            personnel, role = resoudre_personnel(request)
+            return personnel is not None and role in roles_autorises
+        
+        # Vue asynchrone (flux d'événements) : le rôle a déjà été résolu par
+        # AccessControlMiddleware, resoudre_personnel ne touche pas la base
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                if autorise(request):
+                    return await view_func(request, *args, **kwargs)
+                return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+            
+            return _wrapped_view
+        
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if autorise(request):
+                return view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        
+        return _wrapped_view
     
-    return user_passes_test(check_role, login_url=settings.LOGIN_URL)
+    return decorator
 
 
 class RoleRequiredMixin(UserPassesTestMixin):
     """
     Mixin pour restreindre l'accès aux vues basées sur des classes.
+    Les rôles autorisés sont lus dans la table des permissions à partir
+    du nom de la classe, sauf si roles_allowed est défini explicitement.
     Utilisation:
     
     class MaVue(RoleRequiredMixin, ListView):
+        pass
+    
+    class MaVueRestreinte(RoleRequiredMixin, ListView):
         roles_allowed = ['ADMIN', 'MEDECIN']
     """
-    roles_allowed = []
+    roles_allowed = None
+    
+    def get_roles_allowed(self):
+        if self.roles_allowed is not None:
+            return self.roles_allowed
+        return moteur_permissions.roles_pour_vue(type(self).__name__)
     
     def test_func(self):
-        user = self.request.user
-        if user.is_superuser:
+        if self.request.user.is_superuser:
             return True
-        try:
-            return user.personnel.role in self.roles_allowed
-        except AttributeError:
-            return False
+        personnel, role = resoudre_personnel(self.request)
+        return personnel is not None and role in self.get_roles_allowed()
             
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
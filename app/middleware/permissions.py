@@ -0,0 +1,215 @@
+"""
+Table déclarative des permissions par rôle et moteur de vérification compilé.
+
+Cette table est l'unique source de vérité pour le contrôle d'accès :
+elle est utilisée par AccessControlMiddleware, par RoleRequiredMixin et par
+le décorateur role_required. Le rôle ADMIN a toujours accès à tout et n'a
+donc pas besoin d'être listé.
+"""
+import re
+
+
+# Rôles non administrateurs connus du système
+ROLES = ('MEDECIN', 'INFIRMIER', 'LABORANTIN', 'PHARMACIEN', 'RECEPTION')
+
+# Vues accessibles à tous les utilisateurs connectés
+VUES_COMMUNES = (
+    # Dashboard
+    'DashboardView', 'index',
+
+    # Profil
+    'ProfileView', 'password_change_view',
+)
+
+# Ces listes associent chaque rôle aux vues (nom de classe ou de fonction)
+# auxquelles il a accès
+VIEW_PERMISSIONS = {
+    'MEDECIN': VUES_COMMUNES + (
+        # Patients
+        'PatientListView', 'PatientDetailView', 'PatientSearchView', 'patient_search_view',
+        'patient_typeahead',
+
+        # Dossiers médicaux
+        'DossierMedicalView', 'ConsultationCreateView', 'ConsultationDetailView',
+        'ConsultationListView', 'consultation_create', 'consultation_detail',
+        'consultation_update',
+
+        # Rendez-vous
+        'CalendrierRendezVousView', 'RendezVousListView', 'RendezVousCreateView',
+        'RendezVousSerieCreateView', 'RendezVousUpdateView', 'RendezVousDuJourView', 'rendez_vous_create',
+        'rendez_vous_update_status', 'rendez_vous_statut_groupe',
+        'check_disponibilite', 'creneaux_libres', 'calendrier_donnees',
+        'rendez_vous_flux', 'rendez_vous_jour_donnees',
+
+        # File d'attente
+        'file_attente_etat', 'file_attente_arrivee', 'file_attente_appel', 'file_attente_triage',
+
+        # Examens
+        'ExamenListView', 'ExamenCreateView', 'ExamenDetailView', 'ResultatExamenView',
+        'examen_create', 'examen_detail',
+
+        # Prescriptions
+        'PrescriptionListView', 'PrescriptionCreateView', 'PrescriptionDetailView',
+        'PrescriptionPrintView', 'prescription_create', 'prescription_print',
+    ),
+    'INFIRMIER': VUES_COMMUNES + (
+        # Patients
+        'PatientListView', 'PatientDetailView', 'PatientSearchView', 'patient_search_view',
+        'patient_typeahead',
+
+        # Dossiers médicaux
+        'DossierMedicalView', 'ConsultationDetailView', 'ConsultationListView',
+
+        # Rendez-vous
+        'CalendrierRendezVousView', 'RendezVousListView', 'RendezVousDuJourView',
+        'check_disponibilite', 'creneaux_libres', 'calendrier_donnees',
+        'rendez_vous_flux', 'rendez_vous_jour_donnees',
+
+        # File d'attente
+        'file_attente_etat', 'file_attente_arrivee', 'file_attente_triage',
+    ),
+    'LABORANTIN': VUES_COMMUNES + (
+        # Examens
+        'ExamenListView', 'ExamenDetailView', 'ResultatExamenCreateView',
+        'ResultatExamenView', 'resultat_create',
+    ),
+    'PHARMACIEN': VUES_COMMUNES + (
+        # Pharmacie
+        'MedicamentListView', 'MedicamentCreateView', 'StockView',
+        'MouvementStockCreateView', 'MouvementStockListView', 'POSView',
+        'medicament_create', 'stock_update', 'pos_recherche', 'pos_vente', 'prescription_dispenser',
+        'stock_historique',
+
+        # Prescriptions
+        'PrescriptionListView', 'PrescriptionDetailView', 'PrescriptionPrintView',
+
+        # Facturation liée à la pharmacie
+        'FactureListView',
+    ),
+    'RECEPTION': VUES_COMMUNES + (
+        # Patients
+        'PatientListView', 'PatientDetailView', 'PatientCreateView',
+        'PatientUpdateView', 'PatientSearchView', 'patient_search_view',
+        'patient_typeahead', 'patient_create',
+
+        # Rendez-vous
+        'CalendrierRendezVousView', 'RendezVousListView', 'RendezVousCreateView',
+        'RendezVousSerieCreateView', 'RendezVousUpdateView', 'RendezVousDuJourView', 'rendez_vous_create',
+        'rendez_vous_update_status', 'rendez_vous_statut_groupe',
+        'check_disponibilite', 'creneaux_libres', 'calendrier_donnees',
+        'rendez_vous_flux', 'rendez_vous_jour_donnees',
+
+        # File d'attente
+        'file_attente_etat', 'file_attente_arrivee', 'file_attente_triage',
+
+        # Facturation
+        'FactureListView', 'FactureCreateView', 'FactureDetailView',
+        'FacturePrintView', 'PaiementCreateView', 'facture_create', 'facture_print',
+    ),
+}
+
+# Les préfixes d'URL accessibles à certains rôles
+# Ceci est un niveau supplémentaire de contrôle pour des URL précises
+URL_PERMISSIONS = {
+    'MEDECIN': ('/patients/', '/dossiers/', '/rendezvous/', '/examens/', '/prescriptions/'),
+    'INFIRMIER': ('/patients/', '/dossiers/', '/rendezvous/'),
+    'LABORANTIN': ('/examens/',),
+    'PHARMACIEN': ('/pharmacie/', '/prescriptions/', '/facturation/liste/'),
+    'RECEPTION': ('/patients/', '/rendezvous/', '/facturation/'),
+}
+
+# URL accessibles sans authentification
+PUBLIC_URLS = (
+    '/login/',
+    '/logout/',
+    '/password_reset/',
+    '/admin/login/',
+    '/static/',
+    '/media/',
+)
+
+
+def compiler_prefixes(prefixes):
+    """
+    Compile une liste de préfixes d'URL en une seule expression régulière
+    ancrée en début de chaîne. Retourne None si la liste est vide.
+    """
+    if not prefixes:
+        return None
+    return re.compile('|'.join(re.escape(prefixe) for prefixe in prefixes))
+
+
+class MoteurPermissions:
+    """
+    Moteur de permissions compilé une seule fois au démarrage.
+
+    Les listes de vues sont transformées en frozensets par rôle, les préfixes
+    d'URL en une expression régulière par rôle, et les décisions déjà prises
+    sont mémorisées par couple (rôle, nom de la route résolue).
+    """
+
+    def __init__(self, view_permissions, url_permissions, public_urls):
+        self.vues_par_role = {
+            role: frozenset(vues) for role, vues in view_permissions.items()
+        }
+        self.urls_par_role = {
+            role: compiler_prefixes(prefixes) for role, prefixes in url_permissions.items()
+        }
+        self.urls_publiques = compiler_prefixes(public_urls)
+
+        # Table inverse : vue -> rôles autorisés (ADMIN toujours inclus)
+        roles_par_vue = {}
+        for role, vues in self.vues_par_role.items():
+            for vue in vues:
+                roles_par_vue.setdefault(vue, {'ADMIN'}).add(role)
+        self.roles_par_vue = {vue: frozenset(roles) for vue, roles in roles_par_vue.items()}
+
+        self._decisions = {}
+
+    def est_publique(self, path):
+        """Vérifie si le chemin est accessible sans authentification"""
+        return self.urls_publiques is not None and self.urls_publiques.match(path) is not None
+
+    def roles_pour_vue(self, nom_vue):
+        """Retourne l'ensemble des rôles autorisés pour une vue donnée"""
+        return self.roles_par_vue.get(nom_vue, frozenset({'ADMIN'}))
+
+    def autorise(self, role, nom_vue, path, nom_route=None):
+        """
+        Vérifie si le rôle a accès à la vue (par son nom) ou au chemin (par préfixe).
+
+        Quand la route résolue a un nom, la décision est mise en cache : une route
+        nommée correspond toujours à la même vue et au même préfixe littéral.
+        """
+        if role == 'ADMIN':
+            return True
+
+        cle = (role, nom_route) if nom_route else None
+        if cle is not None:
+            decision = self._decisions.get(cle)
+            if decision is not None:
+                return decision
+
+        decision = nom_vue in self.vues_par_role.get(role, ())
+        if not decision:
+            prefixes = self.urls_par_role.get(role)
+            decision = prefixes is not None and prefixes.match(path) is not None
+
+        if cle is not None:
+            self._decisions[cle] = decision
+        return decision
+
+
+def nom_de_vue(view_func):
+    """
+    Retourne le nom utilisé dans la table des permissions pour une vue :
+    le nom de la classe pour les vues basées sur des classes, sinon le nom
+    de la fonction.
+    """
+    view_class = getattr(view_func, 'view_class', None)
+    if view_class is not None:
+        return view_class.__name__
+    return getattr(view_func, '__name__', '')
+
+
+moteur_permissions = MoteurPermissions(VIEW_PERMISSIONS, URL_PERMISSIONS, PUBLIC_URLS)
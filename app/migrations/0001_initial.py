@@ -0,0 +1,190 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Facture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_facture', models.CharField(max_length=20, unique=True)),
+                ('date_emission', models.DateTimeField(auto_now_add=True)),
+                ('date_paiement', models.DateTimeField(blank=True, null=True)),
+                ('montant_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('PAYEE', 'Payée'), ('ANNULEE', 'Annulée')], default='EN_ATTENTE', max_length=10)),
+                ('notes', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Medicament',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('categorie', models.CharField(max_length=100)),
+                ('fabricant', models.CharField(max_length=100)),
+                ('prix_unitaire', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Patient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_patient', models.CharField(default=uuid.uuid4, max_length=10, unique=True)),
+                ('nom', models.CharField(max_length=100)),
+                ('prenom', models.CharField(max_length=100)),
+                ('date_naissance', models.DateField()),
+                ('sexe', models.CharField(choices=[('M', 'Masculin'), ('F', 'Féminin'), ('A', 'Autre')], max_length=1)),
+                ('adresse', models.TextField()),
+                ('telephone', models.CharField(max_length=15)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('groupe_sanguin', models.CharField(blank=True, choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3, null=True)),
+                ('allergies', models.TextField(blank=True)),
+                ('date_enregistrement', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TypeExamen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('prix', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LigneFacture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=255)),
+                ('type_service', models.CharField(choices=[('CONSULTATION', 'Consultation'), ('EXAMEN', 'Examen de laboratoire'), ('MEDICAMENT', 'Médicament'), ('AUTRE', 'Autre service')], max_length=15)),
+                ('quantite', models.PositiveIntegerField(default=1)),
+                ('prix_unitaire', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('facture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='app.facture')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='facture',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='factures', to='app.patient'),
+        ),
+        migrations.CreateModel(
+            name='DossierMedical',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('derniere_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dossier_medical', to='app.patient')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Personnel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('MEDECIN', 'Médecin'), ('INFIRMIER', 'Infirmier/Infirmière'), ('LABORANTIN', 'Laborantin'), ('PHARMACIEN', 'Pharmacien'), ('RECEPTION', 'Réceptionniste'), ('ADMIN', 'Administrateur')], max_length=20)),
+                ('telephone', models.CharField(blank=True, max_length=15)),
+                ('adresse', models.TextField(blank=True)),
+                ('date_embauche', models.DateField(default=django.utils.timezone.now)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MouvementStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantite', models.PositiveIntegerField()),
+                ('type_mouvement', models.CharField(choices=[('ENTREE', 'Entrée en stock'), ('SORTIE', 'Sortie de stock')], max_length=10)),
+                ('date_mouvement', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True)),
+                ('medicament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mouvements', to='app.medicament')),
+                ('personnel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.personnel')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConsultationMedicale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_consultation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('motif', models.CharField(max_length=255)),
+                ('symptomes', models.TextField()),
+                ('diagnostic', models.TextField()),
+                ('notes', models.TextField(blank=True)),
+                ('dossier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consultations', to='app.dossiermedical')),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.personnel')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Prescription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_prescription', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True)),
+                ('consultation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='app.consultationmedicale')),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='app.personnel')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='app.patient')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LignePrescription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posologie', models.CharField(max_length=255)),
+                ('duree_traitement', models.CharField(max_length=100)),
+                ('quantite', models.PositiveIntegerField()),
+                ('instructions', models.TextField(blank=True)),
+                ('medicament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.medicament')),
+                ('prescription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='app.prescription')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RendezVous',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_heure', models.DateTimeField()),
+                ('duree', models.PositiveIntegerField(default=30, help_text='Durée en minutes')),
+                ('motif', models.CharField(max_length=255)),
+                ('statut', models.CharField(choices=[('PLANIFIE', 'Planifié'), ('CONFIRME', 'Confirmé'), ('TERMINE', 'Terminé'), ('ANNULE', 'Annulé')], default='PLANIFIE', max_length=10)),
+                ('notes', models.TextField(blank=True)),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rendez_vous', to='app.personnel')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rendez_vous', to='app.patient')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMedicament',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantite', models.PositiveIntegerField(default=0)),
+                ('seuil_alerte', models.PositiveIntegerField(default=5)),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('medicament', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='app.medicament')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExamenLaboratoire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_demande', models.DateTimeField(auto_now_add=True)),
+                ('date_realisation', models.DateTimeField(blank=True, null=True)),
+                ('resultats', models.TextField(blank=True)),
+                ('statut', models.CharField(choices=[('DEMANDE', 'Demandé'), ('EN_COURS', 'En cours'), ('TERMINE', 'Terminé'), ('ANNULE', 'Annulé')], default='DEMANDE', max_length=10)),
+                ('notes', models.TextField(blank=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='examens', to='app.patient')),
+                ('medecin_demandeur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='examens_demandes', to='app.personnel')),
+                ('technicien', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='examens_realises', to='app.personnel')),
+                ('type_examen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.typeexamen')),
+            ],
+        ),
+    ]
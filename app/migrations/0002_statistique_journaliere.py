@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def calculer_statistiques(apps, schema_editor):
+    """Calcule les statistiques de tout l'historique existant"""
+    from app.services.statistiques import jour_local, reconstruire
+
+    dates = []
+    for modele, champ in (
+        ('RendezVous', 'date_heure'), ('ConsultationMedicale', 'date_consultation'),
+        ('Facture', 'date_emission'), ('MouvementStock', 'date_mouvement'),
+    ):
+        extremes = apps.get_model('app', modele).objects.aggregate(debut=models.Min(champ), fin=models.Max(champ))
+        if extremes['debut'] is not None:
+            dates += [extremes['debut'], extremes['fin']]
+    if dates:
+        reconstruire(jour_local(min(dates)), jour_local(max(dates)), apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('rdv', models.PositiveIntegerField(default=0)),
+                ('consultations', models.PositiveIntegerField(default=0)),
+                ('factures_creees', models.PositiveIntegerField(default=0)),
+                ('ventes', models.PositiveIntegerField(default=0)),
+                ('revenu', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('medecin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='statistiques', to='app.personnel')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquejournaliere',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('medecin', models.Value(0)), models.F('date'), name='stat_jour_medecin_unique'),
+        ),
+        migrations.RunPython(calculer_statistiques, migrations.RunPython.noop),
+    ]
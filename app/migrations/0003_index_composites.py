@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_statistique_journaliere'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultationmedicale',
+            index=models.Index(fields=['dossier', 'date_consultation'], name='consult_dossier_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationmedicale',
+            index=models.Index(fields=['medecin', 'date_consultation'], name='consult_medecin_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationmedicale',
+            index=models.Index(fields=['date_consultation'], name='consult_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examenlaboratoire',
+            index=models.Index(fields=['statut', 'date_demande'], name='examen_statut_demande_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examenlaboratoire',
+            index=models.Index(fields=['statut', 'date_realisation'], name='examen_statut_real_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examenlaboratoire',
+            index=models.Index(fields=['date_demande'], name='examen_demande_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['statut', 'date_emission'], name='facture_statut_emission_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['date_emission'], name='facture_emission_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['type_mouvement', 'date_mouvement'], name='mvt_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['date_mouvement'], name='mvt_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['date_enregistrement'], name='patient_enregistrement_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', 'date_prescription'], name='prescr_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['medecin', 'date_prescription'], name='prescr_medecin_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['date_prescription'], name='prescr_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['medecin', 'date_heure', 'statut'], name='rdv_medecin_date_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['date_heure'], name='rdv_date_heure_idx'),
+        ),
+    ]
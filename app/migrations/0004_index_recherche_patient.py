@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Nombre de lignes d'index insérées par requête
+TAILLE_LOT = 1000
+
+
+def indexer_patients(apps, schema_editor):
+    """Construit l'index de recherche des patients existants"""
+    # Les clés sont celles du moteur actuel : une modification de leur
+    # format passe par la commande reindexer_patients
+    from app.services.recherche import CHAMPS_INDEXES, cles_patient
+
+    Patient = apps.get_model('app', 'Patient')
+    IndexRecherchePatient = apps.get_model('app', 'IndexRecherchePatient')
+    lignes = []
+    for patient in Patient.objects.only('pk', *CHAMPS_INDEXES).iterator(chunk_size=TAILLE_LOT):
+        lignes.extend(
+            IndexRecherchePatient(patient_id=patient.pk, cle=cle, poids=poids)
+            for cle, poids in cles_patient(patient).items()
+        )
+        if len(lignes) >= TAILLE_LOT:
+            IndexRecherchePatient.objects.bulk_create(lignes)
+            lignes = []
+    IndexRecherchePatient.objects.bulk_create(lignes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_index_composites'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexRecherchePatient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=40)),
+                ('poids', models.PositiveSmallIntegerField(default=1)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cles_recherche', to='app.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cle', 'patient'], name='recherche_cle_patient_idx')],
+            },
+        ),
+        migrations.RunPython(indexer_patients, migrations.RunPython.noop),
+    ]
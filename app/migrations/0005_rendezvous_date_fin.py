@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+# Nombre de rendez-vous mis à jour par requête
+TAILLE_LOT = 1000
+
+
+def completer_date_fin(apps, schema_editor):
+    """Renseigne la date de fin des rendez-vous existants"""
+    RendezVous = apps.get_model('app', 'RendezVous')
+    while True:
+        lot = list(
+            RendezVous.objects.filter(date_fin__isnull=True)
+            .only('pk', 'date_heure', 'duree')[:TAILLE_LOT]
+        )
+        if not lot:
+            break
+        for rdv in lot:
+            rdv.date_fin = rdv.date_heure + timedelta(minutes=rdv.duree)
+        RendezVous.objects.bulk_update(lot, ['date_fin'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_index_recherche_patient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rendezvous',
+            name='date_fin',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(completer_date_fin, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['medecin', 'date_fin', 'date_heure'], name='rdv_medecin_intervalle_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_rendezvous_date_fin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlageHoraire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour_semaine', models.PositiveSmallIntegerField(choices=[(0, 'Lundi'), (1, 'Mardi'), (2, 'Mercredi'), (3, 'Jeudi'), (4, 'Vendredi'), (5, 'Samedi'), (6, 'Dimanche')])),
+                ('heure_debut', models.TimeField()),
+                ('heure_fin', models.TimeField()),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plages_horaires', to='app.personnel')),
+            ],
+            options={
+                'ordering': ['medecin', 'jour_semaine', 'heure_debut'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Indisponibilite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debut', models.DateTimeField()),
+                ('fin', models.DateTimeField()),
+                ('motif', models.CharField(blank=True, max_length=255)),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indisponibilites', to='app.personnel')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['medecin', 'fin', 'debut'], name='indispo_medecin_periode_idx')],
+            },
+        ),
+    ]
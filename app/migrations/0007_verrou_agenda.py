@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_plannings_medecins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerrouAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verrous_agenda', to='app.personnel')),
+            ],
+            options={
+                'unique_together': {('medecin', 'jour')},
+            },
+        ),
+    ]
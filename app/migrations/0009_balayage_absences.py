@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_rendezvous_date_modification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalayageAbsences',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_execution', models.DateTimeField(auto_now_add=True)),
+                ('limite', models.DateTimeField(help_text='Rendez-vous terminés avant cette date')),
+                ('nombre', models.PositiveIntegerField(default=0)),
+                ('lots', models.PositiveIntegerField(default=0)),
+                ('duree', models.FloatField(default=0, help_text='Durée en secondes')),
+            ],
+            options={
+                'ordering': ['-date_execution'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='rendezvous',
+            name='statut',
+            field=models.CharField(choices=[('PLANIFIE', 'Planifié'), ('CONFIRME', 'Confirmé'), ('TERMINE', 'Terminé'), ('ANNULE', 'Annulé'), ('ABSENT', 'Absent')], default='PLANIFIE', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['statut', 'date_fin'], name='rdv_statut_fin_idx'),
+        ),
+    ]
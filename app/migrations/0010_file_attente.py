@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_balayage_absences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priorite', models.PositiveSmallIntegerField(choices=[(1, 'Urgent'), (2, 'Prioritaire'), (3, 'Normal')], default=3)),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('APPELE', 'Appelé'), ('TERMINE', 'Terminé'), ('PARTI', 'Parti')], default='EN_ATTENTE', max_length=10)),
+                ('heure_arrivee', models.DateTimeField(default=django.utils.timezone.now)),
+                ('heure_reference', models.DateTimeField(default=django.utils.timezone.now)),
+                ('heure_appel', models.DateTimeField(blank=True, null=True)),
+                ('heure_fin', models.DateTimeField(blank=True, null=True)),
+                ('medecin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_attente', to='app.personnel')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passages_file', to='app.patient')),
+                ('rendez_vous', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='passages_file', to='app.rendezvous')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['medecin', 'statut', 'heure_arrivee'], name='file_medecin_statut_idx'), models.Index(fields=['medecin', 'heure_fin'], name='file_medecin_fin_idx')],
+                'constraints': [models.UniqueConstraint(fields=('rendez_vous',), name='file_rendez_vous_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_prescription_dispensation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicament',
+            name='code',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_point_de_vente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantite', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['medicament', 'date_mouvement'], name='mvt_medicament_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='instantanestock',
+            name='medicament',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes', to='app.medicament'),
+        ),
+        migrations.AddIndex(
+            model_name='instantanestock',
+            index=models.Index(fields=['date'], name='instantane_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='instantanestock',
+            unique_together={('medicament', 'date')},
+        ),
+    ]
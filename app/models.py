@@ -1,7 +1,54 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
+from datetime import timedelta
+
+# Querysets avec les jointures nécessaires à l'affichage des listes
+class PersonnelQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('user')
+
+
+class ConsultationQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('dossier__patient', 'medecin__user')
+
+
+class RendezVousQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('patient', 'medecin__user')
+
+
+class ExamenQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('patient', 'type_examen', 'medecin_demandeur__user', 'technicien__user')
+
+
+class StockQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('medicament')
+
+
+class MouvementStockQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('medicament', 'personnel__user')
+
+
+class PrescriptionQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('patient', 'medecin__user')
+    
+    def avec_lignes(self):
+        return self.avec_relations().prefetch_related('lignes__medicament')
+
+
+class FactureQuerySet(models.QuerySet):
+    def avec_relations(self):
+        return self.select_related('patient')
+
 
 # Utilisateurs du système
 class Personnel(models.Model):
@@ -20,6 +67,8 @@ class Personnel(models.Model):
     adresse = models.TextField(blank=True)
     date_embauche = models.DateField(default=timezone.now)
     
+    objects = PersonnelQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.get_role_display()}"
 
@@ -54,6 +103,11 @@ class Patient(models.Model):
     allergies = models.TextField(blank=True)
     date_enregistrement = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_enregistrement'], name='patient_enregistrement_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.nom} {self.prenom} (ID: {self.id_patient})"
     
@@ -79,6 +133,15 @@ class ConsultationMedicale(models.Model):
     diagnostic = models.TextField()
     notes = models.TextField(blank=True)
     
+    objects = ConsultationQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['dossier', 'date_consultation'], name='consult_dossier_date_idx'),
+            models.Index(fields=['medecin', 'date_consultation'], name='consult_medecin_date_idx'),
+            models.Index(fields=['date_consultation'], name='consult_date_idx'),
+        ]
+    
     def __str__(self):
         return f"Consultation du {self.date_consultation.strftime('%d/%m/%Y')} - {self.patient}"
     
@@ -93,18 +156,157 @@ class RendezVous(models.Model):
         ('CONFIRME', 'Confirmé'),
         ('TERMINE', 'Terminé'),
         ('ANNULE', 'Annulé'),
+        ('ABSENT', 'Absent'),
     ]
     
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='rendez_vous')
     medecin = models.ForeignKey(Personnel, on_delete=models.CASCADE, related_name='rendez_vous')
     date_heure = models.DateTimeField()
     duree = models.PositiveIntegerField(default=30, help_text="Durée en minutes")
+    # Fin du rendez-vous (date_heure + duree), stockée pour les recherches de chevauchement
+    date_fin = models.DateTimeField(null=True, blank=True, editable=False)
     motif = models.CharField(max_length=255)
     statut = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PLANIFIE')
     notes = models.TextField(blank=True)
+    # Sert d'ETag au flux JSON du calendrier
+    date_modification = models.DateTimeField(auto_now=True)
+    
+    objects = RendezVousQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['medecin', 'date_heure', 'statut'], name='rdv_medecin_date_statut_idx'),
+            models.Index(fields=['medecin', 'date_fin', 'date_heure'], name='rdv_medecin_intervalle_idx'),
+            models.Index(fields=['statut', 'date_fin'], name='rdv_statut_fin_idx'),
+            models.Index(fields=['date_heure'], name='rdv_date_heure_idx'),
+        ]
     
     def __str__(self):
         return f"RDV: {self.patient} avec Dr. {self.medecin.user.last_name} le {self.date_heure.strftime('%d/%m/%Y à %H:%M')}"
+    
+    def calculer_date_fin(self):
+        if self.date_heure is None or self.duree is None:
+            return None
+        return self.date_heure + timedelta(minutes=self.duree)
+    
+    def save(self, *args, **kwargs):
+        self.date_fin = self.calculer_date_fin()
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            update_fields = set(update_fields) | {'date_modification'}
+            if {'date_heure', 'duree'} & update_fields:
+                update_fields.add('date_fin')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+class VerrouAgenda(models.Model):
+    """
+    Ligne de verrou d'une journée de l'agenda d'un médecin : les prises de
+    rendez-vous verrouillent ces lignes (SELECT ... FOR UPDATE) pour que la
+    vérification des conflits et l'enregistrement soient atomiques.
+    """
+    medecin = models.ForeignKey(Personnel, on_delete=models.CASCADE, related_name='verrous_agenda')
+    jour = models.DateField()
+    
+    class Meta:
+        unique_together = ('medecin', 'jour')
+    
+    def __str__(self):
+        return f"Agenda de Dr. {self.medecin.user.last_name} du {self.jour:%d/%m/%Y}"
+
+class BalayageAbsences(models.Model):
+    """Exécution de la commande marquer_absences et nombre de rendez-vous marqués absents"""
+    date_execution = models.DateTimeField(auto_now_add=True)
+    limite = models.DateTimeField(help_text="Rendez-vous terminés avant cette date")
+    nombre = models.PositiveIntegerField(default=0)
+    lots = models.PositiveIntegerField(default=0)
+    duree = models.FloatField(default=0, help_text="Durée en secondes")
+    
+    class Meta:
+        ordering = ['-date_execution']
+    
+    def __str__(self):
+        return f"Balayage du {self.date_execution:%d/%m/%Y %H:%M} : {self.nombre} absence(s)"
+
+# File d'attente (patients sans rendez-vous et rendez-vous arrivés)
+class FileAttente(models.Model):
+    PRIORITE_CHOICES = [
+        (1, 'Urgent'),
+        (2, 'Prioritaire'),
+        (3, 'Normal'),
+    ]
+    STATUT_CHOICES = [
+        ('EN_ATTENTE', 'En attente'),
+        ('APPELE', 'Appelé'),
+        ('TERMINE', 'Terminé'),
+        ('PARTI', 'Parti'),
+    ]
+    
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='passages_file')
+    medecin = models.ForeignKey(Personnel, on_delete=models.CASCADE, related_name='file_attente')
+    rendez_vous = models.ForeignKey(
+        RendezVous, on_delete=models.SET_NULL, null=True, blank=True, related_name='passages_file'
+    )
+    priorite = models.PositiveSmallIntegerField(choices=PRIORITE_CHOICES, default=3)
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='EN_ATTENTE')
+    heure_arrivee = models.DateTimeField(default=timezone.now)
+    # Heure de classement : l'arrivée, ou le rendez-vous pour un patient en avance
+    heure_reference = models.DateTimeField(default=timezone.now)
+    heure_appel = models.DateTimeField(null=True, blank=True)
+    heure_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['medecin', 'statut', 'heure_arrivee'], name='file_medecin_statut_idx'),
+            models.Index(fields=['medecin', 'heure_fin'], name='file_medecin_fin_idx'),
+        ]
+        constraints = [
+            # Un rendez-vous ne donne lieu qu'à un passage (les patients sans
+            # rendez-vous ont rendez_vous à NULL et ne sont pas concernés)
+            models.UniqueConstraint(fields=['rendez_vous'], name='file_rendez_vous_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient} en attente de Dr. {self.medecin.user.last_name} ({self.get_statut_display()})"
+
+# Disponibilités des médecins
+class PlageHoraire(models.Model):
+    """Plage de consultation hebdomadaire récurrente d'un médecin"""
+    JOUR_CHOICES = [
+        (0, 'Lundi'),
+        (1, 'Mardi'),
+        (2, 'Mercredi'),
+        (3, 'Jeudi'),
+        (4, 'Vendredi'),
+        (5, 'Samedi'),
+        (6, 'Dimanche'),
+    ]
+    
+    medecin = models.ForeignKey(Personnel, on_delete=models.CASCADE, related_name='plages_horaires')
+    jour_semaine = models.PositiveSmallIntegerField(choices=JOUR_CHOICES)
+    heure_debut = models.TimeField()
+    heure_fin = models.TimeField()
+    
+    class Meta:
+        ordering = ['medecin', 'jour_semaine', 'heure_debut']
+    
+    def __str__(self):
+        return f"Dr. {self.medecin.user.last_name} - {self.get_jour_semaine_display()} {self.heure_debut:%H:%M}-{self.heure_fin:%H:%M}"
+
+class Indisponibilite(models.Model):
+    """Absence ponctuelle d'un médecin (congé, formation...), prioritaire sur ses plages"""
+    medecin = models.ForeignKey(Personnel, on_delete=models.CASCADE, related_name='indisponibilites')
+    debut = models.DateTimeField()
+    fin = models.DateTimeField()
+    motif = models.CharField(max_length=255, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['medecin', 'fin', 'debut'], name='indispo_medecin_periode_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Dr. {self.medecin.user.last_name} indisponible du {self.debut:%d/%m/%Y %H:%M} au {self.fin:%d/%m/%Y %H:%M}"
 
 # Examens de laboratoire
 class TypeExamen(models.Model):
@@ -133,12 +335,23 @@ class ExamenLaboratoire(models.Model):
     statut = models.CharField(max_length=10, choices=STATUS_CHOICES, default='DEMANDE')
     notes = models.TextField(blank=True)
     
+    objects = ExamenQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'date_demande'], name='examen_statut_demande_idx'),
+            models.Index(fields=['statut', 'date_realisation'], name='examen_statut_real_idx'),
+            models.Index(fields=['date_demande'], name='examen_demande_idx'),
+        ]
+    
     def __str__(self):
         return f"Examen {self.type_examen.nom} pour {self.patient} ({self.get_statut_display()})"
 
 # Gestion des médicaments et pharmacie
 class Medicament(models.Model):
     nom = models.CharField(max_length=100)
+    # Code-barres ou code interne, saisi ou scanné à la caisse
+    code = models.CharField(max_length=50, unique=True, null=True, blank=True)
     description = models.TextField()
     categorie = models.CharField(max_length=100)
     fabricant = models.CharField(max_length=100)
@@ -153,6 +366,8 @@ class StockMedicament(models.Model):
     seuil_alerte = models.PositiveIntegerField(default=5)
     date_mise_a_jour = models.DateTimeField(auto_now=True)
     
+    objects = StockQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.medicament.nom} - Stock: {self.quantite}"
     
@@ -175,9 +390,36 @@ class MouvementStock(models.Model):
     personnel = models.ForeignKey(Personnel, on_delete=models.CASCADE)
     notes = models.TextField(blank=True)
     
+    objects = MouvementStockQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['type_mouvement', 'date_mouvement'], name='mvt_type_date_idx'),
+            models.Index(fields=['date_mouvement'], name='mvt_date_idx'),
+            models.Index(fields=['medicament', 'date_mouvement'], name='mvt_medicament_date_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.get_type_mouvement_display()} de {self.quantite} {self.medicament.nom}"
 
+class InstantaneStock(models.Model):
+    """
+    Stock d'un médicament en fin de journée, enregistré pour chaque jour où
+    il a changé (voir app/services/historique_stock.py).
+    """
+    medicament = models.ForeignKey(Medicament, on_delete=models.CASCADE, related_name='instantanes')
+    date = models.DateField()
+    quantite = models.IntegerField()
+    
+    class Meta:
+        unique_together = ('medicament', 'date')
+        indexes = [
+            models.Index(fields=['date'], name='instantane_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.medicament.nom} au {self.date:%d/%m/%Y} : {self.quantite}"
+
 # Prescriptions
 class Prescription(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='prescriptions')
@@ -185,6 +427,16 @@ class Prescription(models.Model):
     consultation = models.ForeignKey(ConsultationMedicale, on_delete=models.CASCADE, related_name='prescriptions', null=True, blank=True)
     date_prescription = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
+    date_dispensation = models.DateTimeField(null=True, blank=True)
+    
+    objects = PrescriptionQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'date_prescription'], name='prescr_patient_date_idx'),
+            models.Index(fields=['medecin', 'date_prescription'], name='prescr_medecin_date_idx'),
+            models.Index(fields=['date_prescription'], name='prescr_date_idx'),
+        ]
     
     def __str__(self):
         return f"Prescription pour {self.patient} par Dr. {self.medecin.user.last_name} le {self.date_prescription.strftime('%d/%m/%Y')}"
@@ -216,6 +468,14 @@ class Facture(models.Model):
     statut = models.CharField(max_length=10, choices=STATUS_CHOICES, default='EN_ATTENTE')
     notes = models.TextField(blank=True)
     
+    objects = FactureQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'date_emission'], name='facture_statut_emission_idx'),
+            models.Index(fields=['date_emission'], name='facture_emission_idx'),
+        ]
+    
     def __str__(self):
         return f"Facture #{self.numero_facture} - {self.patient} ({self.get_statut_display()})"
     
@@ -243,4 +503,52 @@ class LigneFacture(models.Model):
     
     @property
     def montant(self):
-        return self.prix_unitaire * self.quantite
\ No newline at end of file
+        return self.prix_unitaire * self.quantite
+
+# Statistiques d'activité
+class StatistiqueJournaliere(models.Model):
+    """
+    Compteurs d'activité agrégés par jour, tenus à jour par les signaux
+    (voir app/signals.py). Une ligne sans médecin porte les totaux globaux
+    du jour, une ligne par médecin porte ses rendez-vous et consultations.
+    """
+    date = models.DateField()
+    medecin = models.ForeignKey(Personnel, on_delete=models.CASCADE, related_name='statistiques', null=True, blank=True)
+    rdv = models.PositiveIntegerField(default=0)
+    consultations = models.PositiveIntegerField(default=0)
+    factures_creees = models.PositiveIntegerField(default=0)
+    ventes = models.PositiveIntegerField(default=0)
+    revenu = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            # Une ligne par jour et par médecin ; NULL étant distinct de NULL,
+            # l'index porte sur le médecin ou 0 pour protéger aussi la ligne globale
+            models.UniqueConstraint(
+                Coalesce('medecin', Value(0)), 'date', name='stat_jour_medecin_unique'
+            ),
+        ]
+    
+    def __str__(self):
+        if self.medecin_id:
+            return f"Statistiques du {self.date.strftime('%d/%m/%Y')} - Dr. {self.medecin.user.last_name}"
+        return f"Statistiques du {self.date.strftime('%d/%m/%Y')}"
+
+# Index de recherche des patients
+class IndexRecherchePatient(models.Model):
+    """
+    Clés de recherche normalisées d'un patient (préfixes et trigrammes du nom
+    sans accents, chiffres du téléphone, identifiant), tenues à jour par les
+    signaux. Voir app/services/recherche.py.
+    """
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='cles_recherche')
+    cle = models.CharField(max_length=40)
+    poids = models.PositiveSmallIntegerField(default=1)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['cle', 'patient'], name='recherche_cle_patient_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.cle} ({self.poids}) - patient {self.patient_id}"
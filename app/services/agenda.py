@@ -0,0 +1,319 @@
+"""
+Grilles de disponibilité des médecins.
+
+Pour chaque médecin et chaque jour, la disponibilité est précalculée sous
+forme de deux entiers de 288 bits (un bit par tranche de 5 minutes depuis
+minuit, heure locale) :
+
+- travail : tranches couvertes par les plages horaires du médecin (ou les
+  horaires par défaut s'il n'en a aucune), moins ses indisponibilités
+- libre   : tranches de travail sans rendez-vous actif
+
+Les grilles sont calculées par lots (trois requêtes quel que soit le nombre
+de médecins et de jours) puis gardées dans le cache de Django. Vérifier un
+créneau ou chercher les créneaux libres se réduit alors à des opérations
+sur ces entiers.
+
+Une modification de rendez-vous n'invalide que les jours qu'il touche ; une
+modification des plages horaires ou des indisponibilités invalide toutes les
+grilles du médecin via un numéro de version. Ces invalidations ne touchent
+que le cache du processus qui fait la modification lorsque le cache est
+local (LocMemCache) : les grilles ne sont donc gardées que
+GRILLE_CACHE_TIMEOUT secondes, ce qui borne le retard des autres processus.
+La base reste la référence : l'enregistrement d'un rendez-vous vérifie
+toujours les conflits en SQL.
+"""
+import time as horloge
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .disponibilite import STATUTS_ACTIFS
+from .periodes import bornes_jours, debut_jour
+from ..models import Indisponibilite, PlageHoraire, RendezVous
+
+HEURE_OUVERTURE = time.fromisoformat(getattr(settings, 'RDV_HEURE_OUVERTURE', '08:00'))
+HEURE_FERMETURE = time.fromisoformat(getattr(settings, 'RDV_HEURE_FERMETURE', '18:00'))
+JOURS_OUVRES = frozenset(getattr(settings, 'RDV_JOURS_OUVRES', (0, 1, 2, 3, 4, 5)))
+PAS_CRENEAUX = getattr(settings, 'RDV_PAS_CRENEAUX', 15)
+
+CACHE_TIMEOUT = getattr(settings, 'GRILLE_CACHE_TIMEOUT', 60)
+
+# Granularité de la grille, en minutes
+TRANCHE = 5
+TRANCHES_PAR_JOUR = 24 * 60 // TRANCHE
+
+# États d'un créneau
+LIBRE = 'libre'
+OCCUPE = 'occupe'
+HORS_HORAIRES = 'hors_horaires'
+
+
+# ========================================
+# Masques
+# ========================================
+
+def masque(debut, fin):
+    """Bits des tranches d'indices [debut, fin["""
+    if fin <= debut:
+        return 0
+    return ((1 << (fin - debut)) - 1) << debut
+
+
+def _indice_heure(heure, arrondi_superieur=False):
+    minutes = heure.hour * 60 + heure.minute
+    if arrondi_superieur:
+        return -(-minutes // TRANCHE)
+    return minutes // TRANCHE
+
+
+def masque_heures(heure_debut, heure_fin):
+    """Masque d'une plage horaire : seules les tranches entièrement couvertes"""
+    fin = TRANCHES_PAR_JOUR if heure_fin == time.min else _indice_heure(heure_fin)
+    return masque(_indice_heure(heure_debut, arrondi_superieur=True), fin)
+
+
+def tranches(jour, debut, fin):
+    """
+    Indices [i, j[ des tranches du jour touchées, même partiellement, par
+    l'intervalle [debut, fin[ (vide si l'intervalle ne touche pas le jour).
+    """
+    minuit = debut_jour(jour)
+    duree = timedelta(minutes=TRANCHE)
+    i = max(0, (debut - minuit) // duree)
+    j = min(TRANCHES_PAR_JOUR, -((minuit - fin) // duree))
+    return i, j
+
+
+def _jour_local(moment):
+    return timezone.localdate(moment) if settings.USE_TZ else moment.date()
+
+
+def jours_couverts(debut, fin):
+    """Jours locaux touchés par l'intervalle [debut, fin["""
+    jour = _jour_local(debut)
+    dernier = _jour_local(fin - timedelta(microseconds=1))
+    jours = []
+    while jour <= dernier:
+        jours.append(jour)
+        jour += timedelta(days=1)
+    return jours
+
+
+MASQUE_DEFAUT = masque_heures(HEURE_OUVERTURE, HEURE_FERMETURE)
+
+
+# ========================================
+# Calcul et cache des grilles
+# ========================================
+
+def _cle_version(medecin_id):
+    return f'grille:version:{medecin_id}'
+
+
+def _cle(medecin_id, version, jour):
+    return f'grille:{medecin_id}:{version}:{jour.isoformat()}'
+
+
+def _versions(medecin_ids):
+    cles = {medecin_id: _cle_version(medecin_id) for medecin_id in medecin_ids}
+    trouvees = cache.get_many(cles.values())
+    versions = {}
+    nouvelles = {}
+    for medecin_id, cle in cles.items():
+        if cle in trouvees:
+            versions[medecin_id] = trouvees[cle]
+        else:
+            # Initialisée à l'heure courante : une version évincée du cache
+            # ne peut pas retrouver des grilles calculées avant elle
+            versions[medecin_id] = nouvelles[cle] = int(horloge.time() * 1000)
+    if nouvelles:
+        cache.set_many(nouvelles, None)
+    return versions
+
+
+def calculer_grilles(medecin_ids, jours):
+    """
+    Calcule sans cache les grilles de plusieurs médecins sur plusieurs jours.
+    Retourne un dictionnaire (medecin_id, jour) -> (travail, libre).
+    """
+    debut, fin = bornes_jours(min(jours), max(jours))
+
+    plages = defaultdict(lambda: defaultdict(int))
+    for medecin_id, jour_semaine, heure_debut, heure_fin in PlageHoraire.objects.filter(
+        medecin_id__in=medecin_ids
+    ).values_list('medecin_id', 'jour_semaine', 'heure_debut', 'heure_fin'):
+        plages[medecin_id][jour_semaine] |= masque_heures(heure_debut, heure_fin)
+
+    # Intervalles répartis par médecin et par jour touché
+    absences = defaultdict(list)
+    for medecin_id, debut_absence, fin_absence in Indisponibilite.objects.filter(
+        medecin_id__in=medecin_ids, fin__gt=debut, debut__lt=fin
+    ).values_list('medecin_id', 'debut', 'fin'):
+        for jour in jours_couverts(debut_absence, fin_absence):
+            absences[medecin_id, jour].append((debut_absence, fin_absence))
+
+    occupes = defaultdict(list)
+    for medecin_id, date_heure, date_fin in RendezVous.objects.filter(
+        medecin_id__in=medecin_ids,
+        date_fin__gt=debut,
+        date_heure__lt=fin,
+        statut__in=STATUTS_ACTIFS,
+    ).values_list('medecin_id', 'date_heure', 'date_fin'):
+        for jour in jours_couverts(date_heure, date_fin):
+            occupes[medecin_id, jour].append((date_heure, date_fin))
+
+    resultat = {}
+    for medecin_id in medecin_ids:
+        for jour in jours:
+            if medecin_id in plages:
+                travail = plages[medecin_id][jour.weekday()]
+            else:
+                travail = MASQUE_DEFAUT if jour.weekday() in JOURS_OUVRES else 0
+            for intervalle in absences[medecin_id, jour]:
+                travail &= ~masque(*tranches(jour, *intervalle))
+            libre = travail
+            for intervalle in occupes[medecin_id, jour]:
+                libre &= ~masque(*tranches(jour, *intervalle))
+            resultat[medecin_id, jour] = (travail, libre)
+    return resultat
+
+
+def grilles(medecin_ids, jours):
+    """
+    Retourne les grilles (travail, libre) de plusieurs médecins sur plusieurs
+    jours, dans un dictionnaire (medecin_id, jour) -> (travail, libre). Les
+    grilles absentes du cache sont calculées ensemble puis mises en cache.
+    """
+    medecin_ids = list(medecin_ids)
+    jours = list(jours)
+    if not medecin_ids or not jours:
+        return {}
+    versions = _versions(medecin_ids)
+    cles = {
+        (medecin_id, jour): _cle(medecin_id, versions[medecin_id], jour)
+        for medecin_id in medecin_ids for jour in jours
+    }
+    trouvees = cache.get_many(cles.values())
+
+    resultat = {}
+    manquantes = []
+    for couple, cle in cles.items():
+        if cle in trouvees:
+            resultat[couple] = trouvees[cle]
+        else:
+            manquantes.append(couple)
+
+    if manquantes:
+        calculees = calculer_grilles(
+            sorted({medecin_id for medecin_id, jour in manquantes}),
+            sorted({jour for medecin_id, jour in manquantes}),
+        )
+        cache.set_many({cles[couple]: calculees[couple] for couple in manquantes}, CACHE_TIMEOUT)
+        for couple in manquantes:
+            resultat[couple] = calculees[couple]
+    return resultat
+
+
+def invalider_jours(medecin_id, jours):
+    """Supprime du cache les grilles d'un médecin pour quelques jours"""
+    version = cache.get(_cle_version(medecin_id))
+    if version is not None:
+        cache.delete_many([_cle(medecin_id, version, jour) for jour in jours])
+
+
+def invalider_medecin(medecin_id):
+    """Rend obsolètes toutes les grilles d'un médecin"""
+    try:
+        cache.incr(_cle_version(medecin_id))
+    except ValueError:
+        # Aucune grille n'a encore été calculée pour ce médecin
+        pass
+
+
+def invalider_apres_commit(fonction, *args):
+    # Invalider avant la validation de la transaction laisserait une autre
+    # requête remettre en cache l'état précédent
+    transaction.on_commit(lambda: fonction(*args))
+
+
+# ========================================
+# Vérifications
+# ========================================
+
+def etats_creneaux(medecin_id, intervalles):
+    """
+    Indique pour chaque créneau [debut, fin[ d'un médecin s'il est LIBRE,
+    OCCUPE ou HORS_HORAIRES, à partir des seules grilles (chargées en un lot).
+    """
+    jours_par_creneau = [jours_couverts(debut, fin) for debut, fin in intervalles]
+    grilles_jours = grilles([medecin_id], sorted({jour for jours in jours_par_creneau for jour in jours}))
+    etats = []
+    for (debut, fin), jours in zip(intervalles, jours_par_creneau):
+        etat = LIBRE
+        for jour in jours:
+            travail, libre = grilles_jours[medecin_id, jour]
+            bits = masque(*tranches(jour, debut, fin))
+            if travail & bits != bits:
+                etat = HORS_HORAIRES
+                break
+            if libre & bits != bits:
+                etat = OCCUPE
+        etats.append(etat)
+    return etats
+
+
+def etat_creneau(medecin_id, debut, fin):
+    """Indique si le créneau [debut, fin[ d'un médecin est LIBRE, OCCUPE ou HORS_HORAIRES"""
+    return etats_creneaux(medecin_id, [(debut, fin)])[0]
+
+
+def creneaux_libres(medecin_ids, premier_jour, dernier_jour, duree, pas=PAS_CRENEAUX):
+    """
+    Calcule les créneaux libres de plusieurs médecins sur une période.
+    Retourne un dictionnaire medecin_id -> {jour: [débuts des créneaux]},
+    les débuts étant exprimés dans le fuseau horaire courant.
+    """
+    jours = []
+    jour = premier_jour
+    while jour <= dernier_jour:
+        jours.append(jour)
+        jour += timedelta(days=1)
+    grilles_jours = grilles(medecin_ids, jours)
+
+    n = -(-duree // TRANCHE)
+    pas = max(1, pas // TRANCHE)
+    # Débuts possibles, alignés sur le pas depuis minuit
+    alignes = sum(1 << i for i in range(0, TRANCHES_PAR_JOUR - n + 1, pas))
+
+    maintenant = timezone.localtime() if settings.USE_TZ else timezone.now()
+    aujourd_hui = maintenant.date()
+
+    resultats = {}
+    for medecin_id in medecin_ids:
+        resultat = resultats[medecin_id] = {}
+        for jour in jours:
+            if jour < aujourd_hui:
+                resultat[jour] = []
+                continue
+            libre = grilles_jours[medecin_id, jour][1]
+            # Bit i conservé si les n tranches à partir de i sont libres
+            debuts = libre
+            for k in range(1, n):
+                debuts &= libre >> k
+            debuts &= alignes
+            if jour == aujourd_hui:
+                debuts &= ~masque(0, tranches(jour, maintenant, maintenant)[1])
+
+            minuit = debut_jour(jour)
+            creneaux = []
+            while debuts:
+                bit = debuts & -debuts
+                creneaux.append(minuit + timedelta(minutes=(bit.bit_length() - 1) * TRANCHE))
+                debuts ^= bit
+            resultat[jour] = creneaux
+    return resultats
@@ -0,0 +1,60 @@
+"""
+Flux JSON du calendrier des rendez-vous.
+
+Un mois est servi en une seule requête `values_list` (sans instancier de
+modèles) sous une forme compacte : nombre de rendez-vous par jour et un
+tuple par rendez-vous. L'ETag d'un mois combine le nombre de rendez-vous et
+leur dernière modification : un ajout, une modification ou une suppression
+le change, ce qui permet au navigateur de garder les mois déjà chargés et
+de les revalider par une réponse 304.
+"""
+from collections import Counter
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .periodes import bornes_mois, dans_periode
+from ..models import RendezVous
+
+
+def rdv_du_mois(annee, mois, medecin_id=None):
+    """QuerySet des rendez-vous d'un mois, éventuellement limité à un médecin"""
+    queryset = RendezVous.objects.filter(dans_periode('date_heure', bornes_mois(date(annee, mois, 1))))
+    if medecin_id:
+        queryset = queryset.filter(medecin_id=medecin_id)
+    return queryset
+
+
+def etag_mois(queryset):
+    """ETag d'un mois (ou d'un jour) : nombre de rendez-vous et date de la dernière modification"""
+    resume = queryset.aggregate(nombre=Count('id'), derniere=Max('date_modification'))
+    derniere = resume['derniere'].timestamp() if resume['derniere'] else 0
+    return f'"{resume["nombre"]}-{derniere:.6f}"'
+
+
+def initiales(nom, prenom):
+    return f"{prenom[:1]}{nom[:1]}".upper()
+
+
+def flux_mois(queryset):
+    """
+    Retourne {"jours": {date ISO: nombre}, "rdv": [[id, début local, durée,
+    statut, initiales du patient, id du médecin], ...]} pour un mois.
+    """
+    lignes = queryset.order_by('date_heure').values_list(
+        'pk', 'date_heure', 'duree', 'statut', 'patient__nom', 'patient__prenom', 'medecin_id'
+    )
+    jours = Counter()
+    rdv = []
+    for pk, date_heure, duree, statut, nom, prenom, medecin_id in lignes:
+        if settings.USE_TZ:
+            date_heure = timezone.localtime(date_heure)
+        jour = date_heure.date().isoformat()
+        jours[jour] += 1
+        rdv.append([
+            pk, f"{jour}T{date_heure.hour:02d}:{date_heure.minute:02d}",
+            duree, statut, initiales(nom, prenom), medecin_id,
+        ])
+    return {'jours': dict(jours), 'rdv': rdv}
@@ -0,0 +1,174 @@
+"""
+Catalogue des médicaments de la caisse, gardé en mémoire.
+
+Chaque processus garde le nom, la catégorie, le prix, le code et le stock
+de tous les médicaments, et une liste triée de clés (préfixe cherché ->
+médicament) : les mots normalisés du nom et le code compacté. Une recherche
+par préfixe se résume à deux bisect dans cette liste, sans requête SQL.
+
+Les modifications de médicaments et de stocks incrémentent un numéro de
+génération dans le cache de Django et y notent les médicaments touchés
+(un journal par génération). Avant chaque recherche, un processus en
+retard relit en une requête les seuls médicaments modifiés depuis sa
+génération, ou tout le catalogue si le journal est incomplet. Avec un
+cache local (LocMemCache), génération et journal ne sont visibles que du
+processus qui fait la modification : chaque processus recharge donc aussi
+tout son catalogue au plus tard CATALOGUE_CACHE_TIMEOUT secondes après le
+dernier chargement complet.
+"""
+import heapq
+import time
+from bisect import bisect_left, insort
+from decimal import Decimal
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .recherche import compacter, mots
+from ..models import Medicament
+
+CLE_GENERATION = 'catalogue:generation'
+
+# Durée de conservation du journal des modifications (secondes)
+DUREE_JOURNAL = 3600
+
+# Au-delà de ce retard, le catalogue est rechargé entièrement
+RETARD_MAX = 200
+
+# Durée maximale (secondes) entre deux chargements complets d'un processus
+DUREE_MAX = getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 30)
+
+NOMBRE_RESULTATS = 20
+
+# Dernier caractère possible, pour borner une plage de préfixes
+_FIN = '\U0010ffff'
+
+
+def _cle_journal(gen):
+    return f'catalogue:journal:{gen}'
+
+
+def generation():
+    return cache.get_or_set(CLE_GENERATION, lambda: int(time.time() * 1000), None)
+
+
+def signaler_modifications(medicament_ids):
+    """Note les médicaments modifiés pour les catalogues de tous les processus"""
+    try:
+        gen = cache.incr(CLE_GENERATION)
+    except ValueError:
+        # Génération évincée : tous les processus rechargeront le catalogue
+        generation()
+        return
+    cache.set(_cle_journal(gen), sorted(set(medicament_ids)), DUREE_JOURNAL)
+
+
+def signaler_apres_commit(medicament_ids):
+    transaction.on_commit(lambda: signaler_modifications(medicament_ids))
+
+
+def _requete():
+    return Medicament.objects.values_list('pk', 'nom', 'categorie', 'prix_unitaire', 'code', 'stock__quantite')
+
+
+class Catalogue:
+    """Catalogue en mémoire d'un processus"""
+
+    def __init__(self):
+        self.generation = None
+        self.charge_a = None
+        # id -> (id, nom, catégorie, prix, code, quantité)
+        self.produits = {}
+        # id -> clés du produit (mots du nom, code compacté)
+        self.cles_produit = {}
+        # Liste triée de (clé, id)
+        self.cles = []
+        self._verrou = Lock()
+
+    def _ajouter(self, ligne):
+        pk, nom, categorie, prix, code, quantite = ligne
+        self.produits[pk] = (pk, nom, categorie, prix, code, quantite or 0)
+        cles = set(mots(nom))
+        if code:
+            cles.add(compacter(code))
+        self.cles_produit[pk] = tuple(cles)
+
+    def _charger(self, gen):
+        self.produits = {}
+        self.cles_produit = {}
+        for ligne in _requete():
+            self._ajouter(ligne)
+        self.cles = sorted((cle, pk) for pk, cles in self.cles_produit.items() for cle in cles)
+        self.generation = gen
+        self.charge_a = time.monotonic()
+
+    def _retirer(self, pk):
+        self.produits.pop(pk, None)
+        for cle in self.cles_produit.pop(pk, ()):
+            position = bisect_left(self.cles, (cle, pk))
+            if position < len(self.cles) and self.cles[position] == (cle, pk):
+                del self.cles[position]
+
+    def _rafraichir(self, ids, gen):
+        lignes = {ligne[0]: ligne for ligne in _requete().filter(pk__in=ids)}
+        for pk in ids:
+            self._retirer(pk)
+            if pk in lignes:
+                self._ajouter(lignes[pk])
+                for cle in self.cles_produit[pk]:
+                    insort(self.cles, (cle, pk))
+        self.generation = gen
+
+    def a_jour(self):
+        """Met le catalogue à jour ; à appeler avec le verrou"""
+        gen = generation()
+        if self.charge_a is None or time.monotonic() - self.charge_a > DUREE_MAX:
+            self._charger(gen)
+            return
+        if gen == self.generation:
+            return
+        retard = gen - self.generation if self.generation is not None else None
+        if retard is None or not 0 < retard <= RETARD_MAX:
+            self._charger(gen)
+            return
+        journaux = cache.get_many([_cle_journal(g) for g in range(self.generation + 1, gen + 1)])
+        if len(journaux) < retard:
+            self._charger(gen)
+        else:
+            self._rafraichir({pk for ids in journaux.values() for pk in ids}, gen)
+
+    def rechercher(self, requete, limite=NOMBRE_RESULTATS):
+        """
+        Médicaments dont un mot du nom (ou le code) commence par chaque terme
+        de la requête. Un code saisi en entier (scanné) passe en premier.
+        """
+        termes = mots(requete)
+        if not termes:
+            return []
+        code = compacter(requete)
+        with self._verrou:
+            self.a_jour()
+            # Plage de la liste triée couverte par le terme le plus long
+            terme = max(termes, key=len)
+            debut = bisect_left(self.cles, (terme,))
+            fin = bisect_left(self.cles, (terme + _FIN,))
+            resultats = []
+            for pk in dict.fromkeys(pk for _, pk in self.cles[debut:fin]):
+                cles = self.cles_produit[pk]
+                if all(any(cle.startswith(t) for cle in cles) for t in termes):
+                    produit = self.produits[pk]
+                    resultats.append((code not in cles, produit[1].casefold(), pk, produit))
+        return [_description(resultat[-1]) for resultat in heapq.nsmallest(limite, resultats)]
+
+
+def _description(produit):
+    pk, nom, categorie, prix, code, quantite = produit
+    return {
+        'id': pk, 'nom': nom, 'categorie': categorie, 'code': code,
+        'prix': str(prix.quantize(Decimal('0.01'))), 'stock': quantite,
+    }
+
+
+catalogue = Catalogue()
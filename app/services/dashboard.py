@@ -0,0 +1,354 @@
+"""
+Service de statistiques du tableau de bord.
+
+Chaque compteur est calculé par agrégation conditionnelle (Count/Sum avec
+filter=Q(...)), à raison d'une seule requête par table. Les compteurs
+d'activité datés (rendez-vous, consultations, factures, ventes, revenu)
+sont lus dans la table StatistiqueJournaliere plutôt que dans les tables
+sources. Les constructeurs par rôle réutilisent ces agrégats, si bien que
+le tableau de bord coûte un nombre fixe et réduit de requêtes quel que
+soit le rôle. Ces données ne dépendent que du rôle (et du médecin pour
+le rôle MEDECIN) : elles sont partagées via le cache de Django.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q, F, QuerySet
+from django.utils import timezone
+
+from .periodes import debut_jour, bornes_jour, bornes_jours, dans_periode
+from ..models import (
+    Patient, RendezVous, ConsultationMedicale, ExamenLaboratoire,
+    Facture, StockMedicament, MouvementStock, Prescription, StatistiqueJournaliere
+)
+
+
+def periodes(today=None):
+    """Retourne les bornes de dates utilisées par le tableau de bord"""
+    today = today or timezone.localdate()
+    start_week = today - timedelta(days=today.weekday())
+    return {
+        'today': today,
+        'start_week': start_week,
+        'end_week': start_week + timedelta(days=6),
+        'start_month': today.replace(day=1),
+    }
+
+
+# ========================================
+# Agrégats : une requête par table
+# ========================================
+
+def compteurs_patients(p):
+    return Patient.objects.aggregate(
+        total_patients=Count('id'),
+        nouveaux_patients_mois=Count(
+            'id', filter=Q(date_enregistrement__gte=debut_jour(p['start_month']))
+        ),
+        nouveaux_patients_jour=Count(
+            'id', filter=dans_periode('date_enregistrement', bornes_jour(p['today']))
+        ),
+    )
+
+
+def compteurs_activite(p, medecin_id=None):
+    """
+    Compteurs d'activité lus dans StatistiqueJournaliere : une seule requête
+    sur au plus une quarantaine de lignes, quel que soit le volume d'activité.
+    """
+    jour = Q(date=p['today'])
+    semaine = Q(date__range=[p['start_week'], p['end_week']])
+    compteurs = StatistiqueJournaliere.objects.filter(
+        medecin_id=medecin_id,
+        date__range=[min(p['start_week'], p['start_month']), p['end_week']]
+    ).aggregate(
+        rdv_aujourdhui=Sum('rdv', filter=jour),
+        rdv_semaine=Sum('rdv', filter=semaine),
+        consultations_aujourd_hui=Sum('consultations', filter=jour),
+        consultations_semaine=Sum('consultations', filter=semaine),
+        factures_creees_jour=Sum('factures_creees', filter=jour),
+        total_ventes_jour=Sum('ventes', filter=jour),
+        revenu_mois=Sum('revenu', filter=Q(date__gte=p['start_month'])),
+    )
+    return {cle: valeur or 0 for cle, valeur in compteurs.items()}
+
+
+def compteurs_examens(p):
+    jour = bornes_jour(p['today'])
+    return ExamenLaboratoire.objects.aggregate(
+        examens_en_attente=Count('id', filter=Q(statut='DEMANDE')),
+        examens_en_cours=Count('id', filter=Q(statut='EN_COURS')),
+        total_examens_jour=Count('id', filter=dans_periode('date_demande', jour)),
+        examens_termines_jour=Count(
+            'id', filter=dans_periode('date_realisation', jour) & Q(statut='TERMINE')
+        ),
+    )
+
+
+def compteurs_factures():
+    return Facture.objects.aggregate(
+        factures_non_payees=Count('id', filter=Q(statut='EN_ATTENTE')),
+    )
+
+
+def compteurs_stock():
+    return StockMedicament.objects.aggregate(
+        produits_stock_bas=Count('id', filter=Q(quantite__lte=F('seuil_alerte'))),
+        produits_rupture=Count('id', filter=Q(quantite=0)),
+    )
+
+
+# ========================================
+# Constructeurs par rôle
+# ========================================
+
+def statistiques_admin(p, personnel):
+    """Admin: Vue globale du système"""
+    patients = compteurs_patients(p)
+    activite = compteurs_activite(p)
+    examens = compteurs_examens(p)
+    
+    context = {
+        'total_patients': patients['total_patients'],
+        'nouveaux_patients_mois': patients['nouveaux_patients_mois'],
+        'rdv_aujourdhui': activite['rdv_aujourdhui'],
+        'rdv_semaine': activite['rdv_semaine'],
+        'consultations_aujourd_hui': activite['consultations_aujourd_hui'],
+        'consultations_semaine': activite['consultations_semaine'],
+        'examens_en_attente': examens['examens_en_attente'],
+        'examens_en_cours': examens['examens_en_cours'],
+        'factures_non_payees': compteurs_factures()['factures_non_payees'],
+        'revenu_mois': activite['revenu_mois'],
+        'produits_stock_bas': compteurs_stock()['produits_stock_bas'],
+    }
+    
+    # Récupérer les dernières activités
+    context['derniers_patients'] = Patient.objects.order_by('-date_enregistrement')[:5]
+    context['derniers_rdv'] = RendezVous.objects.avec_relations().filter(
+        date_heure__gte=debut_jour(p['today'])
+    ).order_by('date_heure')[:5]
+    context['dernieres_factures'] = Facture.objects.avec_relations().order_by('-date_emission')[:5]
+    return context
+
+
+def statistiques_medecin(p, personnel):
+    """Médecin: Consultations, rendez-vous et patients"""
+    medecin_id = personnel.id
+    activite = compteurs_activite(p, medecin_id=medecin_id)
+    context = {
+        'consultations_aujourd_hui': activite['consultations_aujourd_hui'],
+        'consultations_semaine': activite['consultations_semaine'],
+    }
+    
+    # Rendez-vous du médecin
+    context['rdv_aujourdhui'] = RendezVous.objects.avec_relations().filter(
+        dans_periode('date_heure', bornes_jour(p['today'])),
+        medecin_id=medecin_id
+    ).order_by('date_heure')
+    context['rdv_a_venir'] = RendezVous.objects.avec_relations().filter(
+        dans_periode('date_heure', bornes_jours(p['today'] + timedelta(days=1), p['end_week'])),
+        medecin_id=medecin_id
+    ).order_by('date_heure')
+    
+    # Examens demandés
+    context['examens_en_attente'] = ExamenLaboratoire.objects.avec_relations().filter(
+        medecin_demandeur_id=medecin_id,
+        statut__in=['DEMANDE', 'EN_COURS']
+    ).order_by('-date_demande')
+    
+    # Derniers patients consultés
+    context['derniers_patients'] = Patient.objects.filter(
+        dossier_medical__consultations__medecin_id=medecin_id
+    ).distinct().order_by('-dossier_medical__consultations__date_consultation')[:5]
+    
+    # Prescriptions récentes
+    context['prescriptions_recentes'] = Prescription.objects.avec_relations().filter(
+        medecin_id=medecin_id
+    ).order_by('-date_prescription')[:5]
+    return context
+
+
+def statistiques_infirmier(p, personnel):
+    """Infirmier: Patients et rendez-vous"""
+    context = {
+        'total_patients_jour': compteurs_activite(p)['consultations_aujourd_hui'],
+    }
+    
+    # Rendez-vous du jour
+    context['rdv_aujourdhui'] = RendezVous.objects.avec_relations().filter(
+        dans_periode('date_heure', bornes_jour(p['today']))
+    ).order_by('date_heure')
+    
+    # Patients récemment consultés
+    context['derniers_patients'] = Patient.objects.filter(
+        dans_periode('dossier_medical__consultations__date_consultation', bornes_jour(p['today']))
+    ).distinct().order_by('-dossier_medical__consultations__date_consultation')
+    return context
+
+
+def statistiques_laborantin(p, personnel):
+    """Laborantin: Examens à réaliser"""
+    examens = compteurs_examens(p)
+    context = {
+        'total_examens_jour': examens['total_examens_jour'],
+        'examens_termines_jour': examens['examens_termines_jour'],
+    }
+    
+    # Examens à traiter
+    context['examens_a_traiter'] = ExamenLaboratoire.objects.avec_relations().filter(
+        statut='DEMANDE'
+    ).order_by('-date_demande')
+    context['examens_en_cours'] = ExamenLaboratoire.objects.avec_relations().filter(
+        statut='EN_COURS'
+    ).order_by('-date_demande')
+    
+    # Examens récemment terminés
+    context['examens_recents'] = ExamenLaboratoire.objects.avec_relations().filter(
+        statut='TERMINE'
+    ).order_by('-date_realisation')[:5]
+    return context
+
+
+def statistiques_pharmacien(p, personnel):
+    """Pharmacien: Stock et ventes"""
+    context = {
+        'produits_rupture': compteurs_stock()['produits_rupture'],
+        'total_ventes_jour': compteurs_activite(p)['total_ventes_jour'],
+    }
+    
+    # Alertes de stock
+    context['produits_stock_bas'] = StockMedicament.objects.avec_relations().filter(
+        quantite__lte=F('seuil_alerte')
+    ).order_by('quantite')
+    
+    # Mouvements récents
+    context['mouvements_recents'] = MouvementStock.objects.avec_relations().order_by('-date_mouvement')[:10]
+    
+    # Prescriptions à servir
+    context['prescriptions_recentes'] = Prescription.objects.avec_relations().filter(
+        date_prescription__gte=debut_jour(p['start_week'])
+    ).order_by('-date_prescription')[:5]
+    return context
+
+
+def statistiques_reception(p, personnel):
+    """Réceptionniste: Patients, rendez-vous et facturation"""
+    activite = compteurs_activite(p)
+    context = {
+        'nouveaux_patients_jour': compteurs_patients(p)['nouveaux_patients_jour'],
+        'rdv_crees_jour': activite['rdv_aujourdhui'],
+        'factures_creees_jour': activite['factures_creees_jour'],
+    }
+    
+    # Rendez-vous du jour et du lendemain
+    context['rdv_aujourdhui'] = RendezVous.objects.avec_relations().filter(
+        dans_periode('date_heure', bornes_jour(p['today']))
+    ).order_by('date_heure')
+    context['rdv_demain'] = RendezVous.objects.avec_relations().filter(
+        dans_periode('date_heure', bornes_jour(p['today'] + timedelta(days=1)))
+    ).order_by('date_heure')
+    
+    # Factures non payées
+    context['factures_non_payees'] = Facture.objects.avec_relations().filter(
+        statut='EN_ATTENTE'
+    ).order_by('-date_emission')
+    
+    # Patients récemment enregistrés
+    context['nouveaux_patients'] = Patient.objects.order_by('-date_enregistrement')[:5]
+    return context
+
+
+STATISTIQUES_PAR_ROLE = {
+    'ADMIN': statistiques_admin,
+    'MEDECIN': statistiques_medecin,
+    'INFIRMIER': statistiques_infirmier,
+    'LABORANTIN': statistiques_laborantin,
+    'PHARMACIEN': statistiques_pharmacien,
+    'RECEPTION': statistiques_reception,
+}
+
+# Rôles dont les données dépendent du personnel connecté
+ROLES_PAR_PERSONNEL = ('MEDECIN',)
+
+
+# ========================================
+# Cache partagé entre utilisateurs d'un même rôle
+# ========================================
+
+CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 30)
+CLE_GENERATION = 'dashboard:generation'
+CLE_HITS = 'dashboard:hits'
+CLE_MISSES = 'dashboard:misses'
+
+
+def _incrementer(cle):
+    try:
+        return cache.incr(cle)
+    except ValueError:
+        # La clé n'existe pas encore (ou a été évincée)
+        if cache.add(cle, 1, None):
+            return 1
+        return cache.incr(cle)
+
+
+def _generation():
+    return cache.get_or_set(CLE_GENERATION, 1, None)
+
+
+def invalider_cache_dashboard():
+    """Rend obsolètes toutes les entrées du cache du tableau de bord"""
+    _incrementer(CLE_GENERATION)
+
+
+def statistiques_cache():
+    """Retourne les compteurs de succès/échecs du cache du tableau de bord"""
+    valeurs = cache.get_many([CLE_HITS, CLE_MISSES])
+    hits = valeurs.get(CLE_HITS, 0)
+    misses = valeurs.get(CLE_MISSES, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'taux': round(hits / total, 3) if total else 0,
+    }
+
+
+def cle_cache(role, personnel, p):
+    medecin = personnel.id if role in ROLES_PAR_PERSONNEL and personnel else '-'
+    return f"dashboard:{_generation()}:{role}:{p['today'].isoformat()}:{medecin}"
+
+
+def statistiques_dashboard(role, personnel=None, p=None):
+    """
+    Retourne les données du tableau de bord pour un rôle.
+    
+    Le résultat est mis en cache quelques secondes par rôle, date et médecin
+    (pour le rôle MEDECIN), et invalidé par les signaux dès qu'un rendez-vous,
+    une facture, un stock ou un examen est modifié.
+    
+    Args:
+        role: Rôle de l'utilisateur (clé de STATISTIQUES_PAR_ROLE)
+        personnel: Profil personnel, requis pour le rôle MEDECIN
+        p: Périodes de référence (voir periodes())
+    """
+    constructeur = STATISTIQUES_PAR_ROLE.get(role)
+    if constructeur is None:
+        return {}
+    p = p or periodes()
+    
+    cle = cle_cache(role, personnel, p)
+    context = cache.get(cle)
+    if context is not None:
+        _incrementer(CLE_HITS)
+        return context
+    
+    _incrementer(CLE_MISSES)
+    context = constructeur(p, personnel)
+    # Évaluer les querysets pour pouvoir les mettre en cache
+    context = {
+        cle_contexte: list(valeur) if isinstance(valeur, QuerySet) else valeur
+        for cle_contexte, valeur in context.items()
+    }
+    cache.set(cle, context, CACHE_TIMEOUT)
+    return context
@@ -0,0 +1,88 @@
+"""
+Détection des chevauchements de rendez-vous.
+
+Chaque rendez-vous stocke sa fin (date_fin), si bien qu'un chevauchement
+avec l'intervalle [debut, fin[ s'exprime par deux bornes SQL :
+`date_fin > debut AND date_heure < fin`. L'index (medecin, date_fin,
+date_heure) fait porter la recherche sur les seuls rendez-vous qui se
+terminent après le début demandé, sans parcourir l'historique du médecin.
+
+Ce module est l'unique implémentation utilisée par le formulaire, l'API
+AJAX et les créations groupées. Les grilles de disponibilité précalculées
+se trouvent dans le module agenda.
+"""
+from bisect import bisect_left
+from datetime import timedelta
+
+from ..models import RendezVous
+
+# Statuts qui occupent le créneau du médecin
+STATUTS_ACTIFS = ('PLANIFIE', 'CONFIRME')
+
+
+def fin_rdv(debut, duree):
+    """Retourne la fin d'un rendez-vous commençant à `debut` pour `duree` minutes"""
+    return debut + timedelta(minutes=duree)
+
+
+def rdv_chevauchants(medecin_id, debut, fin, exclure=None):
+    """QuerySet des rendez-vous actifs du médecin qui chevauchent [debut, fin["""
+    queryset = RendezVous.objects.filter(
+        medecin_id=medecin_id,
+        date_fin__gt=debut,
+        date_heure__lt=fin,
+        statut__in=STATUTS_ACTIFS,
+    )
+    if exclure:
+        queryset = queryset.exclude(pk=exclure)
+    return queryset
+
+
+def premier_conflit(medecin_id, debut, duree, exclure=None):
+    """
+    Retourne le premier rendez-vous en conflit (avec son patient), ou None
+    si le créneau est libre.
+    """
+    # Tri en Python : les conflits sont peu nombreux, et un ORDER BY date_heure
+    # pousserait la base à préférer un index qui parcourt tout l'historique
+    conflits = rdv_chevauchants(
+        medecin_id, debut, fin_rdv(debut, duree), exclure
+    ).select_related('patient')
+    return min(conflits, key=lambda rdv: rdv.date_heure, default=None)
+
+
+def conflits_intervalles(medecin_id, intervalles, exclure=()):
+    """
+    Vérifie plusieurs intervalles [debut, fin[ pour un même médecin en une
+    seule requête. Retourne un dictionnaire position -> pk d'un
+    rendez-vous en conflit, pour les seuls intervalles en conflit.
+    """
+    if not intervalles:
+        return {}
+    debut_min = min(debut for debut, fin in intervalles)
+    fin_max = max(fin for debut, fin in intervalles)
+    existants = list(
+        rdv_chevauchants(medecin_id, debut_min, fin_max)
+        .exclude(pk__in=exclure)
+        .values_list('pk', 'date_heure', 'date_fin')
+    )
+    existants.sort(key=lambda ligne: ligne[1])
+    debuts = [date_heure for pk, date_heure, date_fin in existants]
+
+    # Fin maximale des rendez-vous existants jusqu'à chaque position
+    fins_max = []
+    for pk, date_heure, date_fin in existants:
+        fins_max.append(max(date_fin, fins_max[-1]) if fins_max else date_fin)
+
+    conflits = {}
+    for position, (debut, fin) in enumerate(intervalles):
+        # Candidats : rendez-vous qui commencent avant la fin demandée
+        k = bisect_left(debuts, fin)
+        if k == 0 or fins_max[k - 1] <= debut:
+            continue
+        for j in range(k - 1, -1, -1):
+            if existants[j][2] > debut:
+                conflits[position] = existants[j][0]
+                break
+    return conflits
+
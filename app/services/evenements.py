@@ -0,0 +1,157 @@
+"""
+Diffusion en direct des événements de rendez-vous (server-sent events).
+
+Les signaux publient, après validation de la transaction, un événement par
+rendez-vous créé, modifié, supprimé ou changé de statut. La vue de flux
+(rendez_vous_flux) abonne chaque navigateur au broker et lui transmet les
+événements qui le concernent.
+
+Le broker par défaut (BrokerMemoire) diffuse en mémoire, à l'intérieur d'un
+seul processus : il convient à un serveur ASGI à un seul worker. Le réglage
+RDV_EVENTS_BROKER permet de le remplacer par tout broker implémentant
+l'interface BrokerEvenements (par exemple un pub/sub Redis pour plusieurs
+workers).
+"""
+import asyncio
+from functools import lru_cache
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Événements gardés en attente par abonné (les plus anciens sont abandonnés)
+TAILLE_FILE = 100
+
+
+class Abonnement:
+    """File d'événements d'un abonné, consommée dans sa boucle asyncio"""
+
+    def __init__(self, broker, taille=TAILLE_FILE):
+        self.broker = broker
+        self.boucle = asyncio.get_running_loop()
+        self.file = asyncio.Queue(taille)
+
+    def deposer(self, evenement):
+        # Un abonné trop lent perd ses événements les plus anciens
+        if self.file.full():
+            self.file.get_nowait()
+        self.file.put_nowait(evenement)
+
+    async def recevoir(self):
+        return await self.file.get()
+
+    def fermer(self):
+        self.broker.desabonner(self)
+
+
+class BrokerEvenements:
+    """
+    Interface commune des brokers d'événements.
+
+    publier() est appelé depuis le code synchrone (signaux) ; abonner() est
+    appelé dans une boucle asyncio et retourne un objet exposant
+    `await recevoir()` et `fermer()`.
+    """
+
+    def publier(self, evenement):
+        raise NotImplementedError
+
+    def abonner(self):
+        raise NotImplementedError
+
+    def desabonner(self, abonnement):
+        pass
+
+
+class BrokerMemoire(BrokerEvenements):
+    """Diffusion en mémoire aux abonnés du processus courant"""
+
+    def __init__(self):
+        self._abonnements = set()
+        self._verrou = Lock()
+
+    def abonner(self):
+        abonnement = Abonnement(self)
+        with self._verrou:
+            self._abonnements.add(abonnement)
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            self._abonnements.discard(abonnement)
+
+    def publier(self, evenement):
+        with self._verrou:
+            abonnements = list(self._abonnements)
+        for abonnement in abonnements:
+            try:
+                # Les signaux s'exécutent hors de la boucle de l'abonné
+                abonnement.boucle.call_soon_threadsafe(abonnement.deposer, evenement)
+            except RuntimeError:
+                # Boucle fermée : l'abonné a disparu sans se désabonner
+                self.desabonner(abonnement)
+
+
+@lru_cache(maxsize=None)
+def broker():
+    """Retourne l'instance du broker configuré par RDV_EVENTS_BROKER"""
+    chemin = getattr(settings, 'RDV_EVENTS_BROKER', 'app.services.evenements.BrokerMemoire')
+    return import_string(chemin)()
+
+
+def publier_apres_commit(evenement):
+    transaction.on_commit(lambda: broker().publier(evenement))
+
+
+# ========================================
+# Contenu des événements
+# ========================================
+
+def _jour_heure(date_heure):
+    local = timezone.localtime(date_heure) if settings.USE_TZ else date_heure
+    return local.date().isoformat(), f"{local.hour:02d}:{local.minute:02d}"
+
+
+def evenement_rdv(type_evenement, rdv):
+    """Événement complet pour un rendez-vous créé ou modifié"""
+    jour, heure = _jour_heure(rdv.date_heure)
+    return {
+        'type': type_evenement,
+        'id': rdv.pk,
+        'medecin_id': rdv.medecin_id,
+        'jour': jour,
+        'heure': heure,
+        'duree': rdv.duree,
+        'statut': rdv.statut,
+        'libelle': rdv.get_statut_display(),
+        'patient': f"{rdv.patient.nom} {rdv.patient.prenom}",
+        'motif': rdv.motif,
+    }
+
+
+def evenement_court(type_evenement, medecin_id, date_heure, **donnees):
+    """Événement réduit (suppression, changement de statut, opération groupée)"""
+    jour, heure = _jour_heure(date_heure)
+    return {'type': type_evenement, 'medecin_id': medecin_id, 'jour': jour, 'heure': heure, **donnees}
+
+
+def avec_position_precedente(evenement, medecin_id, date_heure):
+    """Ajoute le médecin et le jour d'un rendez-vous avant son déplacement"""
+    jour, heure = _jour_heure(date_heure)
+    evenement['avant'] = {'medecin_id': medecin_id, 'jour': jour}
+    return evenement
+
+
+def concerne(evenement, medecin_id=None, jour=None):
+    """
+    Filtre d'un abonné : médecin et jour affichés, s'ils sont indiqués. Un
+    rendez-vous déplacé concerne aussi le médecin et le jour qu'il quitte.
+    """
+    def correspond(position):
+        if medecin_id and str(position['medecin_id']) != str(medecin_id):
+            return False
+        return not jour or position['jour'] == jour
+
+    return correspond(evenement) or ('avant' in evenement and correspond(evenement['avant']))
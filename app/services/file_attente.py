@@ -0,0 +1,281 @@
+"""
+File d'attente des patients au cabinet, par médecin.
+
+Les patients sans rendez-vous et les patients arrivés pour un rendez-vous
+partagent la même file. Ils passent par priorité de triage, puis par heure
+de référence : l'heure d'arrivée, ou l'heure du rendez-vous pour un patient
+arrivé en avance (il passe à son heure, et non avant les patients arrivés
+avant lui). L'heure de référence est enregistrée avec le passage.
+
+La table FileAttente est la seule référence, sans copie en mémoire : tous
+les processus voient la même file. Seuls les passages arrivés depuis minuit
+sont pris en compte, la file repart donc vide chaque jour. Le patient
+suivant est lu dans la base (index sur médecin, statut et heure d'arrivée)
+et verrouillé par select_for_update ; l'UPDATE conditionné au statut
+EN_ATTENTE protège aussi des appels concurrents sur les bases qui ignorent
+ce verrou (SQLite). Une contrainte d'unicité empêche d'enregistrer deux
+fois l'arrivée d'un même rendez-vous.
+
+L'attente estimée se fonde sur la moyenne glissante des dernières durées
+de consultation du médecin (de l'appel à la fin de la consultation).
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .evenements import evenement_court, publier_apres_commit
+from .periodes import debut_jour
+from .transitions import changer_statuts
+from ..models import FileAttente
+
+# Durée de consultation supposée tant qu'aucune n'a été mesurée, en minutes
+DUREE_DEFAUT = getattr(settings, 'FILE_ATTENTE_DUREE_DEFAUT', 15)
+
+# Nombre de consultations prises en compte dans la moyenne glissante
+FENETRE_DUREES = getattr(settings, 'FILE_ATTENTE_FENETRE', 20)
+
+LIBELLES_PRIORITE = dict(FileAttente.PRIORITE_CHOICES)
+
+# Statuts d'un patient présent (en attente ou en consultation)
+STATUTS_PRESENTS = ('EN_ATTENTE', 'APPELE')
+
+# Ordre de passage des patients en attente
+ORDRE_PASSAGE = ('priorite', 'heure_reference', 'pk')
+
+
+class FileIndisponible(Exception):
+    """Arrivée ou opération impossible sur la file d'attente"""
+
+
+def reference(heure_arrivee, date_rendez_vous=None):
+    """Heure de classement d'un patient dans la file"""
+    if date_rendez_vous is not None and date_rendez_vous > heure_arrivee:
+        return date_rendez_vous
+    return heure_arrivee
+
+
+def _du_jour(medecin_id):
+    """Passages d'un médecin arrivés depuis minuit"""
+    return FileAttente.objects.filter(
+        medecin_id=medecin_id, heure_arrivee__gte=debut_jour(timezone.localdate()),
+    )
+
+
+def _publier(medecin_id, action, **donnees):
+    publier_apres_commit(evenement_court('file', medecin_id, timezone.now(), action=action, **donnees))
+
+
+def duree_moyenne(medecin_id):
+    """Durée moyenne des dernières consultations d'un médecin, en secondes"""
+    durees = [
+        (heure_fin - heure_appel).total_seconds()
+        for heure_appel, heure_fin in FileAttente.objects
+        .filter(medecin_id=medecin_id, statut='TERMINE', heure_appel__isnull=False, heure_fin__isnull=False)
+        .order_by('-heure_fin')
+        .values_list('heure_appel', 'heure_fin')[:FENETRE_DUREES]
+    ]
+    if not durees:
+        return DUREE_DEFAUT * 60
+    return sum(durees) / len(durees)
+
+
+# ========================================
+# Opérations
+# ========================================
+
+def _revenir(rendez_vous):
+    """
+    Remet en file le passage existant d'un rendez-vous dont le patient était
+    parti ; retourne None si le rendez-vous n'a pas encore de passage.
+    """
+    passage = FileAttente.objects.select_for_update().filter(rendez_vous=rendez_vous).first()
+    if passage is None:
+        return None
+    if passage.statut != 'PARTI':
+        raise FileIndisponible("Ce patient est déjà dans la file d'attente.")
+    passage.statut = 'EN_ATTENTE'
+    passage.heure_arrivee = timezone.now()
+    passage.heure_reference = reference(passage.heure_arrivee, rendez_vous.date_heure)
+    passage.heure_fin = None
+    passage.save(update_fields=['statut', 'heure_arrivee', 'heure_reference', 'heure_fin'])
+    return passage
+
+
+def enregistrer_arrivee(patient_id=None, medecin_id=None, priorite=3, rendez_vous=None):
+    """
+    Ajoute un patient à la file. Pour un patient arrivé à son rendez-vous,
+    le patient et le médecin sont ceux du rendez-vous. Retourne le passage.
+    """
+    if priorite not in LIBELLES_PRIORITE:
+        raise FileIndisponible("Priorité inconnue.")
+    if rendez_vous is not None:
+        if rendez_vous.statut in ('TERMINE', 'ANNULE'):
+            raise FileIndisponible("Ce rendez-vous est terminé ou annulé.")
+        patient_id, medecin_id = rendez_vous.patient_id, rendez_vous.medecin_id
+    with transaction.atomic():
+        if _du_jour(medecin_id).filter(patient_id=patient_id, statut__in=STATUTS_PRESENTS).exists():
+            raise FileIndisponible("Ce patient est déjà dans la file d'attente.")
+        passage = _revenir(rendez_vous) if rendez_vous is not None else None
+        if passage is None:
+            maintenant = timezone.now()
+            try:
+                # Point de sauvegarde : la transaction reste utilisable si
+                # une arrivée concurrente pour le même rendez-vous l'emporte
+                with transaction.atomic():
+                    passage = FileAttente.objects.create(
+                        patient_id=patient_id, medecin_id=medecin_id, priorite=priorite,
+                        rendez_vous=rendez_vous, heure_arrivee=maintenant,
+                        heure_reference=reference(maintenant, rendez_vous.date_heure if rendez_vous else None),
+                    )
+            except IntegrityError:
+                raise FileIndisponible("Ce patient est déjà dans la file d'attente.")
+        _publier(medecin_id, 'arrivee', passage=passage.pk)
+    return passage
+
+
+def _terminer_en_cours(medecin_id, maintenant):
+    """Clôt la consultation en cours ; retourne l'id du passage clos ou None"""
+    en_cours = list(
+        FileAttente.objects.select_for_update()
+        .filter(medecin_id=medecin_id, statut='APPELE')
+        .values_list('pk', 'heure_appel', 'rendez_vous_id')
+    )
+    if not en_cours:
+        return None
+    FileAttente.objects.filter(pk__in=[ligne[0] for ligne in en_cours], statut='APPELE').update(
+        statut='TERMINE', heure_fin=maintenant
+    )
+    # Les rendez-vous honorés passent à TERMINE et échappent au balayage des
+    # absences (changer_statuts ignore ceux dont le statut ne le permet pas)
+    rendez_vous = [ligne[2] for ligne in en_cours if ligne[2]]
+    if rendez_vous:
+        changer_statuts(rendez_vous, 'TERMINE')
+    return max(en_cours, key=lambda ligne: ligne[1])[0]
+
+
+def terminer_consultation(medecin_id):
+    """Clôt la consultation en cours sans appeler de patient"""
+    with transaction.atomic():
+        termine = _terminer_en_cours(medecin_id, timezone.now())
+        if termine is not None:
+            _publier(medecin_id, 'fin', passage=termine)
+    return termine is not None
+
+
+def appeler_suivant(medecin_id, tentatives=5):
+    """
+    Clôt la consultation en cours et appelle le premier patient de la file.
+    Retourne le passage appelé, ou None si la file est vide.
+    """
+    for _ in range(tentatives):
+        maintenant = timezone.now()
+        with transaction.atomic():
+            termine = _terminer_en_cours(medecin_id, maintenant)
+            pk = (
+                _du_jour(medecin_id).select_for_update()
+                .filter(statut='EN_ATTENTE').order_by(*ORDRE_PASSAGE)
+                .values_list('pk', flat=True).first()
+            )
+            if pk is not None and not FileAttente.objects.filter(pk=pk, statut='EN_ATTENTE').update(
+                statut='APPELE', heure_appel=maintenant
+            ):
+                # Patient appelé ou retiré entre-temps depuis un autre poste
+                transaction.set_rollback(True)
+                continue
+            if termine is not None or pk is not None:
+                _publier(medecin_id, 'appel', passage=pk)
+        if pk is None:
+            return None
+        return FileAttente.objects.select_related('patient', 'rendez_vous').get(pk=pk)
+    raise FileIndisponible("La file d'attente a changé pendant l'appel, veuillez réessayer.")
+
+
+def _passage_en_attente(pk):
+    medecin_id = FileAttente.objects.filter(pk=pk, statut='EN_ATTENTE').values_list('medecin_id', flat=True).first()
+    if medecin_id is None:
+        raise FileIndisponible("Ce patient n'est plus en attente.")
+    return medecin_id
+
+
+def changer_priorite(pk, priorite):
+    """Modifie la priorité de triage d'un patient en attente"""
+    if priorite not in LIBELLES_PRIORITE:
+        raise FileIndisponible("Priorité inconnue.")
+    with transaction.atomic():
+        medecin_id = _passage_en_attente(pk)
+        if not FileAttente.objects.filter(pk=pk, statut='EN_ATTENTE').update(priorite=priorite):
+            raise FileIndisponible("Ce patient n'est plus en attente.")
+        _publier(medecin_id, 'priorite', passage=pk, priorite=priorite)
+
+
+def retirer(pk):
+    """Retire de la file un patient parti sans être reçu"""
+    with transaction.atomic():
+        medecin_id = _passage_en_attente(pk)
+        if not FileAttente.objects.filter(pk=pk, statut='EN_ATTENTE').update(
+            statut='PARTI', heure_fin=timezone.now()
+        ):
+            raise FileIndisponible("Ce patient n'est plus en attente.")
+        _publier(medecin_id, 'depart', passage=pk)
+
+
+# ========================================
+# Consultation de la file
+# ========================================
+
+def etat_file(medecin_id):
+    """
+    Retourne l'état de la file d'un médecin : consultation en cours, patients
+    en attente dans l'ordre de passage avec leur attente estimée (minutes),
+    et durée moyenne des consultations (minutes). Deux requêtes.
+    """
+    passages = list(
+        _du_jour(medecin_id).filter(statut__in=STATUTS_PRESENTS)
+        .select_related('patient', 'rendez_vous').order_by(*ORDRE_PASSAGE)
+    )
+    en_cours = max(
+        (passage for passage in passages if passage.statut == 'APPELE'),
+        key=lambda passage: passage.heure_appel, default=None,
+    )
+    moyenne = duree_moyenne(medecin_id)
+
+    # Temps restant estimé pour la consultation en cours
+    restant = 0
+    if en_cours is not None:
+        restant = max(0, moyenne - (timezone.now() - en_cours.heure_appel).total_seconds())
+
+    def description(passage):
+        return {
+            'id': passage.pk,
+            'patient': f"{passage.patient.nom} {passage.patient.prenom}",
+            'patient_id': passage.patient_id,
+            'priorite': passage.priorite,
+            'libelle_priorite': passage.get_priorite_display(),
+            'rendez_vous_id': passage.rendez_vous_id,
+            'heure_rendez_vous': (
+                timezone.localtime(passage.rendez_vous.date_heure).strftime('%H:%M')
+                if passage.rendez_vous else None
+            ),
+            'heure_arrivee': timezone.localtime(passage.heure_arrivee).strftime('%H:%M'),
+        }
+
+    attente = []
+    for position, passage in enumerate(passage for passage in passages if passage.statut == 'EN_ATTENTE'):
+        ligne = description(passage)
+        ligne['attente_estimee'] = round((restant + position * moyenne) / 60)
+        attente.append(ligne)
+    return {
+        'medecin_id': medecin_id,
+        'en_cours': description(en_cours) if en_cours is not None else None,
+        'attente': attente,
+        'duree_moyenne': round(moyenne / 60, 1),
+    }
+
+
+def rendez_vous_en_file(ids):
+    """Ids, parmi `ids`, des rendez-vous dont le patient est présent (en attente ou en consultation)"""
+    return set(
+        FileAttente.objects
+        .filter(rendez_vous_id__in=ids, statut__in=STATUTS_PRESENTS)
+        .values_list('rendez_vous_id', flat=True)
+    )
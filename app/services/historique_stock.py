@@ -0,0 +1,199 @@
+"""
+Historique des stocks : instantanés de fin de journée et reconstitution.
+
+StockMedicament ne garde que la quantité actuelle. La table InstantaneStock
+garde le stock de fin de journée de chaque médicament pour chaque jour où
+il a changé (un mouvement ou une modification directe du stock). Le stock
+d'un médicament à un instant donné est son dernier instantané antérieur,
+plus les mouvements survenus depuis le jour de cet instantané, au lieu de
+la somme de tout l'historique des mouvements.
+
+Les instantanés sont calculés à rebours depuis le stock actuel (qui fait
+foi) : stock en fin de journée = stock actuel - mouvements postérieurs. La
+commande instantanes_stock enregistre ceux de la veille (à lancer chaque
+nuit) ou reconstruit tout l'historique.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import TruncDate
+
+from .periodes import bornes_jour, debut_jour
+from .statistiques import jour_local
+from ..models import InstantaneStock, Medicament, MouvementStock, StockMedicament
+
+# Taille des lots d'insertion lors d'une reconstruction
+TAILLE_LOT = 2000
+
+
+def _variation_nette():
+    return Sum(Case(
+        When(type_mouvement='ENTREE', then=F('quantite')),
+        default=-F('quantite'),
+        output_field=IntegerField(),
+    ))
+
+
+def _mouvements(debut=None, fin=None, medicament_ids=None):
+    queryset = MouvementStock.objects.all()
+    if debut is not None:
+        queryset = queryset.filter(date_mouvement__gte=debut)
+    if fin is not None:
+        queryset = queryset.filter(date_mouvement__lt=fin)
+    if medicament_ids is not None:
+        queryset = queryset.filter(medicament_id__in=medicament_ids)
+    return queryset
+
+
+def variations(debut=None, fin=None, medicament_ids=None):
+    """Variation nette du stock de chaque médicament entre debut et fin : {id: quantité}"""
+    return dict(
+        _mouvements(debut, fin, medicament_ids)
+        .values_list('medicament_id').order_by().annotate(net=_variation_nette())
+    )
+
+
+def consommation(debut, fin, medicament_ids=None):
+    """Quantités sorties de chaque médicament entre debut et fin : {id: quantité}"""
+    return dict(
+        _mouvements(debut, fin, medicament_ids).filter(type_mouvement='SORTIE')
+        .values_list('medicament_id').order_by().annotate(total=Sum('quantite'))
+    )
+
+
+# ========================================
+# Stock à un instant donné
+# ========================================
+
+def stocks_a(instant, medicament_ids=None):
+    """
+    Stock de chaque médicament à un instant donné : {id: quantité}.
+    Chaque médicament part de son propre dernier instantané antérieur au
+    jour de l'instant, et seuls les mouvements postérieurs à ce jour sont
+    rejoués : une nuit sans instantané ne fait perdre aucun mouvement.
+    Au plus trois requêtes quel que soit le nombre de médicaments.
+    """
+    recents = (
+        InstantaneStock.objects
+        .filter(medicament=OuterRef('pk'), date__lt=jour_local(instant))
+        .order_by('-date')
+    )
+    medicaments = Medicament.objects.order_by().annotate(
+        base=Subquery(recents.values('quantite')[:1]),
+        jour_base=Subquery(recents.values('date')[:1]),
+    )
+    if medicament_ids is not None:
+        medicaments = medicaments.filter(pk__in=medicament_ids)
+
+    stocks = {}
+    sans_instantane = {}
+    par_jour = defaultdict(list)
+    for pk, base, jour_base, actuel in medicaments.values_list('pk', 'base', 'jour_base', 'stock__quantite'):
+        if base is None:
+            sans_instantane[pk] = actuel or 0
+        else:
+            stocks[pk] = base
+            par_jour[jour_base].append(pk)
+
+    # Mouvements de chaque médicament depuis le lendemain de son instantané
+    if par_jour:
+        depuis = Q()
+        for jour_base, ids in par_jour.items():
+            depuis |= Q(medicament_id__in=ids, date_mouvement__gte=debut_jour(jour_base + timedelta(days=1)))
+        for pk, net in (
+            _mouvements(fin=instant).filter(depuis)
+            .values_list('medicament_id').order_by().annotate(net=_variation_nette())
+        ):
+            stocks[pk] += net
+
+    # Sans instantané antérieur : à rebours depuis le stock actuel
+    if sans_instantane:
+        posterieurs = variations(debut=instant, medicament_ids=list(sans_instantane))
+        for pk, actuel in sans_instantane.items():
+            stocks[pk] = actuel - posterieurs.get(pk, 0)
+    return stocks
+
+
+def stock_a(medicament_id, instant):
+    """Stock d'un médicament à un instant donné"""
+    return stocks_a(instant, [medicament_id]).get(medicament_id, 0)
+
+
+# ========================================
+# Enregistrement des instantanés
+# ========================================
+
+def _stocks_actuels(medicament_ids=None):
+    queryset = StockMedicament.objects.all()
+    if medicament_ids is not None:
+        queryset = queryset.filter(medicament_id__in=medicament_ids)
+    return dict(queryset.values_list('medicament_id', 'quantite'))
+
+
+@transaction.atomic
+def enregistrer_instantanes(jour):
+    """
+    Enregistre le stock de fin de journée des médicaments dont le stock a
+    changé ce jour-là. Retourne le nombre d'instantanés enregistrés.
+    """
+    debut, fin = bornes_jour(jour)
+    medicament_ids = set(
+        _mouvements(debut, fin).values_list('medicament_id', flat=True).distinct()
+    ) | set(
+        StockMedicament.objects.filter(date_mise_a_jour__gte=debut, date_mise_a_jour__lt=fin)
+        .values_list('medicament_id', flat=True)
+    )
+    if not medicament_ids:
+        return 0
+    actuels = _stocks_actuels(medicament_ids)
+    posterieurs = variations(debut=fin, medicament_ids=medicament_ids)
+    InstantaneStock.objects.bulk_create(
+        [
+            InstantaneStock(
+                medicament_id=pk, date=jour, quantite=actuels.get(pk, 0) - posterieurs.get(pk, 0)
+            )
+            for pk in sorted(medicament_ids)
+        ],
+        update_conflicts=True, unique_fields=['medicament', 'date'], update_fields=['quantite'],
+    )
+    return len(medicament_ids)
+
+
+@transaction.atomic
+def reconstruire_instantanes(debut=None):
+    """
+    Recalcule les instantanés de tous les jours comportant des mouvements
+    depuis `debut` (tout l'historique par défaut), à rebours depuis les
+    stocks actuels, en une requête groupée. Retourne le nombre d'instantanés.
+    """
+    mouvements = _mouvements(debut=debut_jour(debut) if debut else None)
+    nets = defaultdict(list)
+    for medicament_id, jour, net in (
+        mouvements.annotate(jour=TruncDate('date_mouvement'))
+        .values_list('medicament_id', 'jour').order_by().annotate(net=_variation_nette())
+    ):
+        nets[medicament_id].append((jour, net))
+    actuels = _stocks_actuels()
+
+    suppression = InstantaneStock.objects.all()
+    if debut:
+        suppression = suppression.filter(date__gte=debut)
+    suppression.delete()
+
+    instantanes = []
+    nombre = 0
+    for medicament_id, jours in nets.items():
+        # Du plus récent au plus ancien : le stock de fin de journée est le
+        # stock actuel moins les mouvements des jours suivants
+        quantite = actuels.get(medicament_id, 0)
+        for jour, net in sorted(jours, reverse=True):
+            instantanes.append(InstantaneStock(medicament_id=medicament_id, date=jour, quantite=quantite))
+            quantite -= net
+        if len(instantanes) >= TAILLE_LOT:
+            InstantaneStock.objects.bulk_create(instantanes)
+            nombre += len(instantanes)
+            instantanes = []
+    InstantaneStock.objects.bulk_create(instantanes)
+    return nombre + len(instantanes)
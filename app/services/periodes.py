@@ -0,0 +1,51 @@
+"""
+Bornes de périodes sous forme d'intervalles d'horodatages semi-ouverts.
+
+Un filtre `champ__date=jour` applique une conversion en date à la colonne,
+ce qui empêche la base d'utiliser un index sur l'horodatage. Les fonctions
+de ce module produisent à la place des bornes `>= debut AND < fin`, calculées
+dans le fuseau horaire courant (le même que celui utilisé par `__date`), et
+donc équivalentes mais exploitables par un index.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+
+def debut_jour(jour):
+    """Retourne l'horodatage de minuit pour une date, dans le fuseau courant"""
+    debut = datetime.combine(jour, time.min)
+    if settings.USE_TZ:
+        return timezone.make_aware(debut)
+    return debut
+
+
+def bornes_jours(premier, dernier):
+    """Retourne l'intervalle [premier 00:00, lendemain du dernier 00:00["""
+    return debut_jour(premier), debut_jour(dernier + timedelta(days=1))
+
+
+def bornes_jour(jour):
+    """Retourne l'intervalle couvrant une journée"""
+    return bornes_jours(jour, jour)
+
+
+def bornes_semaine(jour):
+    """Retourne l'intervalle couvrant la semaine (lundi à dimanche) d'une date"""
+    lundi = jour - timedelta(days=jour.weekday())
+    return bornes_jours(lundi, lundi + timedelta(days=6))
+
+
+def bornes_mois(jour):
+    """Retourne l'intervalle couvrant le mois d'une date"""
+    premier = jour.replace(day=1)
+    suivant = (premier + timedelta(days=32)).replace(day=1)
+    return debut_jour(premier), debut_jour(suivant)
+
+
+def dans_periode(champ, bornes):
+    """Construit le filtre `champ >= debut AND champ < fin` pour des bornes données"""
+    debut, fin = bornes
+    return Q(**{f'{champ}__gte': debut, f'{champ}__lt': fin})
@@ -0,0 +1,200 @@
+"""
+Suggestions de réapprovisionnement calculées sur la consommation réelle.
+
+Les sorties de stock des derniers jours sont agrégées par médicament et par
+jour en une seule requête groupée, puis rangées dans une matrice NumPy
+(médicaments x jours). La demande journalière de tous les médicaments est
+estimée d'un coup, par moyenne glissante ou par lissage exponentiel, ainsi
+que sa dispersion, d'où pour chaque médicament :
+
+- la couverture : nombre de jours que le stock actuel permet de tenir ;
+- le point de commande : demande pendant le délai de livraison plus un
+  stock de sécurité ;
+- la quantité suggérée : de quoi couvrir le délai de livraison et la
+  période de couverture visée, moins le stock actuel.
+
+Les médicaments sous leur point de commande sont classés par couverture
+croissante. L'inventaire de la pharmacie lit ces suggestions dans le cache
+de Django, recalculées au plus toutes les REAPPRO_CACHE_TIMEOUT secondes :
+une demande estimée sur des semaines d'historique ne change guère d'une
+vente à l'autre. La commande suggestions_reapprovisionnement peut aussi recopier
+les points de commande dans StockMedicament.seuil_alerte, utilisé par les
+alertes du tableau de bord.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .periodes import debut_jour
+from ..models import Medicament, MouvementStock, StockMedicament
+
+METHODES = ('moyenne', 'lissage')
+
+# Nombre de jours d'historique pris en compte
+HISTORIQUE = getattr(settings, 'REAPPRO_HISTORIQUE', 90)
+
+# Méthode d'estimation de la demande et ses paramètres
+METHODE = getattr(settings, 'REAPPRO_METHODE', 'lissage')
+FENETRE = getattr(settings, 'REAPPRO_FENETRE', 28)
+ALPHA = getattr(settings, 'REAPPRO_ALPHA', 0.2)
+
+# Délai de livraison et couverture visée après livraison (jours)
+DELAI = getattr(settings, 'REAPPRO_DELAI', 7)
+COUVERTURE = getattr(settings, 'REAPPRO_COUVERTURE', 30)
+
+# Facteur du stock de sécurité (1.65 : rupture évitée dans 95 % des cas)
+FACTEUR_SECURITE = getattr(settings, 'REAPPRO_FACTEUR_SECURITE', 1.65)
+
+# Durée de vie (secondes) des suggestions de l'inventaire en cache
+DUREE_CACHE = getattr(settings, 'REAPPRO_CACHE_TIMEOUT', 300)
+
+Suggestion = namedtuple(
+    'Suggestion',
+    ['medicament_id', 'nom', 'stock', 'demande', 'couverture', 'point_commande', 'quantite'],
+)
+
+
+def _indice_jour(bornes, debut=0, fin=None):
+    """
+    Expression SQL du numéro de jour d'un mouvement : bornes[i] est le début
+    du jour i. Les CASE sont imbriqués par dichotomie (sept comparaisons
+    pour 90 jours) et n'appellent aucune fonction de date, ce qui évite la
+    conversion de fuseau ligne par ligne de TruncDate.
+    """
+    fin = len(bornes) - 1 if fin is None else fin
+    if fin - debut == 1:
+        return Value(debut)
+    milieu = (debut + fin) // 2
+    return Case(
+        When(date_mouvement__lt=bornes[milieu], then=_indice_jour(bornes, debut, milieu)),
+        default=_indice_jour(bornes, milieu, fin),
+        output_field=IntegerField(),
+    )
+
+
+def consommations(jours=HISTORIQUE, aujourdhui=None):
+    """
+    Sorties journalières des `jours` derniers jours complets.
+    Retourne (ids, noms, stocks, matrice) : ids triés, et une matrice
+    médicaments x jours, du plus ancien au plus récent.
+    """
+    aujourdhui = aujourdhui or timezone.localdate()
+    bornes = [debut_jour(aujourdhui - timedelta(days=jours - i)) for i in range(jours + 1)]
+    medicaments = list(Medicament.objects.order_by('pk').values_list('pk', 'nom', 'stock__quantite'))
+    ids = np.fromiter((ligne[0] for ligne in medicaments), dtype=np.int64, count=len(medicaments))
+    noms = [ligne[1] for ligne in medicaments]
+    stocks = np.fromiter((ligne[2] or 0 for ligne in medicaments), dtype=np.float64, count=len(medicaments))
+
+    sorties = np.array(
+        MouvementStock.objects
+        .filter(type_mouvement='SORTIE', date_mouvement__gte=bornes[0], date_mouvement__lt=bornes[-1])
+        .annotate(jour=_indice_jour(bornes))
+        .values_list('medicament_id', 'jour').order_by()
+        .annotate(total=Sum('quantite')),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    matrice = np.zeros((len(ids), jours))
+    matrice[np.searchsorted(ids, sorties[:, 0]), sorties[:, 1]] = sorties[:, 2]
+    return ids, noms, stocks, matrice
+
+
+def demande_journaliere(matrice, methode=METHODE, fenetre=FENETRE, alpha=ALPHA):
+    """
+    Demande journalière estimée et son écart type pour chaque ligne de la
+    matrice : moyenne des `fenetre` derniers jours, ou lissage exponentiel
+    (s = alpha * x + (1 - alpha) * s, initialisé au premier jour), calculé
+    comme un produit par les poids de chaque jour.
+    """
+    if methode not in METHODES:
+        raise ValueError(f"Méthode inconnue : {methode}")
+    if methode == 'moyenne':
+        recents = matrice[:, -fenetre:]
+        return recents.mean(axis=1), recents.std(axis=1)
+
+    jours = matrice.shape[1]
+    poids = alpha * (1 - alpha) ** np.arange(jours - 1, -1, -1)
+    poids[0] = (1 - alpha) ** (jours - 1)
+    demande = matrice @ poids
+    variance = ((matrice - demande[:, None]) ** 2) @ poids
+    return demande, np.sqrt(variance)
+
+
+def calculer(jours=HISTORIQUE, methode=METHODE, delai=DELAI, couverture=COUVERTURE, aujourdhui=None):
+    """
+    Calcule les indicateurs de tous les médicaments. Retourne un dict de
+    tableaux NumPy alignés sur `ids` : noms, stocks, demande, couverture,
+    point_commande, quantite.
+    """
+    ids, noms, stocks, matrice = consommations(jours, aujourdhui)
+    demande, ecart = demande_journaliere(matrice, methode)
+    securite = FACTEUR_SECURITE * ecart * np.sqrt(delai)
+    point_commande = np.ceil(demande * delai + securite)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jours_couverts = np.where(demande > 0, stocks / demande, np.inf)
+    quantite = np.maximum(np.ceil(demande * (delai + couverture) + securite - stocks), 0)
+    return {
+        'ids': ids, 'noms': noms, 'stocks': stocks, 'demande': demande,
+        'couverture': jours_couverts, 'point_commande': point_commande, 'quantite': quantite,
+    }
+
+
+def suggestions(limite=None, **options):
+    """
+    Médicaments consommés dont le stock est au plus à leur point de
+    commande, du moins couvert au plus couvert (puis par quantité suggérée
+    décroissante). Retourne une liste de Suggestion.
+    """
+    resultats = calculer(**options)
+    a_commander = np.flatnonzero(
+        (resultats['demande'] > 0) & (resultats['stocks'] <= resultats['point_commande'])
+        & (resultats['quantite'] > 0)
+    )
+    ordre = a_commander[np.lexsort((
+        -resultats['quantite'][a_commander], resultats['couverture'][a_commander]
+    ))]
+    if limite is not None:
+        ordre = ordre[:limite]
+    return [
+        Suggestion(
+            medicament_id=int(resultats['ids'][i]),
+            nom=resultats['noms'][i],
+            stock=int(resultats['stocks'][i]),
+            demande=round(float(resultats['demande'][i]), 2),
+            couverture=round(float(resultats['couverture'][i]), 1),
+            point_commande=int(resultats['point_commande'][i]),
+            quantite=int(resultats['quantite'][i]),
+        )
+        for i in ordre
+    ]
+
+
+def suggestions_en_cache(limite=None):
+    """Suggestions avec les réglages par défaut, gardées DUREE_CACHE secondes"""
+    cle = f"reappro:suggestions:{timezone.localdate().isoformat()}:{limite}"
+    return cache.get_or_set(cle, lambda: suggestions(limite), DUREE_CACHE)
+
+
+@transaction.atomic
+def appliquer_seuils(**options):
+    """
+    Remplace le seuil d'alerte des médicaments consommés par leur point de
+    commande ; les autres gardent leur seuil. Retourne le nombre de stocks
+    modifiés.
+    """
+    resultats = calculer(**options)
+    consommes = resultats['demande'] > 0
+    ids = resultats['ids'][consommes]
+    points = resultats['point_commande'][consommes].astype(np.int64)
+    # Un UPDATE par valeur de seuil distincte
+    nombre = 0
+    for seuil in np.unique(points).tolist():
+        nombre += StockMedicament.objects.filter(
+            medicament_id__in=ids[points == seuil].tolist()
+        ).exclude(seuil_alerte=seuil).update(seuil_alerte=seuil)
+    return nombre
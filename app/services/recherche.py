@@ -0,0 +1,413 @@
+"""
+Recherche des patients.
+
+Le moteur par défaut (RechercheIndexee) s'appuie sur la table
+IndexRecherchePatient, qui contient pour chaque patient des clés
+normalisées (minuscules, sans accents) :
+
+- n:<préfixe>   préfixes des mots du nom et du prénom
+- g:<trigramme> trigrammes des mots du nom et du prénom (recherche dans le mot)
+- t:<chiffres>  préfixes et segments des chiffres du téléphone
+- i:<préfixe>   préfixes de l'identifiant patient
+
+Une recherche se résume à une seule requête d'égalité sur la colonne
+indexée `cle`, groupée par patient et triée par score (somme des poids
+des clés trouvées), au lieu de quatre `icontains` qui parcourent toute
+la table.
+
+La même règle de correspondance et le même score s'évaluent aussi en
+mémoire sur des patients déjà chargés (affiner), ce qu'utilise la saisie
+semi-automatique pour affiner une requête sans la relancer.
+
+Le moteur est choisi par le réglage PATIENT_SEARCH_BACKEND : tout moteur
+implémentant l'interface MoteurRecherchePatient peut le remplacer (par
+exemple un moteur basé sur pg_trgm ou FTS5).
+"""
+import math
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.utils.module_loading import import_string
+
+from ..models import Patient, IndexRecherchePatient
+
+# Champs du patient pris en compte par l'index
+CHAMPS_INDEXES = ('nom', 'prenom', 'telephone', 'id_patient')
+
+# Poids des clés dans le score d'un résultat
+POIDS_IDENTIFIANT = 12
+POIDS_EXACT = 10
+POIDS_PREFIXE = 6
+POIDS_TRIGRAMME = 1
+
+# Longueur maximale indexée d'un mot, d'un numéro ou d'un identifiant
+LONGUEUR_MAX = 20
+
+# Proportion des trigrammes d'un terme qui doivent être trouvés
+SEUIL_TRIGRAMMES = 0.6
+
+NOMBRE_MAX_RESULTATS = getattr(settings, 'PATIENT_SEARCH_MAX_RESULTS', 200)
+
+
+# ========================================
+# Normalisation
+# ========================================
+
+def normaliser(texte):
+    """Met un texte en minuscules et retire les accents"""
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).casefold()
+
+
+def mots(texte):
+    """Découpe un texte normalisé en mots alphanumériques"""
+    return re.findall(r'[a-z0-9]+', normaliser(texte))
+
+
+def chiffres(texte):
+    """Ne garde que les chiffres d'un texte (numéro de téléphone)"""
+    return re.sub(r'\D', '', texte or '')
+
+
+def compacter(texte):
+    """Forme compacte d'un identifiant : normalisé, sans séparateurs"""
+    return ''.join(mots(texte))
+
+
+def trigrammes(mot):
+    """Retourne l'ensemble des trigrammes d'un mot"""
+    return {mot[i:i + 3] for i in range(len(mot) - 2)}
+
+
+# Champs normalisés d'un patient dont dérivent ses clés
+FormePatient = namedtuple('FormePatient', ['mots', 'numero', 'identifiant'])
+
+
+def forme_patient(patient):
+    """Mots du nom et du prénom, chiffres du téléphone et identifiant compact, normalisés"""
+    return FormePatient(
+        mots=tuple(mot[:LONGUEUR_MAX] for mot in mots(f"{patient.nom} {patient.prenom}")),
+        numero=chiffres(patient.telephone)[:LONGUEUR_MAX],
+        identifiant=compacter(str(patient.id_patient))[:LONGUEUR_MAX],
+    )
+
+
+def cles_patient(patient):
+    """Calcule les clés de recherche d'un patient : dictionnaire clé -> poids"""
+    forme = forme_patient(patient)
+    cles = {}
+
+    def ajouter(cle, poids):
+        cles[cle] = max(cles.get(cle, 0), poids)
+
+    for mot in forme.mots:
+        for n in range(2, len(mot)):
+            ajouter('n:' + mot[:n], POIDS_PREFIXE)
+        ajouter('n:' + mot, POIDS_EXACT)
+        for tri in trigrammes(mot):
+            ajouter('g:' + tri, POIDS_TRIGRAMME)
+
+    # Préfixes dès 3 chiffres, segments quelconques dès 4 chiffres
+    numero = forme.numero
+    if numero:
+        ajouter('t:' + numero[:3], POIDS_PREFIXE)
+        for debut in range(len(numero)):
+            for fin in range(debut + 4, len(numero) + 1):
+                ajouter('t:' + numero[debut:fin], POIDS_PREFIXE)
+        ajouter('t:' + numero, POIDS_EXACT)
+
+    identifiant = forme.identifiant
+    if identifiant:
+        for n in range(2, len(identifiant)):
+            ajouter('i:' + identifiant[:n], POIDS_PREFIXE)
+        ajouter('i:' + identifiant, POIDS_IDENTIFIANT)
+
+    return cles
+
+
+def poids_cle(forme, cle):
+    """
+    Poids d'une clé pour un patient (0 s'il ne l'a pas), calculé sans
+    générer toutes ses clés : cles_patient(patient).get(cle, 0).
+    """
+    genre, valeur = cle[:2], cle[2:]
+    if genre == 'n:':
+        return max((
+            POIDS_EXACT if mot == valeur else POIDS_PREFIXE
+            for mot in forme.mots if mot == valeur or (len(valeur) >= 2 and mot.startswith(valeur))
+        ), default=0)
+    if genre == 'g:':
+        return POIDS_TRIGRAMME if len(valeur) == 3 and any(valeur in mot for mot in forme.mots) else 0
+    if genre == 't:':
+        numero = forme.numero
+        if numero and valeur == numero:
+            return POIDS_EXACT
+        if numero and (valeur == numero[:3] or (len(valeur) >= 4 and valeur in numero)):
+            return POIDS_PREFIXE
+        return 0
+    if genre == 'i:':
+        identifiant = forme.identifiant
+        if identifiant and valeur == identifiant:
+            return POIDS_IDENTIFIANT
+        if len(valeur) >= 2 and identifiant.startswith(valeur):
+            return POIDS_PREFIXE
+    return 0
+
+
+# ========================================
+# Analyse d'une requête
+# ========================================
+
+# Clés recherchées pour un terme : il est trouvé par l'une des clés exactes
+# ou par au moins `seuil` de ses trigrammes
+Terme = namedtuple('Terme', ['texte', 'exactes', 'trigrammes', 'seuil'])
+
+# Termes à trouver tous, ou clés compactes dont une seule suffit
+RequeteAnalysee = namedtuple('RequeteAnalysee', ['termes', 'compactes', 'toutes_cles'])
+
+
+def analyser_requete(query):
+    """Décompose une saisie en clés à rechercher ; retourne None si elle est vide"""
+    termes = [terme[:LONGUEUR_MAX] for terme in mots(query)]
+    termes = [terme for terme in termes if len(terme) >= 2] or termes
+    if not termes:
+        return None
+
+    # Chaque terme doit être trouvé, soit par une clé exacte (préfixe de mot,
+    # de téléphone ou d'identifiant), soit par assez de ses trigrammes
+    analyses = []
+    for terme in termes:
+        exactes = {'n:' + terme, 'i:' + terme}
+        if terme.isdigit():
+            exactes.add('t:' + terme)
+        tris = {'g:' + tri for tri in trigrammes(terme)} if not terme.isdigit() else set()
+        seuil = math.ceil(len(tris) * SEUIL_TRIGRAMMES)
+        analyses.append(Terme(terme, frozenset(exactes), frozenset(tris), seuil))
+
+    # Un identifiant ou un numéro saisi avec des séparateurs est aussi
+    # recherché sous sa forme compacte
+    compactes = set()
+    identifiant = compacter(query)[:LONGUEUR_MAX]
+    if len(termes) > 1 and len(identifiant) >= 2:
+        compactes.add('i:' + identifiant)
+    numero = chiffres(query)[:LONGUEUR_MAX]
+    if len(termes) > 1 and len(numero) >= 3:
+        compactes.add('t:' + numero)
+
+    toutes_cles = frozenset(compactes).union(*(terme.exactes | terme.trigrammes for terme in analyses))
+    return RequeteAnalysee(analyses, frozenset(compactes), toutes_cles)
+
+
+def affinage_exact(origine, requete):
+    """
+    Indique si tout patient trouvé par une clé exacte (préfixe de mot ou
+    d'identifiant, numéro) pour `requete` l'est aussi pour `origine`, dont
+    la saisie est un préfixe : les candidats complets d'`origine` suffisent
+    alors pour évaluer `requete`. Les correspondances par trigrammes ne
+    sont pas couvertes.
+    """
+    if origine is None or len(requete.termes) < len(origine.termes):
+        return False
+    for i, (avant, apres) in enumerate(zip(origine.termes, requete.termes)):
+        if apres.texte == avant.texte:
+            continue
+        if i < len(origine.termes) - 1 or not apres.texte.startswith(avant.texte):
+            return False
+        # Préfixes indexés dès 2 caractères, segments de numéro dès 4 chiffres
+        if len(avant.texte) < 2 or (apres.texte.isdigit() and len(avant.texte) < 4):
+            return False
+    for cle in requete.compactes:
+        if not any(
+            cle.startswith(parent) and (cle == parent or parent.startswith('i:') or len(parent) >= 6)
+            for parent in origine.compactes
+        ):
+            return False
+    return True
+
+
+def score(requete, forme):
+    """
+    Score d'un patient pour une requête analysée, ou None s'il ne correspond
+    pas : même règle que la requête SQL de RechercheIndexee.rechercher.
+    """
+    trouvees = {}
+    for cle in requete.toutes_cles:
+        poids = poids_cle(forme, cle)
+        if poids:
+            trouvees[cle] = poids
+    if not (
+        all(
+            terme.exactes & trouvees.keys()
+            or (terme.trigrammes and len(terme.trigrammes & trouvees.keys()) >= terme.seuil)
+            for terme in requete.termes
+        )
+        or requete.compactes & trouvees.keys()
+    ):
+        return None
+    return sum(trouvees.values())
+
+
+# ========================================
+# Moteurs
+# ========================================
+
+class MoteurRecherchePatient:
+    """
+    Interface commune des moteurs de recherche de patients.
+
+    rechercher() retourne les identifiants (pk) des patients trouvés, du plus
+    pertinent au moins pertinent. Les autres méthodes maintiennent l'index
+    éventuel du moteur et ne font rien par défaut.
+    """
+
+    def rechercher(self, query, limite=NOMBRE_MAX_RESULTATS):
+        raise NotImplementedError
+
+    def affiner(self, query, candidats, origine):
+        """
+        Filtre et classe en mémoire, comme le ferait rechercher(), les
+        résultats complets de la recherche `origine`, dont `query` prolonge
+        la saisie : objets ayant les attributs nom, prenom et forme (voir
+        forme_patient). Retourne None si le moteur ne sait pas le faire ou
+        si des patients pourraient manquer ; l'appelant relance alors la
+        recherche.
+        """
+        return None
+
+    def indexer(self, patient):
+        pass
+
+    def supprimer(self, patient_id):
+        pass
+
+    def reindexer(self):
+        """Reconstruit tout l'index, retourne le nombre de patients indexés"""
+        return 0
+
+
+class RechercheSimple(MoteurRecherchePatient):
+    """Recherche sans index par `icontains` sur les champs du patient"""
+
+    def rechercher(self, query, limite=NOMBRE_MAX_RESULTATS):
+        return list(Patient.objects.filter(
+            Q(nom__icontains=query) |
+            Q(prenom__icontains=query) |
+            Q(id_patient__icontains=query) |
+            Q(telephone__icontains=query)
+        ).order_by('nom', 'prenom').values_list('pk', flat=True)[:limite])
+
+
+class RechercheIndexee(MoteurRecherchePatient):
+    """Recherche classée sur la table IndexRecherchePatient"""
+
+    taille_lot = 1000
+
+    def _lignes(self, patient):
+        return [
+            IndexRecherchePatient(patient_id=patient.pk, cle=cle, poids=poids)
+            for cle, poids in cles_patient(patient).items()
+        ]
+
+    @transaction.atomic
+    def indexer(self, patient):
+        IndexRecherchePatient.objects.filter(patient_id=patient.pk).delete()
+        IndexRecherchePatient.objects.bulk_create(self._lignes(patient))
+
+    def supprimer(self, patient_id):
+        IndexRecherchePatient.objects.filter(patient_id=patient_id).delete()
+
+    @transaction.atomic
+    def reindexer(self):
+        IndexRecherchePatient.objects.all().delete()
+
+        total = 0
+        lignes = []
+        patients = Patient.objects.only('pk', *CHAMPS_INDEXES)
+        for patient in patients.iterator(chunk_size=self.taille_lot):
+            lignes.extend(self._lignes(patient))
+            total += 1
+            if len(lignes) >= self.taille_lot:
+                IndexRecherchePatient.objects.bulk_create(lignes)
+                lignes = []
+        IndexRecherchePatient.objects.bulk_create(lignes)
+        return total
+
+    def rechercher(self, query, limite=NOMBRE_MAX_RESULTATS):
+        requete = analyser_requete(query)
+        if requete is None:
+            return []
+
+        annotations = {}
+        couverture = Q()
+        for i, terme in enumerate(requete.termes):
+            annotations[f'exact_{i}'] = Count('id', filter=Q(cle__in=terme.exactes))
+            condition = Q(**{f'exact_{i}__gt': 0})
+            if terme.trigrammes:
+                annotations[f'tri_{i}'] = Count('id', filter=Q(cle__in=terme.trigrammes))
+                condition |= Q(**{f'tri_{i}__gte': terme.seuil})
+            couverture &= condition
+        if requete.compactes:
+            annotations['compact'] = Count('id', filter=Q(cle__in=requete.compactes))
+            couverture |= Q(compact__gt=0)
+
+        resultats = (
+            IndexRecherchePatient.objects.filter(cle__in=requete.toutes_cles)
+            .values('patient_id')
+            .annotate(score=Sum('poids'), **annotations)
+            .filter(couverture)
+            .order_by('-score', 'patient__nom', 'patient__prenom')
+        )
+        return [ligne['patient_id'] for ligne in resultats[:limite]]
+
+    def affiner(self, query, candidats, origine):
+        requete = analyser_requete(query)
+        if requete is None:
+            return []
+        if not affinage_exact(analyser_requete(origine), requete):
+            return None
+        scores = []
+        for candidat in candidats:
+            valeur = score(requete, candidat.forme)
+            if valeur is not None:
+                scores.append((-valeur, candidat.nom, candidat.prenom, candidat))
+        scores.sort(key=lambda ligne: ligne[:3])
+        return [ligne[3] for ligne in scores]
+
+
+@lru_cache(maxsize=None)
+def moteur_recherche():
+    """Retourne l'instance du moteur configuré par PATIENT_SEARCH_BACKEND"""
+    chemin = getattr(settings, 'PATIENT_SEARCH_BACKEND', 'app.services.recherche.RechercheIndexee')
+    return import_string(chemin)()
+
+
+def rechercher_patients(query, limite=NOMBRE_MAX_RESULTATS):
+    """
+    Recherche des patients et retourne un QuerySet trié par pertinence.
+    """
+    return _par_pertinence(moteur_recherche().rechercher(query, limite))
+
+
+def rechercher_patients_tronque(query, limite=NOMBRE_MAX_RESULTATS):
+    """
+    Comme rechercher_patients, mais retourne aussi un booléen qui indique si
+    des patients correspondants ont été écartés par la limite.
+    """
+    ids = moteur_recherche().rechercher(query, limite + 1)
+    return _par_pertinence(ids[:limite]), len(ids) > limite
+
+
+def _par_pertinence(ids):
+    """QuerySet des patients `ids`, dans l'ordre de la liste"""
+    if not ids:
+        return Patient.objects.none()
+    rang = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+        output_field=IntegerField()
+    )
+    return Patient.objects.filter(pk__in=ids).alias(rang=rang).order_by('rang')
@@ -0,0 +1,164 @@
+"""
+Enregistrement atomique des rendez-vous.
+
+La validation du formulaire vérifie les conflits, mais deux postes peuvent
+valider le même créneau avant que l'un des deux n'enregistre. La prise de
+rendez-vous verrouille donc, dans une transaction, les lignes VerrouAgenda
+des jours concernés du médecin, revérifie les conflits puis enregistre :
+deux réservations qui se chevauchent partagent au moins un jour verrouillé
+et sont forcément exécutées l'une après l'autre.
+
+Sur SQLite, où SELECT ... FOR UPDATE n'existe pas, l'insertion des lignes de
+verrou ouvre déjà une transaction d'écriture exclusive.
+
+Les séries de rendez-vous (suivis hebdomadaires, mensuels...) sont vérifiées
+en une seule requête d'intervalles puis insérées par bulk_create.
+"""
+import calendar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .agenda import HORS_HORAIRES, etats_creneaux, jours_couverts
+from .disponibilite import STATUTS_ACTIFS, conflits_intervalles, fin_rdv, rdv_chevauchants
+from ..models import RendezVous, VerrouAgenda
+from ..signals import rendezvous_modifies_en_masse
+
+FREQUENCE_CHOICES = [
+    ('QUOTIDIENNE', 'Tous les jours'),
+    ('HEBDOMADAIRE', 'Toutes les semaines'),
+    ('MENSUELLE', 'Tous les mois'),
+]
+
+# Nombre maximal d'occurrences d'une série
+OCCURRENCES_MAX = 52
+
+
+class CreneauIndisponible(Exception):
+    """Le créneau a été réservé entre la validation et l'enregistrement"""
+
+    def __init__(self, message="Le médecin a déjà un rendez-vous prévu à cette heure."):
+        super().__init__(message)
+
+
+def verrouiller_jours(medecin_id, jours):
+    """
+    Verrouille les journées d'agenda d'un médecin jusqu'à la fin de la
+    transaction en cours. Les lignes sont créées à la demande et toujours
+    verrouillées dans le même ordre, pour éviter les interblocages.
+    """
+    jours = sorted(set(jours))
+    VerrouAgenda.objects.bulk_create(
+        [VerrouAgenda(medecin_id=medecin_id, jour=jour) for jour in jours],
+        ignore_conflicts=True,
+    )
+    list(
+        VerrouAgenda.objects.select_for_update()
+        .filter(medecin_id=medecin_id, jour__in=jours)
+        .order_by('jour')
+        .values_list('pk', flat=True)
+    )
+
+
+def enregistrer_rendezvous(form):
+    """
+    Enregistre le rendez-vous d'un RendezVousForm validé, sans risque de double
+    réservation. Lève CreneauIndisponible si le créneau a été pris entre-temps.
+    """
+    rendez_vous = form.save(commit=False)
+    with transaction.atomic():
+        if rendez_vous.statut in STATUTS_ACTIFS:
+            fin = fin_rdv(rendez_vous.date_heure, rendez_vous.duree)
+            verrouiller_jours(rendez_vous.medecin_id, jours_couverts(rendez_vous.date_heure, fin))
+            if rdv_chevauchants(
+                rendez_vous.medecin_id, rendez_vous.date_heure, fin, exclure=rendez_vous.pk
+            ).exists():
+                raise CreneauIndisponible()
+        rendez_vous.save()
+        form.save_m2m()
+    return rendez_vous
+
+
+# ========================================
+# Séries de rendez-vous
+# ========================================
+
+def _ajouter_mois(moment, mois):
+    # Le jour est ramené au dernier jour du mois s'il n'existe pas (31 -> 30)
+    annee, indice = divmod(moment.month - 1 + mois, 12)
+    annee += moment.year
+    jour = min(moment.day, calendar.monthrange(annee, indice + 1)[1])
+    return moment.replace(year=annee, month=indice + 1, day=jour)
+
+
+def occurrences(debut, frequence, intervalle, nombre):
+    """
+    Retourne les débuts des `nombre` occurrences d'une série commençant à
+    `debut`, répétée tous les `intervalle` jours, semaines ou mois. L'heure
+    locale est conservée lors des changements d'heure.
+    """
+    local = timezone.localtime(debut).replace(tzinfo=None) if settings.USE_TZ else debut
+    debuts = []
+    for rang in range(nombre):
+        if frequence == 'QUOTIDIENNE':
+            moment = local + timedelta(days=rang * intervalle)
+        elif frequence == 'HEBDOMADAIRE':
+            moment = local + timedelta(weeks=rang * intervalle)
+        elif frequence == 'MENSUELLE':
+            moment = _ajouter_mois(local, rang * intervalle)
+        else:
+            raise ValueError(f"Fréquence inconnue : {frequence}")
+        debuts.append(timezone.make_aware(moment) if settings.USE_TZ else moment)
+    return debuts
+
+
+def verifier_serie(medecin_id, debuts, duree):
+    """
+    Vérifie toutes les occurrences d'une série : horaires du médecin lus dans
+    ses grilles, conflits par une seule requête d'intervalles. Retourne un
+    dictionnaire position -> message d'erreur, vide si la série est libre.
+    """
+    intervalles = [(debut, fin_rdv(debut, duree)) for debut in debuts]
+    erreurs = {}
+    for position, etat in enumerate(etats_creneaux(medecin_id, intervalles)):
+        if etat == HORS_HORAIRES:
+            erreurs[position] = "le médecin ne consulte pas à cette heure"
+    for position in conflits_intervalles(medecin_id, intervalles):
+        erreurs.setdefault(position, "le médecin a déjà un rendez-vous à cette heure")
+    return erreurs
+
+
+def creer_serie(modele, debuts):
+    """
+    Crée une série de rendez-vous identiques à `modele` (instance non
+    enregistrée) aux débuts donnés, en une transaction et un bulk_create.
+    Lève CreneauIndisponible si une occurrence a été prise entre-temps.
+    """
+    intervalles = [(debut, fin_rdv(debut, modele.duree)) for debut in debuts]
+    with transaction.atomic():
+        verrouiller_jours(
+            modele.medecin_id,
+            [jour for debut, fin in intervalles for jour in jours_couverts(debut, fin)]
+        )
+        conflits = conflits_intervalles(modele.medecin_id, intervalles)
+        if conflits:
+            dates = ', '.join(
+                timezone.localtime(intervalles[position][0]).strftime('%d/%m/%Y %H:%M')
+                for position in sorted(conflits)
+            )
+            raise CreneauIndisponible(f"Le médecin a déjà un rendez-vous le {dates}.")
+        rendez_vous = RendezVous.objects.bulk_create([
+            RendezVous(
+                patient_id=modele.patient_id, medecin_id=modele.medecin_id,
+                date_heure=debut, duree=modele.duree, date_fin=fin,
+                motif=modele.motif, statut=modele.statut, notes=modele.notes,
+            )
+            for debut, fin in intervalles
+        ])
+        rendezvous_modifies_en_masse.send(
+            sender=RendezVous,
+            intervalles=[(modele.medecin_id, debut, fin) for debut, fin in intervalles],
+        )
+    return rendez_vous
@@ -0,0 +1,137 @@
+"""
+Tenue à jour de la table StatistiqueJournaliere.
+
+Les signaux ne recomptent rien : chaque enregistrement ou suppression d'une
+ligne source se traduit par des variations (+1, -1, montant payé) appliquées
+par un UPDATE `compteur = compteur + variation` sur les lignes du jour
+concerné, globale et du médecin. La commande recalculer_statistiques
+reconstruit une plage de dates en une requête groupée par table.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .periodes import bornes_jours, dans_periode
+from ..models import StatistiqueJournaliere
+
+CHAMPS_GLOBAUX = ('rdv', 'consultations', 'factures_creees', 'ventes', 'revenu')
+CHAMPS_MEDECIN = ('rdv', 'consultations')
+
+# Tentatives d'enregistrement d'une ligne en cas d'insertion concurrente
+TENTATIVES = 3
+
+
+def jour_local(valeur):
+    """Retourne la date locale d'un horodatage (None si absent)"""
+    if valeur is None:
+        return None
+    return timezone.localtime(valeur).date()
+
+
+def nouvelles_variations():
+    """Variations à appliquer : (jour, medecin_id) -> {compteur: variation}"""
+    return defaultdict(lambda: defaultdict(int))
+
+
+def ajouter_variation(variations, champ, jour, valeur=1, medecin_id=None):
+    """
+    Ajoute une variation d'un compteur à la ligne globale du jour et, pour
+    les compteurs suivis par médecin, à la ligne du médecin.
+    """
+    if jour is None:
+        return
+    variations[jour, None][champ] += valeur
+    if medecin_id and champ in CHAMPS_MEDECIN:
+        variations[jour, medecin_id][champ] += valeur
+
+
+def appliquer_variations(variations):
+    """
+    Applique les variations par un UPDATE par ligne. Une ligne absente (jour
+    sans activité jusque-là) est créée avec les variations pour valeurs.
+    """
+    for (jour, medecin_id), compteurs in variations.items():
+        compteurs = {champ: valeur for champ, valeur in compteurs.items() if valeur}
+        if not compteurs:
+            continue
+        lignes = StatistiqueJournaliere.objects.filter(date=jour, medecin_id=medecin_id)
+        increments = {champ: F(champ) + valeur for champ, valeur in compteurs.items()}
+        for tentative in range(TENTATIVES):
+            if lignes.update(**increments):
+                break
+            try:
+                # Point de sauvegarde : la transaction reste utilisable si
+                # un enregistrement concurrent crée la ligne en premier
+                with transaction.atomic():
+                    StatistiqueJournaliere.objects.create(
+                        date=jour, medecin_id=medecin_id,
+                        **{champ: max(valeur, 0) for champ, valeur in compteurs.items()}
+                    )
+                break
+            except IntegrityError:
+                if tentative == TENTATIVES - 1:
+                    raise
+
+
+@transaction.atomic
+def reconstruire(debut, fin, apps=django_apps):
+    """
+    Reconstruit toutes les statistiques entre deux dates (incluses).
+    Retourne le nombre de lignes créées. `apps` est le registre des modèles,
+    celui de la migration lors du calcul initial.
+    """
+    RendezVous, ConsultationMedicale, Facture, MouvementStock, StatistiqueJournaliere = (
+        apps.get_model('app', nom) for nom in (
+            'RendezVous', 'ConsultationMedicale', 'Facture', 'MouvementStock', 'StatistiqueJournaliere'
+        )
+    )
+    lignes = defaultdict(dict)
+    
+    def cumuler(queryset, champ, par_medecin):
+        for jour, medecin_id, valeur in queryset:
+            lignes[(jour, None)][champ] = lignes[(jour, None)].get(champ, 0) + valeur
+            if par_medecin:
+                lignes[(jour, medecin_id)][champ] = valeur
+    
+    periode = [debut, fin]
+    bornes = bornes_jours(debut, fin)
+    cumuler(
+        RendezVous.objects.filter(dans_periode('date_heure', bornes))
+        .annotate(jour=TruncDate('date_heure'))
+        .values_list('jour', 'medecin_id').annotate(n=Count('id')).order_by(),
+        'rdv', True
+    )
+    cumuler(
+        ConsultationMedicale.objects.filter(dans_periode('date_consultation', bornes))
+        .annotate(jour=TruncDate('date_consultation'))
+        .values_list('jour', 'medecin_id').annotate(n=Count('id')).order_by(),
+        'consultations', True
+    )
+    factures = (
+        Facture.objects.filter(dans_periode('date_emission', bornes))
+        .annotate(jour=TruncDate('date_emission'))
+        .values_list('jour').order_by()
+        .annotate(n=Count('id'), total=Sum('montant_total', filter=Q(statut='PAYEE')))
+    )
+    for jour, n, total in factures:
+        lignes[(jour, None)]['factures_creees'] = n
+        lignes[(jour, None)]['revenu'] = total or Decimal('0')
+    ventes = (
+        MouvementStock.objects.filter(dans_periode('date_mouvement', bornes), type_mouvement='SORTIE')
+        .annotate(jour=TruncDate('date_mouvement'))
+        .values_list('jour').order_by().annotate(n=Count('id'))
+    )
+    for jour, n in ventes:
+        lignes[(jour, None)]['ventes'] = n
+    
+    StatistiqueJournaliere.objects.filter(date__range=periode).delete()
+    StatistiqueJournaliere.objects.bulk_create([
+        StatistiqueJournaliere(date=jour, medecin_id=medecin_id, **valeurs)
+        for (jour, medecin_id), valeurs in lignes.items()
+    ])
+    return len(lignes)
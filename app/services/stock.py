@@ -0,0 +1,242 @@
+"""
+Registre des mouvements de stock.
+
+Un mouvement est appliqué au stock par un UPDATE conditionnel
+(`quantite = quantite - n WHERE quantite >= n` pour une sortie), dans la
+même transaction que l'insertion du MouvementStock : deux ventes
+simultanées ne peuvent ni perdre une mise à jour ni rendre le stock
+négatif, et un mouvement refusé n'est pas enregistré.
+
+Une prescription ou une vente de caisse est délivrée en une seule
+transaction : les stocks de tous ses médicaments sont verrouillés par une
+seule requête (dans l'ordre des ids, pour éviter les interblocages),
+vérifiés ensemble, décrémentés par un seul UPDATE, et les mouvements (et
+la facture éventuelle) sont insérés par bulk_create.
+
+Ces UPDATE ne déclenchent pas post_save sur StockMedicament ; le signal
+stocks_modifies est envoyé à la place avec les médicaments touchés, après
+validation de la transaction.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.utils import timezone
+
+from .statistiques import jour_local
+from ..models import Facture, LigneFacture, Medicament, MouvementStock, Prescription, StockMedicament
+from ..signals import stocks_modifies
+
+
+class StockInsuffisant(Exception):
+    """La quantité demandée dépasse le stock disponible"""
+
+    def __init__(self, medicament, disponible, demande):
+        self.medicament = medicament
+        self.disponible = disponible
+        self.demande = demande
+        super().__init__(f"Stock insuffisant pour {medicament}. Quantité disponible : {disponible}")
+
+
+class SortieImpossible(Exception):
+    """Une sortie groupée ne peut pas être effectuée"""
+
+    def __init__(self, message, manques=()):
+        # Un StockInsuffisant par médicament manquant
+        self.manques = list(manques)
+        super().__init__(message)
+
+
+class DispensationImpossible(SortieImpossible):
+    """La prescription est déjà dispensée ou ses médicaments manquent"""
+
+
+class VenteImpossible(SortieImpossible):
+    """Le panier de la caisse est invalide ou ses médicaments manquent"""
+
+
+def _signaler_apres_commit(medicament_ids, ventes=None):
+    """
+    Envoie stocks_modifies une fois la transaction validée : un lecteur
+    concurrent ne peut pas remettre en cache le stock d'avant la validation,
+    et rien n'est invalidé si la transaction est annulée.
+    """
+    transaction.on_commit(
+        lambda: stocks_modifies.send(sender=StockMedicament, medicament_ids=medicament_ids, ventes=ventes)
+    )
+
+
+def retirer_stock(medicament, quantite):
+    """
+    Décrémente le stock d'un médicament si la quantité est disponible.
+    À appeler dans une transaction ; lève StockInsuffisant sinon.
+    """
+    if StockMedicament.objects.filter(medicament=medicament, quantite__gte=quantite).update(
+        quantite=F('quantite') - quantite, date_mise_a_jour=timezone.now()
+    ):
+        return
+    disponible = StockMedicament.objects.filter(medicament=medicament).values_list('quantite', flat=True).first()
+    raise StockInsuffisant(medicament, disponible or 0, quantite)
+
+
+def ajouter_stock(medicament, quantite):
+    """Incrémente le stock d'un médicament, créé au besoin. À appeler dans une transaction."""
+    if StockMedicament.objects.filter(medicament=medicament).update(
+        quantite=F('quantite') + quantite, date_mise_a_jour=timezone.now()
+    ):
+        return
+    stock, cree = StockMedicament.objects.get_or_create(medicament=medicament, defaults={'quantite': quantite})
+    if not cree:
+        # Stock créé entre-temps par une autre entrée
+        StockMedicament.objects.filter(pk=stock.pk).update(quantite=F('quantite') + quantite)
+
+
+def enregistrer_mouvement(mouvement):
+    """
+    Applique au stock un MouvementStock non enregistré puis l'enregistre, en
+    une transaction. Lève StockInsuffisant pour une sortie non couverte.
+    """
+    with transaction.atomic():
+        if mouvement.type_mouvement == 'SORTIE':
+            retirer_stock(mouvement.medicament, mouvement.quantite)
+        else:
+            ajouter_stock(mouvement.medicament, mouvement.quantite)
+        mouvement.save()
+        _signaler_apres_commit([mouvement.medicament_id])
+    return mouvement
+
+
+# ========================================
+# Sorties groupées (dispensation, caisse)
+# ========================================
+
+# Ligne d'un panier de caisse (même interface que LignePrescription pour sortir_lot)
+LignePanier = namedtuple('LignePanier', ['medicament', 'quantite'])
+
+
+def sortir_lot(lignes, personnel, notes, erreur, maintenant):
+    """
+    Sortie de stock d'un lot de lignes (objets exposant medicament et
+    quantite), à appeler dans une transaction : verrouille les stocks par une
+    seule requête triée par id, vérifie toutes les lignes, décrémente par un
+    seul UPDATE et insère les mouvements par bulk_create. Lève `erreur`
+    (classe d'exception prenant un message et les manques) si un médicament
+    manque. Retourne les mouvements créés.
+    """
+    quantites = {}
+    medicaments = {}
+    for ligne in lignes:
+        quantites[ligne.medicament.pk] = quantites.get(ligne.medicament.pk, 0) + ligne.quantite
+        medicaments[ligne.medicament.pk] = ligne.medicament
+    stocks = {
+        medicament_id: (pk, quantite)
+        for pk, medicament_id, quantite in StockMedicament.objects.select_for_update()
+        .filter(medicament_id__in=quantites)
+        .order_by('pk')
+        .values_list('pk', 'medicament_id', 'quantite')
+    }
+    manques = [
+        StockInsuffisant(medicaments[medicament_id], stocks.get(medicament_id, (None, 0))[1], quantite)
+        for medicament_id, quantite in quantites.items()
+        if stocks.get(medicament_id, (None, 0))[1] < quantite
+    ]
+    if manques:
+        raise erreur(" ".join(str(manque) for manque in manques), manques)
+    
+    # Un seul UPDATE ; la condition par ligne protège aussi les bases sans SELECT ... FOR UPDATE
+    conditions = Q()
+    decrements = []
+    for medicament_id, quantite in quantites.items():
+        pk = stocks[medicament_id][0]
+        conditions |= Q(pk=pk, quantite__gte=quantite)
+        decrements.append(When(pk=pk, then=F('quantite') - quantite))
+    if StockMedicament.objects.filter(conditions).update(
+        quantite=Case(*decrements, default=F('quantite'), output_field=PositiveIntegerField()),
+        date_mise_a_jour=maintenant,
+    ) != len(quantites):
+        raise erreur("Le stock a changé pendant l'opération, veuillez réessayer.")
+    
+    mouvements = MouvementStock.objects.bulk_create([
+        MouvementStock(
+            medicament=ligne.medicament, quantite=ligne.quantite, type_mouvement='SORTIE',
+            personnel=personnel, notes=notes,
+        )
+        for ligne in lignes
+    ])
+    _signaler_apres_commit(list(quantites), {jour_local(maintenant): len(mouvements)})
+    return mouvements
+
+
+def facturer_medicaments(patient_id, lignes, notes, **champs):
+    """Crée une facture et ses lignes MEDICAMENT (deux requêtes d'insertion)"""
+    lignes_facture = [
+        LigneFacture(
+            description=ligne.medicament.nom, type_service='MEDICAMENT',
+            quantite=ligne.quantite, prix_unitaire=ligne.medicament.prix_unitaire,
+        )
+        for ligne in lignes
+    ]
+    facture = Facture.objects.create(
+        patient_id=patient_id, montant_total=sum(ligne.montant for ligne in lignes_facture),
+        notes=notes, **champs
+    )
+    for ligne in lignes_facture:
+        ligne.facture = facture
+    LigneFacture.objects.bulk_create(lignes_facture)
+    return facture
+
+
+def dispenser_prescription(prescription, personnel, facturer=False):
+    """
+    Délivre tous les médicaments d'une prescription en une transaction :
+    sorties de stock, mouvements et, si `facturer`, facture des médicaments.
+    Retourne (mouvements, facture). Lève DispensationImpossible si la
+    prescription est déjà dispensée ou si un médicament manque ; rien n'est
+    alors enregistré.
+    """
+    maintenant = timezone.now()
+    with transaction.atomic():
+        # Marquée en premier : deux dispensations simultanées ne peuvent pas aboutir toutes les deux
+        if not Prescription.objects.filter(pk=prescription.pk, date_dispensation__isnull=True).update(
+            date_dispensation=maintenant
+        ):
+            raise DispensationImpossible("Cette prescription a déjà été dispensée.")
+        lignes = list(prescription.lignes.select_related('medicament').order_by('pk'))
+        if not lignes:
+            raise DispensationImpossible("Cette prescription ne comporte aucun médicament.")
+        
+        mouvements = sortir_lot(
+            lignes, personnel, f"Prescription #{prescription.pk}", DispensationImpossible, maintenant
+        )
+        facture = None
+        if facturer:
+            facture = facturer_medicaments(
+                prescription.patient_id, lignes, f"Médicaments de la prescription #{prescription.pk}"
+            )
+    prescription.date_dispensation = maintenant
+    return mouvements, facture
+
+
+def vendre(panier, personnel, patient_id=None):
+    """
+    Enregistre une vente de caisse en une transaction. `panier` est une
+    liste de (medicament_id, quantite). Une facture payée est créée si le
+    client est un patient. Retourne (mouvements, facture, total).
+    Lève VenteImpossible si le panier est invalide ou si un médicament manque.
+    """
+    if not panier or any(quantite <= 0 for _, quantite in panier):
+        raise VenteImpossible("Le panier est vide ou contient une quantité invalide.")
+    maintenant = timezone.now()
+    with transaction.atomic():
+        medicaments = Medicament.objects.in_bulk({medicament_id for medicament_id, _ in panier})
+        if len(medicaments) != len({medicament_id for medicament_id, _ in panier}):
+            raise VenteImpossible("Le panier contient un médicament inconnu.")
+        lignes = [LignePanier(medicaments[medicament_id], quantite) for medicament_id, quantite in panier]
+        mouvements = sortir_lot(lignes, personnel, "Vente comptoir", VenteImpossible, maintenant)
+        total = sum(ligne.medicament.prix_unitaire * ligne.quantite for ligne in lignes)
+        facture = None
+        if patient_id:
+            facture = facturer_medicaments(
+                patient_id, lignes, "Vente comptoir", statut='PAYEE', date_paiement=maintenant
+            )
+    return mouvements, facture, total
@@ -0,0 +1,154 @@
+"""
+Suggestions de patients pour la saisie semi-automatique.
+
+Les résultats récents sont gardés dans un cache LRU en mémoire, par requête
+normalisée. Quand la saisie affine une requête déjà en cache (« dup » puis
+« dupo »), et que la liste de candidats de cette requête est complète, le
+moteur de recherche filtre et classe ces candidats en mémoire, avec la même
+règle et le même score qu'en base (voir MoteurRecherchePatient.affiner),
+sans requête SQL, si le moteur garantit qu'aucune correspondance exacte ne
+peut manquer (sinon la requête est relancée). Une correspondance approchée
+par trigrammes qu'apportent les lettres ajoutées à un patient absent des
+candidats de départ n'apparaît qu'à la génération suivante.
+
+Le cache est invalidé à chaque modification d'un patient via un numéro de
+génération partagé dans le cache de Django, qui sert aussi d'ETag. Avec un
+cache local (LocMemCache), ce numéro n'est incrémenté que dans le processus
+qui modifie le patient : la génération inclut donc aussi une période de
+PATIENT_TYPEAHEAD_CACHE_TIMEOUT secondes, au bout de laquelle chaque
+processus relit la base.
+"""
+import hashlib
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Patient
+from .recherche import forme_patient, moteur_recherche, mots
+
+# Nombre de requêtes gardées en mémoire par processus
+TAILLE_CACHE = getattr(settings, 'PATIENT_TYPEAHEAD_CACHE_SIZE', 512)
+
+# Durée maximale (secondes) de validité des suggestions d'un processus
+DUREE_GENERATION = getattr(settings, 'PATIENT_TYPEAHEAD_CACHE_TIMEOUT', 60)
+
+# Candidats conservés par requête (au-delà, la liste n'est pas complète)
+NOMBRE_CANDIDATS = 200
+
+# Suggestions renvoyées au navigateur
+NOMBRE_SUGGESTIONS = 10
+
+CLE_GENERATION = 'suggestions:generation'
+
+# Patient candidat : champs renvoyés au navigateur, puis forme normalisée
+# utilisée pour affiner la requête en mémoire
+Candidat = namedtuple('Candidat', ['pk', 'nom', 'prenom', 'id_patient', 'date_naissance', 'forme'])
+
+
+class CacheLRU:
+    """Dictionnaire borné qui évince les entrées les moins récemment utilisées"""
+
+    def __init__(self, taille):
+        self.taille = taille
+        self._entrees = OrderedDict()
+        self._verrou = Lock()
+
+    def get(self, cle):
+        with self._verrou:
+            valeur = self._entrees.get(cle)
+            if valeur is not None:
+                self._entrees.move_to_end(cle)
+            return valeur
+
+    def set(self, cle, valeur):
+        with self._verrou:
+            self._entrees[cle] = valeur
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille:
+                self._entrees.popitem(last=False)
+
+    def clear(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+_cache_local = CacheLRU(TAILLE_CACHE)
+
+
+def _compteur():
+    # Initialisé à l'heure courante : un compteur évincé du cache ne peut
+    # pas reprendre une valeur déjà utilisée dans un ETag
+    return cache.get_or_set(CLE_GENERATION, lambda: int(time.time() * 1000), None)
+
+
+def generation():
+    """Génération courante : compteur d'invalidations et période en cours"""
+    return f'{_compteur()}.{int(time.time() // DUREE_GENERATION)}'
+
+
+def invalider_suggestions():
+    """Rend obsolètes toutes les suggestions en cache"""
+    try:
+        cache.incr(CLE_GENERATION)
+    except ValueError:
+        # Le compteur n'existe pas encore (ou a été évincé)
+        _compteur()
+
+
+def normaliser_requete(query):
+    return ' '.join(mots(query))
+
+
+def _charger(requete):
+    """Interroge le moteur de recherche et retourne (candidats, complet)"""
+    ids = moteur_recherche().rechercher(requete, NOMBRE_CANDIDATS)
+    rang = {pk: position for position, pk in enumerate(ids)}
+    lignes = Patient.objects.filter(pk__in=ids).values_list(
+        'pk', 'nom', 'prenom', 'id_patient', 'date_naissance', 'telephone'
+    )
+    candidats = sorted((
+        Candidat(
+            pk, nom, prenom, str(id_patient), date_naissance.strftime('%d/%m/%Y'),
+            forme_patient(Patient(nom=nom, prenom=prenom, telephone=telephone, id_patient=id_patient)),
+        )
+        for pk, nom, prenom, id_patient, date_naissance, telephone in lignes
+    ), key=lambda candidat: rang[candidat.pk])
+    return candidats, len(ids) < NOMBRE_CANDIDATS
+
+
+def suggestions(query, gen=None):
+    """
+    Retourne les suggestions pour une saisie : liste de tuples
+    (id, nom, prénom, identifiant, date de naissance).
+    """
+    requete = normaliser_requete(query)
+    if len(requete.replace(' ', '')) < 2:
+        return []
+    gen = gen if gen is not None else generation()
+
+    entree = _cache_local.get((gen, requete))
+    if entree is None:
+        # Affiner en mémoire le plus long préfixe déjà en cache, s'il est complet
+        for n in range(len(requete) - 1, 1, -1):
+            origine = requete[:n].rstrip()
+            parent = _cache_local.get((gen, origine))
+            if parent is not None and parent[1]:
+                affines = moteur_recherche().affiner(requete, parent[0], origine)
+                if affines is not None:
+                    entree = (affines, True)
+                break
+        if entree is None:
+            entree = _charger(requete)
+        _cache_local.set((gen, requete), entree)
+
+    return [candidat[:-1] for candidat in entree[0][:NOMBRE_SUGGESTIONS]]
+
+
+def etag_suggestions(query, gen=None):
+    """ETag d'une réponse : ne dépend que de la génération et de la requête normalisée"""
+    gen = gen if gen is not None else generation()
+    empreinte = hashlib.md5(normaliser_requete(query).encode()).hexdigest()[:16]
+    return f'"{gen}-{empreinte}"'
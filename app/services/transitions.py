@@ -0,0 +1,118 @@
+"""
+Changements de statut des rendez-vous.
+
+Les transitions autorisées sont décrites par la table TRANSITIONS. Un
+changement groupé (clôture de la journée) lit les statuts actuels en une
+requête, puis applique la transition à tous les rendez-vous éligibles par
+un seul UPDATE ... WHERE id IN (...).
+
+Les rendez-vous passés restés actifs sont marqués ABSENT par lots
+(commande marquer_absences), pour que les recherches de disponibilité
+sur les statuts actifs ne parcourent que les rendez-vous à venir.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .disponibilite import STATUTS_ACTIFS
+from ..models import RendezVous
+from ..signals import rendezvous_modifies_en_masse
+
+# Statut actuel -> statuts cibles autorisés (TERMINE et ANNULE sont définitifs,
+# une absence peut être corrigée si le patient a finalement été reçu)
+TRANSITIONS = {
+    'PLANIFIE': {'CONFIRME', 'TERMINE', 'ANNULE', 'ABSENT'},
+    'CONFIRME': {'TERMINE', 'ANNULE', 'ABSENT'},
+    'TERMINE': set(),
+    'ANNULE': set(),
+    'ABSENT': {'TERMINE'},
+}
+
+LIBELLES_STATUT = dict(RendezVous.STATUS_CHOICES)
+
+
+def transition_autorisee(actuel, cible):
+    return cible in TRANSITIONS.get(actuel, ())
+
+
+def origines_autorisees(cible):
+    """Statuts à partir desquels un rendez-vous peut passer au statut `cible`"""
+    return [actuel for actuel, cibles in TRANSITIONS.items() if cible in cibles]
+
+
+def changer_statuts(ids, statut):
+    """
+    Applique un statut à plusieurs rendez-vous. Retourne un dictionnaire
+    id -> {"success", "statut", "libelle", "message"} avec le statut final de
+    chaque rendez-vous demandé.
+    """
+    if statut not in LIBELLES_STATUT:
+        raise ValueError(f"Statut inconnu : {statut}")
+    origines = origines_autorisees(statut)
+
+    with transaction.atomic():
+        lignes = {
+            pk: (actuel, medecin_id, date_heure, date_fin)
+            for pk, actuel, medecin_id, date_heure, date_fin in RendezVous.objects
+            .select_for_update()
+            .filter(pk__in=ids)
+            .values_list('pk', 'statut', 'medecin_id', 'date_heure', 'date_fin')
+        }
+        eligibles = sorted(pk for pk, ligne in lignes.items() if transition_autorisee(ligne[0], statut))
+        if eligibles:
+            # La condition sur le statut d'origine protège d'un changement concurrent
+            RendezVous.objects.filter(pk__in=eligibles, statut__in=origines).update(
+                statut=statut, date_modification=timezone.now()
+            )
+            rendezvous_modifies_en_masse.send(
+                sender=RendezVous,
+                intervalles=[lignes[pk][1:] for pk in eligibles],
+                statut_seul=True, ids=eligibles, statut=statut,
+            )
+        eligibles = set(eligibles)
+
+    resultats = {}
+    for pk in ids:
+        if pk not in lignes:
+            resultats[pk] = {'success': False, 'statut': None, 'libelle': None, 'message': "Rendez-vous introuvable"}
+        elif pk in eligibles:
+            resultats[pk] = {
+                'success': True, 'statut': statut, 'libelle': LIBELLES_STATUT[statut],
+                'message': f"Statut mis à jour : {LIBELLES_STATUT[statut]}",
+            }
+        else:
+            actuel = lignes[pk][0]
+            resultats[pk] = {
+                'success': False, 'statut': actuel, 'libelle': LIBELLES_STATUT[actuel],
+                'message': f"Passage de « {LIBELLES_STATUT[actuel]} » à « {LIBELLES_STATUT[statut]} » non autorisé",
+            }
+    return resultats
+
+
+def marquer_absents(limite, taille_lot=500):
+    """
+    Marque ABSENT les rendez-vous encore actifs terminés avant `limite`, par
+    lots d'UPDATE (une transaction par lot). Retourne (nombre, lots).
+    """
+    nombre = lots = 0
+    actifs = [statut for statut in STATUTS_ACTIFS if transition_autorisee(statut, 'ABSENT')]
+    while True:
+        with transaction.atomic():
+            lignes = list(
+                RendezVous.objects.select_for_update()
+                .filter(statut__in=actifs, date_fin__lt=limite)
+                .values_list('pk', 'medecin_id', 'date_heure', 'date_fin')[:taille_lot]
+            )
+            if not lignes:
+                break
+            nombre += RendezVous.objects.filter(
+                pk__in=[ligne[0] for ligne in lignes], statut__in=actifs
+            ).update(statut='ABSENT', date_modification=timezone.now())
+            rendezvous_modifies_en_masse.send(
+                sender=RendezVous,
+                intervalles=[ligne[1:] for ligne in lignes],
+                statut_seul=True, ids=[ligne[0] for ligne in lignes], statut='ABSENT',
+            )
+        lots += 1
+        if len(lignes) < taille_lot:
+            break
+    return nombre, lots
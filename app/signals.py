@@ -0,0 +1,326 @@
+"""
+Signaux de l'application.
+
+Les compteurs de StatistiqueJournaliere sont ajustés (+1, -1, montant
+payé) à chaque enregistrement ou suppression d'une ligne source, le
+cache du tableau de bord est invalidé quand ses données changent,
+l'index de recherche des patients suit les modifications des patients,
+les grilles de disponibilité des médecins celles des rendez-vous et des
+plannings, le catalogue de la caisse celles des médicaments et des stocks,
+et les modifications de rendez-vous sont diffusées en direct.
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import (
+    Patient, RendezVous, ConsultationMedicale, Facture, Medicament, MouvementStock,
+    StockMedicament, ExamenLaboratoire, Prescription, PlageHoraire, Indisponibilite
+)
+from .services.agenda import invalider_apres_commit, invalider_jours, invalider_medecin, jours_couverts
+from .services.catalogue import signaler_apres_commit
+from .services.dashboard import invalider_cache_dashboard
+from .services.evenements import (
+    avec_position_precedente, evenement_court, evenement_rdv, publier_apres_commit
+)
+from .services.recherche import CHAMPS_INDEXES, moteur_recherche
+from .services.suggestions import invalider_suggestions
+from .services.statistiques import ajouter_variation, appliquer_variations, jour_local, nouvelles_variations
+
+# Envoyé après une création ou une mise à jour groupée de rendez-vous
+# (bulk_create, update), qui ne déclenche pas post_save. Arguments :
+# intervalles, liste de (medecin_id, date_heure, date_fin) des rendez-vous
+# touchés, et statut_seul, vrai si seul leur statut a changé (sinon les
+# rendez-vous viennent d'être créés). Lors d'un changement de statut, ids
+# (dans l'ordre des intervalles) et statut permettent de diffuser le
+# nouveau statut de chaque rendez-vous.
+rendezvous_modifies_en_masse = Signal()
+
+# Envoyé après la validation d'une mise à jour des stocks par UPDATE (registre
+# des mouvements), qui ne déclenche pas post_save sur StockMedicament. Arguments :
+# medicament_ids, et ventes, le nombre de sorties insérées par bulk_create
+# (sans post_save) par jour, à ajouter aux compteurs de ventes.
+stocks_modifies = Signal()
+
+
+def _memoriser_valeurs(sender, instance, *champs):
+    """Mémorise quelques champs avant modification (ancien jour, ancien médecin...)"""
+    instance._stat_avant = None
+    if instance.pk:
+        instance._stat_avant = sender.objects.filter(pk=instance.pk).values(*champs).first()
+
+
+def _ajuster_statistiques(instance, compter, champs, supprime=False):
+    """
+    Applique les variations des compteurs dues à l'enregistrement ou à la
+    suppression d'une ligne source : `compter(variations, valeurs, signe)`
+    retire les valeurs d'avant la modification et ajoute les nouvelles.
+    """
+    variations = nouvelles_variations()
+    avant = None if supprime else getattr(instance, '_stat_avant', None)
+    if avant:
+        compter(variations, avant, -1)
+    compter(variations, {champ: getattr(instance, champ) for champ in champs}, -1 if supprime else 1)
+    appliquer_variations(variations)
+
+
+def _compter_rdv(variations, valeurs, signe):
+    ajouter_variation(variations, 'rdv', jour_local(valeurs['date_heure']), signe, valeurs['medecin_id'])
+
+
+def _compter_consultation(variations, valeurs, signe):
+    ajouter_variation(
+        variations, 'consultations', jour_local(valeurs['date_consultation']), signe, valeurs['medecin_id']
+    )
+
+
+def _compter_facture(variations, valeurs, signe):
+    jour = jour_local(valeurs['date_emission'])
+    ajouter_variation(variations, 'factures_creees', jour, signe)
+    if valeurs['statut'] == 'PAYEE':
+        ajouter_variation(variations, 'revenu', jour, signe * valeurs['montant_total'])
+
+
+def _compter_vente(variations, valeurs, signe):
+    if valeurs['type_mouvement'] == 'SORTIE':
+        ajouter_variation(variations, 'ventes', jour_local(valeurs['date_mouvement']), signe)
+
+
+CHAMPS_RDV = ('date_heure', 'medecin_id')
+CHAMPS_CONSULTATION = ('date_consultation', 'medecin_id')
+CHAMPS_FACTURE = ('date_emission', 'statut', 'montant_total')
+CHAMPS_MOUVEMENT = ('date_mouvement', 'type_mouvement')
+
+
+# Rendez-vous
+
+@receiver(pre_save, sender=RendezVous)
+def rendezvous_avant_enregistrement(sender, instance, **kwargs):
+    _memoriser_valeurs(sender, instance, *CHAMPS_RDV, 'date_fin')
+
+
+@receiver(post_save, sender=RendezVous)
+def rendezvous_statistiques(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_rdv, CHAMPS_RDV)
+
+
+@receiver(post_delete, sender=RendezVous)
+def rendezvous_statistiques_suppression(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_rdv, CHAMPS_RDV, supprime=True)
+
+
+def _invalider_grilles(intervalles):
+    jours_par_medecin = {}
+    for medecin_id, debut, fin in intervalles:
+        jours = jours_couverts(debut, fin) if fin and fin > debut else [jour_local(debut)]
+        jours_par_medecin.setdefault(medecin_id, set()).update(jours)
+    for medecin_id, jours in jours_par_medecin.items():
+        invalider_apres_commit(invalider_jours, medecin_id, sorted(jours))
+
+
+@receiver(post_save, sender=RendezVous)
+@receiver(post_delete, sender=RendezVous)
+def rendezvous_invalider_grilles(sender, instance, **kwargs):
+    """Invalide les grilles des jours occupés par le rendez-vous, avant et après modification"""
+    intervalles = {(instance.medecin_id, instance.date_heure, instance.date_fin)}
+    avant = getattr(instance, '_stat_avant', None)
+    if avant:
+        intervalles.add((avant['medecin_id'], avant['date_heure'], avant['date_fin']))
+    _invalider_grilles(intervalles)
+
+
+@receiver(rendezvous_modifies_en_masse)
+def rendezvous_en_masse(sender, intervalles, statut_seul=False, **kwargs):
+    """Équivalent groupé des récepteurs post_save des rendez-vous"""
+    if not intervalles:
+        return
+    # Le compteur de rendez-vous ne dépend pas du statut
+    if not statut_seul:
+        variations = nouvelles_variations()
+        for medecin_id, debut, fin in intervalles:
+            ajouter_variation(variations, 'rdv', jour_local(debut), 1, medecin_id)
+        appliquer_variations(variations)
+    _invalider_grilles(intervalles)
+    invalider_apres_commit(invalider_cache_dashboard)
+
+
+# Plannings des médecins
+
+@receiver(pre_save, sender=PlageHoraire)
+@receiver(pre_save, sender=Indisponibilite)
+def planning_avant_enregistrement(sender, instance, **kwargs):
+    _memoriser_valeurs(sender, instance, 'medecin_id')
+
+
+@receiver(post_save, sender=PlageHoraire)
+@receiver(post_delete, sender=PlageHoraire)
+@receiver(post_save, sender=Indisponibilite)
+@receiver(post_delete, sender=Indisponibilite)
+def planning_invalider_grilles(sender, instance, **kwargs):
+    """Invalide les grilles du médecin concerné, avant et après modification"""
+    medecins = {instance.medecin_id}
+    avant = getattr(instance, '_stat_avant', None)
+    if avant:
+        medecins.add(avant['medecin_id'])
+    for medecin_id in medecins:
+        invalider_apres_commit(invalider_medecin, medecin_id)
+
+
+# Consultations
+
+@receiver(pre_save, sender=ConsultationMedicale)
+def consultation_avant_enregistrement(sender, instance, **kwargs):
+    _memoriser_valeurs(sender, instance, *CHAMPS_CONSULTATION)
+
+
+@receiver(post_save, sender=ConsultationMedicale)
+def consultation_statistiques(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_consultation, CHAMPS_CONSULTATION)
+
+
+@receiver(post_delete, sender=ConsultationMedicale)
+def consultation_statistiques_suppression(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_consultation, CHAMPS_CONSULTATION, supprime=True)
+
+
+# Facturation
+
+@receiver(pre_save, sender=Facture)
+def facture_avant_enregistrement(sender, instance, **kwargs):
+    _memoriser_valeurs(sender, instance, *CHAMPS_FACTURE)
+
+
+@receiver(post_save, sender=Facture)
+def facture_statistiques(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_facture, CHAMPS_FACTURE)
+
+
+@receiver(post_delete, sender=Facture)
+def facture_statistiques_suppression(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_facture, CHAMPS_FACTURE, supprime=True)
+
+
+# Mouvements de stock
+
+@receiver(pre_save, sender=MouvementStock)
+def mouvement_avant_enregistrement(sender, instance, **kwargs):
+    _memoriser_valeurs(sender, instance, *CHAMPS_MOUVEMENT)
+
+
+@receiver(post_save, sender=MouvementStock)
+def mouvement_statistiques(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_vente, CHAMPS_MOUVEMENT)
+
+
+@receiver(post_delete, sender=MouvementStock)
+def mouvement_statistiques_suppression(sender, instance, **kwargs):
+    _ajuster_statistiques(instance, _compter_vente, CHAMPS_MOUVEMENT, supprime=True)
+
+
+@receiver(stocks_modifies)
+def mouvements_en_masse_statistiques(sender, ventes=None, **kwargs):
+    if ventes:
+        variations = nouvelles_variations()
+        for jour, nombre in ventes.items():
+            ajouter_variation(variations, 'ventes', jour, nombre)
+        appliquer_variations(variations)
+
+
+# Catalogue de la caisse
+
+@receiver(post_save, sender=Medicament)
+@receiver(post_delete, sender=Medicament)
+def medicament_catalogue(sender, instance, **kwargs):
+    signaler_apres_commit([instance.pk])
+
+
+@receiver(post_save, sender=StockMedicament)
+@receiver(post_delete, sender=StockMedicament)
+def stock_catalogue(sender, instance, **kwargs):
+    signaler_apres_commit([instance.medicament_id])
+
+
+@receiver(stocks_modifies)
+def stocks_catalogue(sender, medicament_ids, **kwargs):
+    signaler_apres_commit(medicament_ids)
+
+
+# Diffusion en direct des rendez-vous
+
+@receiver(post_save, sender=RendezVous)
+def rendezvous_diffuser(sender, instance, created=False, **kwargs):
+    evenement = evenement_rdv('cree' if created else 'modifie', instance)
+    avant = getattr(instance, '_stat_avant', None)
+    if avant:
+        avec_position_precedente(evenement, avant['medecin_id'], avant['date_heure'])
+    publier_apres_commit(evenement)
+
+
+@receiver(post_delete, sender=RendezVous)
+def rendezvous_diffuser_suppression(sender, instance, **kwargs):
+    publier_apres_commit(evenement_court('supprime', instance.medecin_id, instance.date_heure, id=instance.pk))
+
+
+@receiver(rendezvous_modifies_en_masse)
+def rendezvous_diffuser_en_masse(sender, intervalles, ids=None, statut=None, **kwargs):
+    if ids is not None and statut is not None:
+        libelle = dict(RendezVous.STATUS_CHOICES)[statut]
+        for pk, (medecin_id, debut, fin) in zip(ids, intervalles):
+            publier_apres_commit(evenement_court(
+                'statut', medecin_id, debut, id=pk, statut=statut, libelle=libelle
+            ))
+        return
+    # Création groupée : un événement par médecin et par jour
+    touches = {}
+    for medecin_id, debut, fin in intervalles:
+        touches.setdefault((medecin_id, jour_local(debut)), debut)
+    for (medecin_id, jour), debut in touches.items():
+        publier_apres_commit(evenement_court('lot', medecin_id, debut))
+
+
+# Cache du tableau de bord, invalidé après validation de la transaction
+# (une requête concurrente remettrait sinon en cache l'état précédent)
+
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=RendezVous)
+@receiver(post_save, sender=ConsultationMedicale)
+@receiver(post_save, sender=Prescription)
+@receiver(post_save, sender=Facture)
+@receiver(post_save, sender=StockMedicament)
+@receiver(post_save, sender=MouvementStock)
+@receiver(post_save, sender=ExamenLaboratoire)
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=RendezVous)
+@receiver(post_delete, sender=ConsultationMedicale)
+@receiver(post_delete, sender=Prescription)
+@receiver(post_delete, sender=Facture)
+@receiver(post_delete, sender=StockMedicament)
+@receiver(post_delete, sender=MouvementStock)
+@receiver(post_delete, sender=ExamenLaboratoire)
+def dashboard_invalider_cache(sender, instance, **kwargs):
+    invalider_apres_commit(invalider_cache_dashboard)
+
+
+@receiver(stocks_modifies)
+def stocks_invalider_cache(sender, medicament_ids, **kwargs):
+    # Signal déjà envoyé après validation
+    invalider_cache_dashboard()
+
+
+# Index de recherche des patients
+
+@receiver(post_save, sender=Patient)
+def patient_indexer(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(CHAMPS_INDEXES):
+        return
+    moteur_recherche().indexer(instance)
+
+
+@receiver(post_delete, sender=Patient)
+def patient_desindexer(sender, instance, **kwargs):
+    moteur_recherche().supprimer(instance.pk)
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def patient_invalider_suggestions(sender, instance, **kwargs):
+    invalider_suggestions()
@@ -1,3 +1,1273 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from operator import attrgetter
+from threading import Barrier, Lock, Thread
+from unittest.mock import patch
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import QuerySet
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.operations import AddIndex, CreateModel
+from django.http import HttpRequest
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import ResolverMatch
+from django.utils import timezone
+
+from .models import (
+    BalayageAbsences, ConsultationMedicale, DossierMedical, ExamenLaboratoire, Facture, FileAttente,
+    IndexRecherchePatient, InstantaneStock, LignePrescription, Medicament, MouvementStock, Patient, Personnel,
+    Prescription, RendezVous, StatistiqueJournaliere, StockMedicament, TypeExamen,
+)
+from .backends import PersonnelBackend
+from .forms.forms import RendezVousForm
+from .middleware.access_middleware import AccessControlMiddleware, role_required
+from .middleware.permissions import (
+    PUBLIC_URLS, URL_PERMISSIONS, VIEW_PERMISSIONS, MoteurPermissions, moteur_permissions,
+)
+from .services import file_attente
+from .services.catalogue import CLE_GENERATION, Catalogue, signaler_apres_commit
+from .services.dashboard import STATISTIQUES_PAR_ROLE, statistiques_dashboard
+from .services.disponibilite import fin_rdv, premier_conflit, rdv_chevauchants
+from .services.file_attente import FileIndisponible, appeler_suivant, enregistrer_arrivee
+from .services.historique_stock import (
+    enregistrer_instantanes, reconstruire_instantanes, stock_a, stocks_a, variations,
+)
+from .services.periodes import bornes_jour, bornes_mois, bornes_semaine, dans_periode, debut_jour
+from .services.reapprovisionnement import suggestions_en_cache
+from .services.recherche import (
+    cles_patient, forme_patient, moteur_recherche, poids_cle, rechercher_patients, rechercher_patients_tronque,
+)
+from .services.reservation import CreneauIndisponible, enregistrer_rendezvous
+from .services.statistiques import jour_local, reconstruire
+from .services.suggestions import _cache_local, normaliser_requete, suggestions
+from .services.transitions import TRANSITIONS, changer_statuts, marquer_absents, origines_autorisees
+from .services.stock import (
+    DispensationImpossible, StockInsuffisant, VenteImpossible, dispenser_prescription, enregistrer_mouvement, vendre,
+)
+
+ROLES = list(STATISTIQUES_PAR_ROLE)
+
+
+def creer_personnel(role, identifiant=None):
+    identifiant = identifiant or role.lower()
+    user = User.objects.create_user(identifiant, f'{identifiant}@example.com', 'motdepasse', last_name=identifiant)
+    return Personnel.objects.create(user=user, role=role)
+
+
+def creer_donnees(personnels, nombre, debut=0):
+    """Patients avec rendez-vous, consultation, examen, stock, prescription et facture"""
+    medecin, pharmacien = personnels['MEDECIN'], personnels['PHARMACIEN']
+    type_examen = TypeExamen.objects.get_or_create(nom='NFS', defaults={'description': 'Numération', 'prix': Decimal('10')})[0]
+    maintenant = timezone.now()
+    for i in range(debut, debut + nombre):
+        patient = Patient.objects.create(
+            nom=f'Nom{i}', prenom=f'Prénom{i}', date_naissance=date(1990, 1, 1), sexe='M',
+            adresse='Adresse', telephone=f'509-555-{i:04d}', id_patient=f'P{i:05d}',
+        )
+        dossier = DossierMedical.objects.create(patient=patient)
+        for jours in (-1, 0, 1):
+            RendezVous.objects.create(
+                patient=patient, medecin=medecin, date_heure=maintenant + timedelta(days=jours, minutes=i), motif='Suivi',
+            )
+        ConsultationMedicale.objects.create(dossier=dossier, medecin=medecin, motif='m', symptomes='s', diagnostic='d')
+        ExamenLaboratoire.objects.create(
+            patient=patient, type_examen=type_examen, medecin_demandeur=medecin,
+            statut=['DEMANDE', 'EN_COURS', 'TERMINE'][i % 3],
+        )
+        medicament = Medicament.objects.create(
+            nom=f'Médicament{i}', description='d', categorie='c', fabricant='f', prix_unitaire=Decimal('2.50'),
+        )
+        StockMedicament.objects.create(medicament=medicament, quantite=i, seuil_alerte=5)
+        MouvementStock.objects.create(medicament=medicament, quantite=1, type_mouvement='SORTIE', personnel=pharmacien)
+        prescription = Prescription.objects.create(patient=patient, medecin=medecin)
+        LignePrescription.objects.create(
+            prescription=prescription, medicament=medicament, posologie='1/j', duree_traitement='5 j', quantite=1,
+        )
+        Facture.objects.create(patient=patient, montant_total=Decimal('100'), statut='PAYEE' if i % 2 else 'EN_ATTENTE')
+
+
+def en_parallele(fonction, arguments):
+    """
+    Exécute fonction(argument) dans un thread par argument, tous lancés au
+    même instant. Retourne la liste des résultats ou des exceptions levées.
+    """
+    depart = Barrier(len(arguments))
+    resultats = []
+    verrou = Lock()
+
+    def executer(argument):
+        try:
+            depart.wait()
+            resultat = fonction(argument)
+        except Exception as e:
+            resultat = e
+        finally:
+            connections.close_all()
+        with verrou:
+            resultats.append(resultat)
+
+    threads = [Thread(target=executer, args=(argument,)) for argument in arguments]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultats
+
+
+class AuthentificationTests(TestCase):
+    """Chargement de l'utilisateur d'une session"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personnel = creer_personnel('MEDECIN')
+
+    def utilisateur_de_session(self, backend):
+        self.client.force_login(self.personnel.user, backend=backend)
+        request = HttpRequest()
+        request.session = self.client.session
+        return get_user(request)
+
+    def test_profil_charge_avec_l_utilisateur(self):
+        user = self.utilisateur_de_session('app.backends.PersonnelBackend')
+        with self.assertNumQueries(0):
+            self.assertEqual(user.personnel, self.personnel)
+
+    def test_sessions_ouvertes_avec_model_backend(self):
+        user = self.utilisateur_de_session('django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(user, self.personnel.user)
+
+
+def vue_nommee(nom):
+    """Vue factice portant le nom d'une entrée de la table des permissions"""
+    def vue(request):
+        return None
+    vue.__name__ = nom
+    return vue
+
+
+class PermissionsTests(TestCase):
+    """Contrôle d'accès par rôle : chemin de chaque requête, sans accès à la base"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personnels = {role: creer_personnel(role) for role in ROLES}
+
+    def requete(self, role, path, nom_route=None):
+        request = RequestFactory().get(path)
+        request.user = PersonnelBackend().get_user(self.personnels[role].user.pk)
+        if nom_route:
+            request.resolver_match = ResolverMatch(vue_nommee('vue'), (), {}, url_name=nom_route)
+        return request
+
+    def test_middleware_sans_requete(self):
+        middleware = AccessControlMiddleware(lambda request: None)
+        for role, vue, path in [
+            ('MEDECIN', 'PatientListView', '/patients/'),
+            ('PHARMACIEN', 'StockView', '/pharmacie/stock/'),
+            ('RECEPTION', 'facture_create', '/facturation/nouvelle/'),
+            ('ADMIN', 'UserListView', '/utilisateurs/'),
+        ]:
+            with self.subTest(role=role, vue=vue):
+                request = self.requete(role, path, nom_route=vue.lower())
+                with self.assertNumQueries(0):
+                    self.assertIsNone(middleware.process_view(request, vue_nommee(vue), (), {}))
+                    self.assertEqual(request.role, role)
+
+    def test_decisions(self):
+        cas = [
+            ('MEDECIN', 'PatientListView', '/patients/', True),
+            ('MEDECIN', 'StockView', '/pharmacie/stock/', False),
+            ('LABORANTIN', 'PatientListView', '/patients/', False),
+            # Autorisé par préfixe d'URL sans figurer dans la liste des vues
+            ('PHARMACIEN', 'vue_inconnue', '/facturation/liste/', True),
+            ('PHARMACIEN', 'vue_inconnue', '/facturation/nouvelle/', False),
+            ('ADMIN', 'vue_inconnue', '/ailleurs/', True),
+        ]
+        for role, vue, path, attendu in cas:
+            with self.subTest(role=role, vue=vue, path=path):
+                self.assertEqual(moteur_permissions.autorise(role, vue, path), attendu)
+
+    def test_decision_memorisee_par_route(self):
+        moteur = MoteurPermissions(VIEW_PERMISSIONS, URL_PERMISSIONS, PUBLIC_URLS)
+        self.assertTrue(moteur.autorise('MEDECIN', 'PatientListView', '/patients/', 'patient_list'))
+        self.assertEqual(moteur._decisions, {('MEDECIN', 'patient_list'): True})
+        self.assertTrue(moteur.autorise('MEDECIN', 'PatientListView', '/patients/', 'patient_list'))
+
+    def test_roles_par_vue_issus_de_la_table(self):
+        for role, vues in VIEW_PERMISSIONS.items():
+            for vue in vues:
+                with self.subTest(role=role, vue=vue):
+                    self.assertIn(role, moteur_permissions.roles_pour_vue(vue))
+                    self.assertIn('ADMIN', moteur_permissions.roles_pour_vue(vue))
+        self.assertEqual(moteur_permissions.roles_pour_vue('vue_inconnue'), {'ADMIN'})
+
+    def test_role_required(self):
+        vue = role_required()(vue_nommee('StockView'))
+        autorisee = vue(self.requete('PHARMACIEN', '/pharmacie/stock/'))
+        self.assertIsNone(autorisee)
+        refusee = vue(self.requete('MEDECIN', '/pharmacie/stock/'))
+        self.assertEqual(refusee.status_code, 302)
+
+
+class DashboardRequetesTests(TestCase):
+    """Nombre de requêtes du tableau de bord, par rôle"""
+
+    # Requêtes d'un calcul sans cache, quel que soit le volume de données
+    REQUETES = {
+        'ADMIN': 8,
+        'MEDECIN': 6,
+        'INFIRMIER': 3,
+        'LABORANTIN': 4,
+        'PHARMACIEN': 5,
+        'RECEPTION': 6,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personnels = {role: creer_personnel(role) for role in ROLES}
+        creer_donnees(cls.personnels, 3)
+
+    def setUp(self):
+        cache.clear()
+
+    def statistiques(self, role):
+        cache.clear()
+        with self.assertNumQueries(self.REQUETES[role]):
+            return statistiques_dashboard(role, self.personnels[role])
+
+    def test_nombre_fixe_de_requetes_par_role(self):
+        for role in ROLES:
+            with self.subTest(role=role):
+                self.statistiques(role)
+
+    def test_nombre_de_requetes_independant_du_volume(self):
+        creer_donnees(self.personnels, 10, debut=3)
+        for role in ROLES:
+            with self.subTest(role=role):
+                self.statistiques(role)
+
+    def test_statistiques_en_cache_sans_requete(self):
+        for role in ROLES:
+            with self.subTest(role=role):
+                statistiques_dashboard(role, self.personnels[role])
+                with self.assertNumQueries(0):
+                    statistiques_dashboard(role, self.personnels[role])
+
+    def test_invalidation_apres_validation(self):
+        statistiques_dashboard('ADMIN', self.personnels['ADMIN'])
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            Patient.objects.create(
+                nom='Nouveau', prenom='Patient', date_naissance=date(1990, 1, 1), sexe='F',
+                adresse='Adresse', telephone='509-111-0000', id_patient='N00001',
+            )
+            # Toujours en cache tant que la transaction n'est pas validée
+            with self.assertNumQueries(0):
+                statistiques_dashboard('ADMIN', self.personnels['ADMIN'])
+        self.assertTrue(rappels)
+        self.assertEqual(statistiques_dashboard('ADMIN', self.personnels['ADMIN'])['total_patients'], 4)
+
+    def test_compteurs_admin(self):
+        contexte = self.statistiques('ADMIN')
+        self.assertEqual(contexte['total_patients'], 3)
+        self.assertEqual(contexte['factures_non_payees'], 2)
+        self.assertEqual(contexte['examens_en_attente'], 1)
+        self.assertEqual(contexte['examens_en_cours'], 1)
+        self.assertEqual(contexte['produits_stock_bas'], 3)
+
+
+# Relations lues par les gabarits pour chaque liste du tableau de bord
+RELATIONS_RDV = ('patient', 'medecin.user')
+RELATIONS_EXAMEN = ('patient', 'type_examen', 'medecin_demandeur.user')
+RELATIONS_PRESCRIPTION = ('patient', 'medecin.user')
+RELATIONS_TABLEAU_DE_BORD = {
+    'derniers_rdv': RELATIONS_RDV,
+    'rdv_aujourdhui': RELATIONS_RDV,
+    'rdv_a_venir': RELATIONS_RDV,
+    'rdv_demain': RELATIONS_RDV,
+    'dernieres_factures': ('patient',),
+    'factures_non_payees': ('patient',),
+    'examens_en_attente': RELATIONS_EXAMEN,
+    'examens_a_traiter': RELATIONS_EXAMEN,
+    'examens_en_cours': RELATIONS_EXAMEN,
+    'examens_recents': RELATIONS_EXAMEN,
+    'produits_stock_bas': ('medicament',),
+    'mouvements_recents': ('medicament', 'personnel.user'),
+    'prescriptions_recentes': RELATIONS_PRESCRIPTION,
+}
+
+
+class ListesSansRequetesN1Tests(TestCase):
+    """Les listes passées aux gabarits ne déclenchent aucune requête par ligne"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personnels = {role: creer_personnel(role) for role in ROLES}
+        creer_donnees(cls.personnels, 6)
+
+    def setUp(self):
+        cache.clear()
+
+    def parcourir(self, objets, relations):
+        for objet in objets:
+            for relation in relations:
+                attrgetter(relation)(objet)
+
+    def test_listes_du_tableau_de_bord(self):
+        for role in ROLES:
+            contexte = statistiques_dashboard(role, self.personnels[role])
+            for cle, relations in RELATIONS_TABLEAU_DE_BORD.items():
+                if isinstance(contexte.get(cle), list):
+                    with self.subTest(role=role, liste=cle), self.assertNumQueries(0):
+                        self.parcourir(contexte[cle], relations)
+
+    def test_querysets_des_listes(self):
+        listes = [
+            (RendezVous.objects.avec_relations(), RELATIONS_RDV),
+            (ConsultationMedicale.objects.avec_relations(), ('dossier.patient', 'medecin.user')),
+            (ExamenLaboratoire.objects.avec_relations(), RELATIONS_EXAMEN),
+            (Prescription.objects.avec_relations(), RELATIONS_PRESCRIPTION),
+            (StockMedicament.objects.avec_relations(), ('medicament',)),
+            (MouvementStock.objects.avec_relations(), ('medicament', 'personnel.user')),
+            (Facture.objects.avec_relations(), ('patient',)),
+            (Personnel.objects.avec_relations(), ('user',)),
+        ]
+        for queryset, relations in listes:
+            with self.subTest(modele=queryset.model.__name__), self.assertNumQueries(1):
+                self.parcourir(queryset, relations)
+
+    def test_lignes_des_prescriptions_prechargees(self):
+        with self.assertNumQueries(3):
+            for prescription in Prescription.objects.avec_lignes():
+                self.parcourir(prescription.lignes.all(), ('medicament',))
+
+
+# Index composites et requêtes des vues qu'ils servent
+INDEX_ATTENDUS = {
+    'rdv_medecin_date_statut_idx': RendezVous,
+    'rdv_statut_fin_idx': RendezVous,
+    'examen_statut_demande_idx': ExamenLaboratoire,
+    'facture_statut_emission_idx': Facture,
+    'consult_dossier_date_idx': ConsultationMedicale,
+    'consult_medecin_date_idx': ConsultationMedicale,
+    'prescr_patient_date_idx': Prescription,
+    'mvt_type_date_idx': MouvementStock,
+    'patient_enregistrement_idx': Patient,
+}
+
+
+class IndexTests(TestCase):
+    """Index composites : présents dans la migration et utilisés par les requêtes des vues"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personnels = {role: creer_personnel(role) for role in ROLES}
+        creer_donnees(cls.personnels, 5)
+
+    def test_index_dans_les_migrations(self):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        crees = set()
+        for (application, nom), migration in loader.disk_migrations.items():
+            if application != 'app':
+                continue
+            for operation in migration.operations:
+                if isinstance(operation, AddIndex):
+                    crees.add(operation.index.name)
+                elif isinstance(operation, CreateModel):
+                    crees.update(index.name for index in operation.options.get('indexes', []))
+        self.assertLessEqual(set(INDEX_ATTENDUS), crees)
+
+    def test_index_dans_la_base(self):
+        with connection.cursor() as cursor:
+            for nom, modele in INDEX_ATTENDUS.items():
+                with self.subTest(index=nom):
+                    self.assertIn(nom, connection.introspection.get_constraints(cursor, modele._meta.db_table))
+
+    def assertUtiliseIndex(self, queryset, nom):
+        plan = queryset.explain()
+        self.assertIn(nom, plan, f"{nom} n'est pas utilisé :\n{plan}")
+
+    def test_plans_des_requetes(self):
+        maintenant = timezone.now()
+        medecin = self.personnels['MEDECIN']
+        patient = Patient.objects.first()
+        requetes = [
+            (RendezVous.objects.filter(
+                medecin=medecin, date_heure__gte=maintenant, date_heure__lt=maintenant + timedelta(days=1),
+                statut__in=['PLANIFIE', 'CONFIRME'],
+            ), 'rdv_medecin_date_statut_idx'),
+            (RendezVous.objects.filter(statut='PLANIFIE', date_fin__lt=maintenant), 'rdv_statut_fin_idx'),
+            (ExamenLaboratoire.objects.filter(statut='DEMANDE').order_by('-date_demande'), 'examen_statut_demande_idx'),
+            (Facture.objects.filter(statut='EN_ATTENTE').order_by('-date_emission'), 'facture_statut_emission_idx'),
+            (ConsultationMedicale.objects.filter(dossier__patient=patient).order_by('-date_consultation'),
+             'consult_dossier_date_idx'),
+            (ConsultationMedicale.objects.filter(medecin=medecin, date_consultation__gte=maintenant),
+             'consult_medecin_date_idx'),
+            (Prescription.objects.filter(patient=patient).order_by('-date_prescription'), 'prescr_patient_date_idx'),
+            (MouvementStock.objects.filter(type_mouvement='SORTIE', date_mouvement__gte=maintenant),
+             'mvt_type_date_idx'),
+        ]
+        for queryset, nom in requetes:
+            with self.subTest(index=nom):
+                self.assertUtiliseIndex(queryset, nom)
+
+
+class PeriodesTests(TestCase):
+    """Bornes de jour, semaine et mois à la place des filtres `__date`"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personnels = {role: creer_personnel(role) for role in ROLES}
+        creer_donnees(cls.personnels, 3)
+        patient = Patient.objects.first()
+        # Rendez-vous autour de minuit, heure locale et heure UTC
+        with timezone.override('America/Port-au-Prince'):
+            minuit = debut_jour(timezone.localdate())
+        RendezVous.objects.bulk_create([
+            RendezVous(
+                patient=patient, medecin=cls.personnels['MEDECIN'], date_heure=minuit + timedelta(minutes=minutes),
+                date_fin=minuit + timedelta(minutes=minutes + 30), motif='Bornes',
+            )
+            for minutes in range(-24 * 60 - 1, 40 * 24 * 60, 6 * 60 - 1)
+        ])
+
+    def test_equivalent_au_filtre_date(self):
+        with timezone.override('America/Port-au-Prince'):
+            today = timezone.localdate()
+            for nom, bornes, filtre in [
+                ('jour', bornes_jour(today), {'date_heure__date': today}),
+                ('semaine', bornes_semaine(today), {'date_heure__date__range': (
+                    today - timedelta(days=today.weekday()), today + timedelta(days=6 - today.weekday()),
+                )}),
+                ('mois', bornes_mois(today), {'date_heure__year': today.year, 'date_heure__month': today.month}),
+            ]:
+                with self.subTest(periode=nom):
+                    attendus = set(RendezVous.objects.filter(**filtre).values_list('pk', flat=True))
+                    self.assertTrue(attendus)
+                    self.assertEqual(
+                        set(RendezVous.objects.filter(dans_periode('date_heure', bornes)).values_list('pk', flat=True)),
+                        attendus,
+                    )
+
+    def test_tableau_de_bord_sans_conversion_de_date(self):
+        for role in ROLES:
+            with self.subTest(role=role):
+                cache.clear()
+                with CaptureQueriesContext(connection) as requetes:
+                    statistiques_dashboard(role, self.personnels[role])
+                for requete in requetes.captured_queries:
+                    self.assertNotIn('cast_date', requete['sql'])
+                    self.assertNotIn('DATE(', requete['sql'].upper())
+
+    def test_plan_utilise_l_index_de_l_horodatage(self):
+        plan = RendezVous.objects.filter(dans_periode('date_heure', bornes_jour(timezone.localdate()))).explain()
+        self.assertIn('rdv_date_heure_idx', plan)
+
+
+class ChevauchementTests(TestCase):
+    """Détection des chevauchements sur un médecin qui a un long historique"""
+
+    HISTORIQUE = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = creer_personnel('MEDECIN')
+        cls.patient = Patient.objects.create(
+            nom='Nom', prenom='Prénom', date_naissance=date(1990, 1, 1), sexe='F',
+            adresse='Adresse', telephone='509-333-0000', id_patient='C00001',
+        )
+        # Un rendez-vous de 30 minutes par heure, tous passés
+        cls.debut = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        RendezVous.objects.bulk_create([
+            RendezVous(
+                patient=cls.patient, medecin=cls.medecin, date_heure=debut, duree=30,
+                date_fin=fin_rdv(debut, 30), motif='Historique', statut='TERMINE',
+            )
+            for debut in (cls.debut - timedelta(hours=i) for i in range(1, cls.HISTORIQUE + 1))
+        ])
+        cls.rdv = RendezVous.objects.create(
+            patient=cls.patient, medecin=cls.medecin, date_heure=cls.debut, duree=30, motif='Suivi',
+        )
+
+    def test_date_fin_renseignee(self):
+        self.assertEqual(self.rdv.date_fin, self.debut + timedelta(minutes=30))
+
+    def test_conflits(self):
+        cas = [
+            (self.debut, 30, True),
+            (self.debut + timedelta(minutes=15), 30, True),
+            (self.debut - timedelta(minutes=15), 30, True),
+            # Créneaux contigus : pas de chevauchement
+            (self.debut + timedelta(minutes=30), 30, False),
+            (self.debut - timedelta(minutes=30), 30, False),
+            # L'historique est terminé, il n'occupe plus le médecin
+            (self.debut - timedelta(hours=5), 30, False),
+        ]
+        for debut, duree, attendu in cas:
+            with self.subTest(debut=debut):
+                conflit = premier_conflit(self.medecin.pk, debut, duree)
+                self.assertEqual(conflit == self.rdv, attendu)
+        self.assertIsNone(premier_conflit(self.medecin.pk, self.debut, 30, exclure=self.rdv.pk))
+
+    def test_une_requete(self):
+        with self.assertNumQueries(1):
+            premier_conflit(self.medecin.pk, self.debut, 30)
+
+    def test_plan_sans_parcours_de_l_historique(self):
+        plan = rdv_chevauchants(self.medecin.pk, self.debut, fin_rdv(self.debut, 30)).explain()
+        self.assertIn('rdv_medecin_intervalle_idx', plan)
+
+    def test_migration_complete_date_fin(self):
+        migration = import_module('app.migrations.0005_rendezvous_date_fin')
+        RendezVous.objects.filter(medecin=self.medecin).update(date_fin=None)
+
+        migration.completer_date_fin(django_apps, None)
+
+        self.assertFalse(RendezVous.objects.filter(date_fin__isnull=True).exists())
+        self.assertEqual(premier_conflit(self.medecin.pk, self.debut, 30), self.rdv)
+        for rdv in RendezVous.objects.filter(medecin=self.medecin)[:50]:
+            self.assertEqual(rdv.date_fin, rdv.date_heure + timedelta(minutes=rdv.duree))
+
+
+class RechercheTests(TestCase):
+    """Recherche indexée des patients"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patients = [
+            Patient.objects.create(
+                nom='Lefèvre', prenom=f'Prénom{i}', date_naissance=date(1990, 1, 1), sexe='F',
+                adresse='Adresse', telephone=f'509-222-{i:04d}', id_patient=f'S{i:05d}',
+            )
+            for i in range(5)
+        ]
+
+    def test_resultats_tronques(self):
+        patients, tronques = rechercher_patients_tronque('lefevre', limite=3)
+        self.assertEqual(len(patients), 3)
+        self.assertTrue(tronques)
+
+        patients, tronques = rechercher_patients_tronque('lefevre', limite=5)
+        self.assertEqual(len(patients), 5)
+        self.assertFalse(tronques)
+
+    def test_migration_indexe_les_patients_existants(self):
+        migration = import_module('app.migrations.0004_index_recherche_patient')
+        IndexRecherchePatient.objects.all().delete()
+        self.assertFalse(rechercher_patients('lefevre'))
+
+        migration.indexer_patients(django_apps, None)
+
+        self.assertEqual(set(rechercher_patients('lefevre')), set(self.patients))
+        self.assertEqual(list(rechercher_patients('S00003')), [self.patients[3]])
+
+
+class SuggestionsTests(TestCase):
+    """Saisie semi-automatique : affinage en mémoire des requêtes en cache"""
+
+    NOMS = ['Dupont', 'Dupond', 'Duponchel', 'Durand', 'Lefèvre', 'Jean-Baptiste']
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(40):
+            Patient.objects.create(
+                nom=cls.NOMS[i % len(cls.NOMS)], prenom=f'Prénom{i % 7}', date_naissance=date(1990, 1, 1),
+                sexe='M', adresse='Adresse', telephone=f'509-{3000 + i * 37}-{i:04d}', id_patient=f'T{i:05d}',
+            )
+
+    def setUp(self):
+        _cache_local.clear()
+
+    def taper(self, saisie):
+        """Saisit le texte lettre par lettre, retourne les requêtes relues en base"""
+        with CaptureQueriesContext(connection) as requetes:
+            for n in range(2, len(saisie) + 1):
+                suggestions(saisie[:n], gen='test')
+        return len(requetes)
+
+    def test_poids_cle_comme_cles_patient(self):
+        for patient in Patient.objects.all()[:10]:
+            cles = cles_patient(patient)
+            forme = forme_patient(patient)
+            voisines = {cle[:-1] for cle in cles} | {cle + '0' for cle in cles} | {'n:x', 'g:abc', 't:12', 'i:t'}
+            for cle in set(cles) | voisines:
+                with self.subTest(patient=patient.pk, cle=cle):
+                    self.assertEqual(poids_cle(forme, cle), cles.get(cle, 0))
+
+    def test_affinage_identique_a_la_recherche(self):
+        for saisie in ['dupont prenom3', 'lefevre', 't00012', 'jean bap', '509 3037', 'du p']:
+            _cache_local.clear()
+            self.taper(saisie)
+            for n in range(2, len(saisie) + 1):
+                requete = normaliser_requete(saisie[:n])
+                with self.subTest(requete=requete):
+                    candidats, complet = _cache_local.get(('test', requete))
+                    self.assertEqual(
+                        [candidat.pk for candidat in candidats], moteur_recherche().rechercher(requete, 200)
+                    )
+
+    def test_affinage_sans_requete(self):
+        self.assertEqual(self.taper('dup'), 2)
+        self.assertEqual(self.taper('duponch'), 0)
+
+    def test_numero_court_relu_en_base(self):
+        # « 509 » est trouvé par le préfixe du téléphone, que « 50 » n'indexe pas
+        self.taper('50')
+        self.assertEqual(self.taper('509'), 2)
+
+
+class StatistiquesTests(TestCase):
+    """Compteurs journaliers tenus à jour par variations"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personnels = {role: creer_personnel(role) for role in ROLES}
+        cls.autre_medecin = creer_personnel('MEDECIN', 'medecin2')
+        creer_donnees(cls.personnels, 4)
+
+    def lignes(self):
+        return sorted(
+            StatistiqueJournaliere.objects.values_list(
+                'date', 'medecin_id', 'rdv', 'consultations', 'factures_creees', 'ventes', 'revenu'
+            ),
+            key=lambda ligne: (ligne[0], ligne[1] or 0),
+        )
+
+    def assertCommeReconstruit(self):
+        tenues = [ligne for ligne in self.lignes() if any(ligne[2:])]
+        aujourd_hui = timezone.localdate()
+        reconstruire(aujourd_hui - timedelta(days=30), aujourd_hui + timedelta(days=30))
+        self.assertEqual(tenues, self.lignes())
+
+    def test_creations(self):
+        self.assertCommeReconstruit()
+
+    def test_modifications_et_suppressions(self):
+        rdv = RendezVous.objects.filter(medecin=self.personnels['MEDECIN']).first()
+        rdv.date_heure += timedelta(days=3)
+        rdv.medecin = self.autre_medecin
+        rdv.save()
+        RendezVous.objects.filter(medecin=self.personnels['MEDECIN']).last().delete()
+
+        consultation = ConsultationMedicale.objects.first()
+        consultation.date_consultation -= timedelta(days=2)
+        consultation.save()
+
+        for facture in Facture.objects.filter(statut='EN_ATTENTE'):
+            facture.statut = 'PAYEE'
+            facture.save()
+        facture = Facture.objects.filter(statut='PAYEE').first()
+        facture.montant_total += Decimal('20')
+        facture.save()
+        Facture.objects.filter(statut='PAYEE').last().delete()
+
+        mouvement = MouvementStock.objects.first()
+        mouvement.type_mouvement = 'ENTREE'
+        mouvement.save()
+        MouvementStock.objects.last().delete()
+
+        self.assertCommeReconstruit()
+
+    def test_enregistrement_sans_recomptage(self):
+        with CaptureQueriesContext(connection) as requetes:
+            RendezVous.objects.create(
+                patient=Patient.objects.first(), medecin=self.personnels['MEDECIN'],
+                date_heure=timezone.now(), motif='Suivi',
+            )
+        sql = [requete['sql'] for requete in requetes.captured_queries if 'statistiquejournaliere' in requete['sql']]
+        # Un UPDATE par ligne touchée (globale et médecin), sans COUNT
+        self.assertEqual(len(sql), 2, sql)
+        self.assertTrue(all(requete.startswith('UPDATE') for requete in sql), sql)
+
+    def test_migration_calcule_l_historique(self):
+        migration = import_module('app.migrations.0002_statistique_journaliere')
+        attendues = self.lignes()
+        StatistiqueJournaliere.objects.all().delete()
+
+        migration.calculer_statistiques(django_apps, None)
+
+        self.assertEqual([ligne for ligne in attendues if any(ligne[2:])], self.lignes())
+
+
+class ReapprovisionnementTests(TestCase):
+    """Suggestions de réapprovisionnement affichées par l'inventaire"""
+
+    @classmethod
+    def setUpTestData(cls):
+        pharmacien = creer_personnel('PHARMACIEN')
+        cls.medicament = Medicament.objects.create(
+            nom='Amoxicilline', description='d', categorie='c', fabricant='f', prix_unitaire=Decimal('3.00'),
+        )
+        StockMedicament.objects.create(medicament=cls.medicament, quantite=15)
+        # Dix boîtes par jour pendant trois semaines
+        for jours in range(1, 22):
+            mouvement = MouvementStock.objects.create(
+                medicament=cls.medicament, quantite=10, type_mouvement='SORTIE', personnel=pharmacien,
+            )
+            MouvementStock.objects.filter(pk=mouvement.pk).update(
+                date_mouvement=timezone.now() - timedelta(days=jours)
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_medicament_a_commander(self):
+        [suggestion] = suggestions_en_cache(limite=50)
+        self.assertEqual(suggestion.medicament_id, self.medicament.pk)
+        self.assertEqual(suggestion.stock, 15)
+        self.assertLess(suggestion.couverture, 2)
+        self.assertGreater(suggestion.quantite, 300)
+
+    def test_suggestions_en_cache(self):
+        calculees = suggestions_en_cache(limite=50)
+        with self.assertNumQueries(0):
+            self.assertEqual(suggestions_en_cache(limite=50), calculees)
+
+
+class TransitionsTests(TestCase):
+    """Changements de statut unitaires et groupés des rendez-vous"""
+
+    STATUTS = [statut for statut, libelle in RendezVous.STATUS_CHOICES]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = creer_personnel('MEDECIN')
+        cls.patient = Patient.objects.create(
+            nom='Nom', prenom='Prénom', date_naissance=date(1990, 1, 1), sexe='F',
+            adresse='Adresse', telephone='509-777-0000', id_patient='X00001',
+        )
+
+    def rendez_vous(self, statut, heures=1):
+        debut = timezone.now() + timedelta(hours=heures)
+        return RendezVous.objects.create(
+            patient=self.patient, medecin=self.medecin, date_heure=debut, motif='Suivi', statut=statut,
+        )
+
+    def test_table_des_transitions(self):
+        for actuel in self.STATUTS:
+            for cible in self.STATUTS:
+                with self.subTest(actuel=actuel, cible=cible):
+                    rdv = self.rendez_vous(actuel)
+                    resultat = changer_statuts([rdv.pk], cible)[rdv.pk]
+                    rdv.refresh_from_db()
+                    autorisee = cible in TRANSITIONS[actuel]
+                    self.assertEqual(resultat['success'], autorisee)
+                    self.assertEqual(rdv.statut, cible if autorisee else actuel)
+
+    def test_retour_a_planifie_bloque(self):
+        self.assertEqual(origines_autorisees('PLANIFIE'), [])
+        rdv = self.rendez_vous('CONFIRME')
+        resultat = changer_statuts([rdv.pk], 'PLANIFIE')[rdv.pk]
+        self.assertFalse(resultat['success'])
+        self.assertEqual(resultat['statut'], 'CONFIRME')
+        self.assertEqual(RendezVous.objects.get(pk=rdv.pk).statut, 'CONFIRME')
+
+    def test_changement_groupe(self):
+        rdvs = [self.rendez_vous(statut, heures=i) for i, statut in enumerate(
+            ['PLANIFIE', 'CONFIRME', 'CONFIRME', 'ANNULE', 'TERMINE'], start=1
+        )]
+        ids = [rdv.pk for rdv in rdvs] + [0]
+        with CaptureQueriesContext(connection) as requetes:
+            resultats = changer_statuts(ids, 'TERMINE')
+        # Lecture verrouillée puis un seul UPDATE
+        self.assertEqual(
+            [requete['sql'].split()[0] for requete in requetes.captured_queries if 'SAVEPOINT' not in requete['sql']],
+            ['SELECT', 'UPDATE'],
+        )
+        self.assertEqual([resultats[pk]['success'] for pk in ids], [True, True, True, False, False, False])
+        self.assertEqual(resultats[0]['message'], "Rendez-vous introuvable")
+        self.assertEqual(
+            list(RendezVous.objects.filter(pk__in=ids).order_by('date_heure').values_list('statut', flat=True)),
+            ['TERMINE', 'TERMINE', 'TERMINE', 'ANNULE', 'TERMINE'],
+        )
+
+    def test_statut_inconnu(self):
+        with self.assertRaises(ValueError):
+            changer_statuts([self.rendez_vous('PLANIFIE').pk], 'REPORTE')
+
+
+class BalayageAbsencesTests(TestCase):
+    """Balayage des rendez-vous passés restés actifs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = creer_personnel('MEDECIN')
+        patient = Patient.objects.create(
+            nom='Nom', prenom='Prénom', date_naissance=date(1990, 1, 1), sexe='F',
+            adresse='Adresse', telephone='509-777-0001', id_patient='X00002',
+        )
+        maintenant = timezone.now()
+        cls.rdv = {}
+        for nom, heures, statut in [
+            ('oublie', -30, 'PLANIFIE'), ('confirme', -28, 'CONFIRME'), ('hier', -26, 'PLANIFIE'),
+            ('ancien', -50, 'CONFIRME'), ('annule', -24, 'ANNULE'), ('termine', -22, 'TERMINE'),
+            # Terminé depuis moins que le délai de la commande (120 minutes)
+            ('recent', -2, 'PLANIFIE'), ('a_venir', 3, 'CONFIRME'),
+        ]:
+            cls.rdv[nom] = RendezVous.objects.create(
+                patient=patient, medecin=cls.medecin, date_heure=maintenant + timedelta(hours=heures),
+                duree=30, motif='Suivi', statut=statut,
+            )
+
+    def statuts(self):
+        return {nom: RendezVous.objects.get(pk=rdv.pk).statut for nom, rdv in self.rdv.items()}
+
+    def test_marquer_absents_par_lots(self):
+        nombre, lots = marquer_absents(timezone.now() - timedelta(hours=2), taille_lot=3)
+        self.assertEqual((nombre, lots), (4, 2))
+        statuts = self.statuts()
+        for nom in ('oublie', 'confirme', 'hier', 'ancien'):
+            self.assertEqual(statuts[nom], 'ABSENT')
+        self.assertEqual(statuts['annule'], 'ANNULE')
+        self.assertEqual(statuts['termine'], 'TERMINE')
+        self.assertEqual(statuts['a_venir'], 'CONFIRME')
+
+    def test_rendez_vous_en_cours_epargne(self):
+        # Le rendez-vous « recent » s'est terminé il y a 90 minutes
+        marquer_absents(timezone.now() - timedelta(minutes=120))
+        self.assertEqual(self.statuts()['recent'], 'PLANIFIE')
+        marquer_absents(timezone.now() - timedelta(minutes=60))
+        self.assertEqual(self.statuts()['recent'], 'ABSENT')
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('marquer_absences', '--lot', '2', stdout=sortie)
+        self.assertIn('4 rendez-vous marqué(s) absent(s) en 2 lot(s)', sortie.getvalue())
+        balayage = BalayageAbsences.objects.get()
+        self.assertEqual((balayage.nombre, balayage.lots), (4, 2))
+        # Un second passage ne trouve plus rien
+        call_command('marquer_absences', stdout=StringIO())
+        self.assertEqual(BalayageAbsences.objects.latest('pk').nombre, 0)
+
+    def test_absence_corrigee(self):
+        marquer_absents(timezone.now() - timedelta(hours=1))
+        rdv = self.rdv['oublie']
+        self.assertTrue(changer_statuts([rdv.pk], 'TERMINE')[rdv.pk]['success'])
+        self.assertFalse(changer_statuts([rdv.pk], 'ABSENT')[rdv.pk]['success'])
+
+
+class FileAttenteTests(TestCase):
+    """Arrivées et appels dans la file d'attente d'un médecin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.medecin = creer_personnel('MEDECIN')
+        cls.patients = [
+            Patient.objects.create(
+                nom=f'Nom{i}', prenom='Prénom', date_naissance=date(1990, 1, 1), sexe='F',
+                adresse='Adresse', telephone=f'509-777-1{i:03d}', id_patient=f'F{i:05d}',
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        maintenant = timezone.now()
+        self.rdv = RendezVous.objects.create(
+            patient=self.patients[0], medecin=self.medecin, date_heure=maintenant - timedelta(minutes=20),
+            motif='Suivi', statut='CONFIRME',
+        )
+        # Consultation en cours, puis deux patients en attente
+        self.en_cours = enregistrer_arrivee(rendez_vous=self.rdv)
+        FileAttente.objects.filter(pk=self.en_cours.pk).update(statut='APPELE', heure_appel=maintenant)
+        self.suivants = [
+            enregistrer_arrivee(patient_id=patient.pk, medecin_id=self.medecin.pk)
+            for patient in self.patients[1:]
+        ]
+
+    def statuts(self):
+        return list(
+            FileAttente.objects.filter(pk__in=[self.en_cours.pk] + [p.pk for p in self.suivants])
+            .order_by('pk').values_list('statut', flat=True)
+        )
+
+    def test_arrivee_en_double(self):
+        with self.assertRaises(FileIndisponible):
+            enregistrer_arrivee(patient_id=self.patients[1].pk, medecin_id=self.medecin.pk)
+        with self.assertRaises(FileIndisponible):
+            enregistrer_arrivee(rendez_vous=self.rdv)
+        self.assertEqual(FileAttente.objects.count(), 3)
+
+    def test_retour_apres_depart(self):
+        FileAttente.objects.filter(pk=self.en_cours.pk).update(statut='PARTI')
+        passage = enregistrer_arrivee(rendez_vous=self.rdv)
+        self.assertEqual((passage.pk, passage.statut), (self.en_cours.pk, 'EN_ATTENTE'))
+
+    def test_appeler_suivant(self):
+        appele = appeler_suivant(self.medecin.pk)
+        self.assertEqual(appele.pk, self.suivants[0].pk)
+        self.assertEqual(self.statuts(), ['TERMINE', 'APPELE', 'EN_ATTENTE'])
+        self.assertEqual(RendezVous.objects.get(pk=self.rdv.pk).statut, 'TERMINE')
+        self.assertEqual(appeler_suivant(self.medecin.pk).pk, self.suivants[1].pk)
+        self.assertIsNone(appeler_suivant(self.medecin.pk))
+        self.assertEqual(self.statuts(), ['TERMINE', 'TERMINE', 'TERMINE'])
+
+    def appel_concurrent(self, conflits):
+        """
+        Simule un autre poste qui appelle le patient lu avant l'UPDATE, lors
+        des `conflits` premières tentatives. Retourne le statut de la
+        consultation en cours vu au début de chaque tentative.
+        """
+        vus = []
+        premier = QuerySet.first
+        terminer = file_attente._terminer_en_cours
+
+        def lire(queryset):
+            pk = premier(queryset)
+            if queryset.model is FileAttente and pk is not None and len(vus) <= conflits:
+                FileAttente.objects.filter(pk=pk).update(statut='APPELE')
+            return pk
+
+        def terminer_en_cours(medecin_id, maintenant):
+            vus.append(FileAttente.objects.get(pk=self.en_cours.pk).statut)
+            return terminer(medecin_id, maintenant)
+
+        return vus, patch.object(QuerySet, 'first', lire), patch.object(file_attente, '_terminer_en_cours', terminer_en_cours)
+
+    def test_appel_reessaye(self):
+        vus, lecture, cloture = self.appel_concurrent(conflits=1)
+        with lecture, cloture:
+            appele = appeler_suivant(self.medecin.pk)
+        # La clôture de la première tentative est annulée avec son point de
+        # sauvegarde : la seconde tentative retrouve la consultation en cours
+        self.assertEqual(vus, ['APPELE', 'APPELE'])
+        self.assertEqual(appele.pk, self.suivants[0].pk)
+        self.assertEqual(self.statuts(), ['TERMINE', 'APPELE', 'EN_ATTENTE'])
+
+    def test_appel_abandonne(self):
+        vus, lecture, cloture = self.appel_concurrent(conflits=3)
+        with lecture, cloture, self.assertRaises(FileIndisponible):
+            appeler_suivant(self.medecin.pk, tentatives=3)
+        self.assertEqual(len(vus), 3)
+        # Aucune tentative n'a laissé de trace
+        self.assertEqual(self.statuts(), ['APPELE', 'EN_ATTENTE', 'EN_ATTENTE'])
+        self.assertEqual(RendezVous.objects.get(pk=self.rdv.pk).statut, 'CONFIRME')
+
+
+class DispensationTests(TestCase):
+    """Délivrance d'une prescription en une seule transaction"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacien = creer_personnel('PHARMACIEN')
+        medecin = creer_personnel('MEDECIN')
+        patient = Patient.objects.create(
+            nom='Nom', prenom='Prénom', date_naissance=date(1990, 1, 1), sexe='M',
+            adresse='Adresse', telephone='509-777-2000', id_patient='D00001',
+        )
+        cls.medicaments = []
+        for nom, prix, quantite in [('Ibuprofène', '2.00', 10), ('Amoxicilline', '3.50', 4)]:
+            medicament = Medicament.objects.create(
+                nom=nom, description='d', categorie='c', fabricant='f', prix_unitaire=Decimal(prix),
+            )
+            StockMedicament.objects.create(medicament=medicament, quantite=quantite)
+            cls.medicaments.append(medicament)
+        cls.prescription = Prescription.objects.create(patient=patient, medecin=medecin)
+
+    def prescrire(self, *quantites):
+        for medicament, quantite in zip(self.medicaments, quantites):
+            LignePrescription.objects.create(
+                prescription=self.prescription, medicament=medicament, posologie='1/j',
+                duree_traitement='5 j', quantite=quantite,
+            )
+
+    def stocks(self):
+        return [StockMedicament.objects.get(medicament=medicament).quantite for medicament in self.medicaments]
+
+    def test_dispensation(self):
+        self.prescrire(6, 4)
+        mouvements, facture = dispenser_prescription(self.prescription, self.pharmacien, facturer=True)
+        self.assertEqual(len(mouvements), 2)
+        self.assertEqual(self.stocks(), [4, 0])
+        self.assertEqual(facture.montant_total, Decimal('26.00'))
+        self.assertEqual(facture.lignes.count(), 2)
+        self.assertIsNotNone(Prescription.objects.get(pk=self.prescription.pk).date_dispensation)
+        with self.assertRaises(DispensationImpossible):
+            dispenser_prescription(self.prescription, self.pharmacien)
+        self.assertEqual(self.stocks(), [4, 0])
+
+    def test_dispensation_impossible(self):
+        # Le premier médicament est disponible, le second manque : rien n'est délivré
+        self.prescrire(6, 5)
+        with self.assertRaises(DispensationImpossible) as contexte:
+            dispenser_prescription(self.prescription, self.pharmacien, facturer=True)
+        [manque] = contexte.exception.manques
+        self.assertEqual((manque.medicament, manque.disponible, manque.demande), (self.medicaments[1], 4, 5))
+        self.assertEqual(self.stocks(), [10, 4])
+        self.assertFalse(MouvementStock.objects.exists())
+        self.assertFalse(Facture.objects.exists())
+        self.assertIsNone(Prescription.objects.get(pk=self.prescription.pk).date_dispensation)
+
+    def test_lignes_cumulees(self):
+        # Deux lignes de 6 pour un stock de 10 : chacune passerait seule
+        self.prescrire(6)
+        self.prescrire(6)
+        with self.assertRaises(DispensationImpossible):
+            dispenser_prescription(self.prescription, self.pharmacien)
+        self.assertEqual(self.stocks(), [10, 4])
+
+    def test_prescription_vide(self):
+        with self.assertRaises(DispensationImpossible):
+            dispenser_prescription(self.prescription, self.pharmacien)
+        self.assertIsNone(Prescription.objects.get(pk=self.prescription.pk).date_dispensation)
+
+
+class CaisseTests(TestCase):
+    """Ventes de la caisse et catalogue des médicaments en mémoire"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacien = creer_personnel('PHARMACIEN')
+        cls.patient = Patient.objects.create(
+            nom='Nom', prenom='Prénom', date_naissance=date(1990, 1, 1), sexe='F',
+            adresse='Adresse', telephone='509-777-3000', id_patient='C00001',
+        )
+        cls.medicaments = []
+        for nom, code, prix, quantite in [
+            ('Paracétamol 500', '3400930000011', '1.50', 10),
+            ('Paracétamol codéiné', None, '4.00', 3),
+            ('Amoxicilline', '3400930000028', '3.00', 5),
+        ]:
+            medicament = Medicament.objects.create(
+                nom=nom, code=code, description='d', categorie='c', fabricant='f', prix_unitaire=Decimal(prix),
+            )
+            StockMedicament.objects.create(medicament=medicament, quantite=quantite)
+            cls.medicaments.append(medicament)
+
+    def setUp(self):
+        cache.clear()
+
+    def stocks(self):
+        return [StockMedicament.objects.get(medicament=medicament).quantite for medicament in self.medicaments]
+
+    def test_vente(self):
+        paracetamol, _, amoxicilline = self.medicaments
+        mouvements, facture, total = vendre([(paracetamol.pk, 4), (amoxicilline.pk, 1)], self.pharmacien, self.patient.pk)
+        self.assertEqual(len(mouvements), 2)
+        self.assertEqual(total, Decimal('9.00'))
+        self.assertEqual((facture.statut, facture.montant_total), ('PAYEE', total))
+        self.assertEqual(self.stocks(), [6, 3, 4])
+        # Client de passage : pas de facture
+        self.assertIsNone(vendre([(paracetamol.pk, 1)], self.pharmacien)[1])
+
+    def test_panier_invalide(self):
+        paracetamol, codeine, _ = self.medicaments
+        for panier in ([], [(paracetamol.pk, 0)], [(paracetamol.pk, 2), (codeine.pk, -1)], [(0, 1)]):
+            with self.subTest(panier=panier), self.assertRaises(VenteImpossible):
+                vendre(panier, self.pharmacien)
+        with self.assertRaises(VenteImpossible) as contexte:
+            vendre([(paracetamol.pk, 2), (codeine.pk, 4)], self.pharmacien, self.patient.pk)
+        self.assertEqual([manque.medicament for manque in contexte.exception.manques], [codeine])
+        self.assertEqual(self.stocks(), [10, 3, 5])
+        self.assertFalse(MouvementStock.objects.exists())
+        self.assertFalse(Facture.objects.exists())
+
+    def test_recherche_catalogue(self):
+        catalogue = Catalogue()
+        self.assertEqual([produit['nom'] for produit in catalogue.rechercher('parac')], [
+            'Paracétamol 500', 'Paracétamol codéiné',
+        ])
+        self.assertEqual([produit['nom'] for produit in catalogue.rechercher('para cod')], ['Paracétamol codéiné'])
+        # Code scanné
+        [produit] = catalogue.rechercher('3400930000028')
+        self.assertEqual((produit['nom'], produit['prix'], produit['stock']), ('Amoxicilline', '3.00', 5))
+        with self.assertNumQueries(0):
+            catalogue.rechercher('amox')
+
+    def test_rechargement_par_generation(self):
+        catalogue = Catalogue()
+        catalogue.rechercher('amox')
+        generation = catalogue.generation
+        paracetamol, _, amoxicilline = self.medicaments
+        with self.captureOnCommitCallbacks(execute=True):
+            vendre([(amoxicilline.pk, 2)], self.pharmacien)
+        # Seuls les médicaments notés au journal sont relus
+        with self.assertNumQueries(1):
+            [produit] = catalogue.rechercher('amox')
+        self.assertEqual(produit['stock'], 3)
+        self.assertGreater(catalogue.generation, generation)
+
+        # Journal évincé : le catalogue est rechargé en entier, y compris le
+        # médicament renommé sans signalement
+        Medicament.objects.filter(pk=amoxicilline.pk).update(nom='Clamoxyl')
+        with self.captureOnCommitCallbacks(execute=True):
+            Medicament.objects.filter(pk=paracetamol.pk).update(nom='Doliprane')
+            signaler_apres_commit([paracetamol.pk])
+        cache.delete(f'catalogue:journal:{cache.get(CLE_GENERATION)}')
+        self.assertEqual([produit['nom'] for produit in catalogue.rechercher('doli')], ['Doliprane'])
+        self.assertEqual([produit['nom'] for produit in catalogue.rechercher('clamo')], ['Clamoxyl'])
+
+
+class HistoriqueStockTests(TestCase):
+    """Stock passé reconstitué depuis les instantanés de fin de journée"""
+
+    @classmethod
+    def setUpTestData(cls):
+        pharmacien = creer_personnel('PHARMACIEN')
+        cls.medicaments = [
+            Medicament.objects.create(
+                nom=f'Médicament{i}', description='d', categorie='c', fabricant='f', prix_unitaire=Decimal('1.00'),
+            )
+            for i in range(3)
+        ]
+        for medicament, quantite in zip(cls.medicaments, (40, 12, 0)):
+            StockMedicament.objects.create(medicament=medicament, quantite=quantite)
+        # Entrées et sorties sur dix jours, plusieurs par jour ; le dernier médicament n'a aucun mouvement
+        maintenant = timezone.now()
+        for jours in range(10):
+            for i, medicament in enumerate(cls.medicaments[:2]):
+                for heures, quantite, sens in ((2, 5 + i, 'ENTREE'), (7, 3 + jours % 4, 'SORTIE')):
+                    mouvement = MouvementStock.objects.create(
+                        medicament=medicament, quantite=quantite, type_mouvement=sens, personnel=pharmacien,
+                    )
+                    MouvementStock.objects.filter(pk=mouvement.pk).update(
+                        date_mouvement=maintenant - timedelta(days=jours, hours=heures)
+                    )
+
+    def attendus(self, instant):
+        """Stock actuel moins les mouvements postérieurs à l'instant"""
+        posterieurs = variations(debut=instant)
+        return {
+            medicament_id: quantite - posterieurs.get(medicament_id, 0)
+            for medicament_id, quantite in StockMedicament.objects.values_list('medicament_id', 'quantite')
+        }
+
+    def instants(self):
+        maintenant = timezone.now()
+        return [maintenant - timedelta(days=jours, hours=heures) for jours in range(12) for heures in (0, 5, 13)]
+
+    def test_sans_instantane(self):
+        for instant in self.instants():
+            with self.subTest(instant=instant):
+                self.assertEqual(stocks_a(instant), self.attendus(instant))
+
+    def test_depuis_les_instantanes(self):
+        self.assertGreater(reconstruire_instantanes(), 0)
+        for instant in self.instants():
+            with self.subTest(instant=instant):
+                with CaptureQueriesContext(connection) as requetes:
+                    stocks = stocks_a(instant)
+                self.assertLessEqual(len(requetes), 3)
+                self.assertEqual(stocks, self.attendus(instant))
+
+    def test_nuits_sans_instantane(self):
+        reconstruire_instantanes()
+        # Instantanés manquants un jour sur deux et pour un seul des médicaments
+        InstantaneStock.objects.filter(date__in=[
+            jour_local(timezone.now() - timedelta(days=jours)) for jours in range(1, 10, 2)
+        ]).delete()
+        InstantaneStock.objects.filter(
+            medicament=self.medicaments[1], date=jour_local(timezone.now() - timedelta(days=4)),
+        ).delete()
+        for instant in self.instants():
+            with self.subTest(instant=instant):
+                self.assertEqual(stocks_a(instant), self.attendus(instant))
+
+    def test_instantanes_du_jour(self):
+        jour = jour_local(timezone.now() - timedelta(days=3))
+        reconstruire_instantanes()
+        reconstruits = dict(InstantaneStock.objects.filter(date=jour).values_list('medicament_id', 'quantite'))
+        InstantaneStock.objects.all().delete()
+        # Seuls les médicaments ayant bougé ce jour-là
+        self.assertEqual(enregistrer_instantanes(jour), 2)
+        self.assertEqual(dict(InstantaneStock.objects.values_list('medicament_id', 'quantite')), reconstruits)
+        self.assertEqual(stock_a(self.medicaments[2].pk, timezone.now() - timedelta(days=5)), 0)
+
+
+class ReservationConcurrenteTests(TransactionTestCase):
+    """Deux postes qui réservent le même créneau en même temps"""
+
+    POSTES = 8
+
+    def setUp(self):
+        self.medecin = creer_personnel('MEDECIN')
+        self.patients = [
+            Patient.objects.create(
+                nom=f'Nom{i}', prenom='Prénom', date_naissance=date(1990, 1, 1), sexe='F',
+                adresse='Adresse', telephone=f'509-444-{i:04d}', id_patient=f'R{i:05d}',
+            )
+            for i in range(self.POSTES)
+        ]
+        # Lundi prochain à 10 h, dans les horaires par défaut
+        lundi = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        self.debut = f'{lundi}T10:00'
+
+    def formulaire(self, patient, decalage=0):
+        heure = f'{self.debut[:-5]}{10 + decalage:02d}:00' if decalage else self.debut
+        form = RendezVousForm(data={
+            'patient': patient.pk, 'medecin': self.medecin.pk, 'date_heure': heure, 'duree': 30, 'motif': 'Consultation',
+        })
+        # Tous les postes valident avant qu'aucun n'enregistre
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+    def test_une_seule_reservation_du_meme_creneau(self):
+        formulaires = [self.formulaire(patient) for patient in self.patients]
+        resultats = en_parallele(enregistrer_rendezvous, formulaires)
+
+        reussites = [resultat for resultat in resultats if not isinstance(resultat, Exception)]
+        refus = [resultat for resultat in resultats if isinstance(resultat, CreneauIndisponible)]
+        self.assertEqual(len(reussites), 1, resultats)
+        self.assertEqual(len(refus), self.POSTES - 1, resultats)
+        self.assertEqual(RendezVous.objects.filter(medecin=self.medecin).count(), 1)
+
+    def test_creneaux_distincts_tous_reserves(self):
+        formulaires = [self.formulaire(patient, decalage=i) for i, patient in enumerate(self.patients)]
+        resultats = en_parallele(enregistrer_rendezvous, formulaires)
+
+        self.assertFalse([resultat for resultat in resultats if isinstance(resultat, Exception)])
+        self.assertEqual(RendezVous.objects.filter(medecin=self.medecin).count(), self.POSTES)
+
+
+class StockConcurrentTests(TransactionTestCase):
+    """Sorties de stock simultanées sur un même médicament"""
+
+    STOCK_INITIAL = 20
+
+    def setUp(self):
+        self.pharmacien = creer_personnel('PHARMACIEN')
+        self.medicament = Medicament.objects.create(
+            nom='Paracétamol', description='d', categorie='c', fabricant='f', prix_unitaire=Decimal('1.00'),
+        )
+        StockMedicament.objects.create(medicament=self.medicament, quantite=self.STOCK_INITIAL)
+
+    def sortie(self, quantite):
+        return enregistrer_mouvement(MouvementStock(
+            medicament=self.medicament, quantite=quantite, type_mouvement='SORTIE', personnel=self.pharmacien,
+        ))
+
+    def stock(self):
+        return StockMedicament.objects.get(medicament=self.medicament).quantite
+
+    def test_sorties_concurrentes_jamais_negatives(self):
+        quantites = [3] * 12
+        resultats = en_parallele(self.sortie, quantites)
+
+        refus = [resultat for resultat in resultats if isinstance(resultat, StockInsuffisant)]
+        reussites = [resultat for resultat in resultats if not isinstance(resultat, Exception)]
+        self.assertEqual(len(reussites) + len(refus), len(quantites), resultats)
+        # 20 unités : six sorties de 3 passent, les autres sont refusées
+        self.assertEqual(len(reussites), self.STOCK_INITIAL // 3)
+        self.assertEqual(self.stock(), self.STOCK_INITIAL % 3)
+        self.assertEqual(MouvementStock.objects.filter(medicament=self.medicament).count(), len(reussites))
+
+    def test_stock_insuffisant(self):
+        with self.assertRaises(StockInsuffisant) as contexte:
+            self.sortie(self.STOCK_INITIAL + 1)
+        self.assertEqual(contexte.exception.disponible, self.STOCK_INITIAL)
+        self.assertEqual(contexte.exception.demande, self.STOCK_INITIAL + 1)
+        # Ni mouvement ni décrément
+        self.assertEqual(self.stock(), self.STOCK_INITIAL)
+        self.assertFalse(MouvementStock.objects.filter(medicament=self.medicament).exists())
+
+    def test_sortie_couverte(self):
+        self.sortie(self.STOCK_INITIAL)
+        self.assertEqual(self.stock(), 0)
+        with self.assertRaises(StockInsuffisant):
+            self.sortie(1)
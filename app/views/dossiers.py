@@ -18,26 +18,22 @@ class DossierMedicalView(RoleRequiredMixin, DetailView):
     Accessible aux médecins, infirmiers et administrateurs.
     """
     model = DossierMedical
+    queryset = DossierMedical.objects.select_related('patient')
     template_name = 'dossiers/dossier.html'
     context_object_name = 'dossier'
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        dossier = self.get_object()
+        dossier = self.object
         
         # Informations sur le patient
         context['patient'] = dossier.patient
         
         # Historique des consultations triées par date (les plus récentes d'abord)
-        context['consultations'] = dossier.consultations.all().order_by('-date_consultation')
+        context['consultations'] = dossier.consultations.select_related('medecin__user').order_by('-date_consultation')
         
         # Vérifier si l'utilisateur est un médecin pour les permissions
-        try:
-            role = self.request.user.personnel.role
-            context['is_medecin'] = role in ['ADMIN', 'MEDECIN']
-        except:
-            context['is_medecin'] = self.request.user.is_superuser
+        context['is_medecin'] = self.request.role in ['ADMIN', 'MEDECIN']
         
         return context
 
@@ -50,7 +46,6 @@ class ConsultationCreateView(RoleRequiredMixin, CreateView):
     model = ConsultationMedicale
     form_class = ConsultationForm
     template_name = 'dossiers/consultation_form.html'
-    roles_allowed = ['ADMIN', 'MEDECIN']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -64,7 +59,7 @@ class ConsultationCreateView(RoleRequiredMixin, CreateView):
     
     def form_valid(self, form):
         # Associer le médecin actuel
-        form.instance.medecin = self.request.user.personnel
+        form.instance.medecin = self.request.personnel
         
         # Associer le dossier médical
         dossier_id = self.kwargs.get('dossier_id')
@@ -91,27 +86,26 @@ class ConsultationDetailView(RoleRequiredMixin, DetailView):
     Accessible aux médecins, infirmiers et administrateurs.
     """
     model = ConsultationMedicale
+    queryset = ConsultationMedicale.objects.avec_relations()
     template_name = 'dossiers/consultation_detail.html'
     context_object_name = 'consultation'
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        consultation = self.get_object()
+        consultation = self.object
         
         # Informations sur le patient et le dossier
         context['patient'] = consultation.dossier.patient
         context['dossier'] = consultation.dossier
         
         # Vérifier si l'utilisateur est un médecin pour les permissions
-        try:
-            role = self.request.user.personnel.role
-            context['is_medecin'] = role in ['ADMIN', 'MEDECIN']
-            # Pour permettre au médecin qui a créé la consultation de la modifier
-            context['is_author'] = (role in ['ADMIN', 'MEDECIN']) and (consultation.medecin == self.request.user.personnel)
-        except:
-            context['is_medecin'] = self.request.user.is_superuser
+        role = self.request.role
+        context['is_medecin'] = role in ['ADMIN', 'MEDECIN']
+        if self.request.personnel is None:
             context['is_author'] = self.request.user.is_superuser
+        else:
+            # Pour permettre au médecin qui a créé la consultation de la modifier
+            context['is_author'] = (role in ['ADMIN', 'MEDECIN']) and (consultation.medecin_id == self.request.personnel.id)
         
         # Récupérer les prescriptions liées à cette consultation
         context['prescriptions'] = consultation.prescriptions.all()
@@ -129,10 +123,9 @@ class ConsultationListView(RoleRequiredMixin, ListView):
     context_object_name = 'consultations'
     paginate_by = 15
     ordering = ['-date_consultation']
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER']
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().avec_relations()
         
         # Filtrer par patient si spécifié
         patient_id = self.kwargs.get('patient_id')
@@ -140,11 +133,8 @@ class ConsultationListView(RoleRequiredMixin, ListView):
             queryset = queryset.filter(dossier__patient__id=patient_id)
         
         # Filtrer par médecin si l'utilisateur est un médecin
-        try:
-            if self.request.user.personnel.role == 'MEDECIN':
-                queryset = queryset.filter(medecin=self.request.user.personnel)
-        except:
-            pass
+        if self.request.role == 'MEDECIN':
+            queryset = queryset.filter(medecin=self.request.personnel)
         
         # Filtrer par recherche si spécifié
         query = self.request.GET.get('q')
@@ -169,11 +159,7 @@ class ConsultationListView(RoleRequiredMixin, ListView):
             context['filtered_by_patient'] = True
         
         # Vérifier si l'utilisateur est un médecin pour les permissions
-        try:
-            role = self.request.user.personnel.role
-            context['is_medecin'] = role in ['ADMIN', 'MEDECIN']
-        except:
-            context['is_medecin'] = self.request.user.is_superuser
+        context['is_medecin'] = self.request.role in ['ADMIN', 'MEDECIN']
         
         # Informations pour la recherche
         context['query'] = self.request.GET.get('q', '')
@@ -182,7 +168,7 @@ class ConsultationListView(RoleRequiredMixin, ListView):
 
 
 @login_required
-@role_required(['ADMIN', 'MEDECIN'])
+@role_required()
 def consultation_create(request, patient_id):
     """
     Vue fonctionnelle pour créer une consultation depuis la fiche patient.
@@ -198,7 +184,7 @@ def consultation_create(request, patient_id):
         form = ConsultationForm(request.POST)
         if form.is_valid():
             consultation = form.save(commit=False)
-            consultation.medecin = request.user.personnel
+            consultation.medecin = request.personnel
             consultation.dossier = dossier
             consultation.date_consultation = timezone.now()
             consultation.save()
@@ -219,7 +205,7 @@ def consultation_create(request, patient_id):
 
 
 @login_required
-@role_required(['ADMIN', 'MEDECIN'])
+@role_required()
 def consultation_update(request, pk):
     """
     Vue fonctionnelle pour modifier une consultation existante.
@@ -229,8 +215,8 @@ def consultation_update(request, pk):
     consultation = get_object_or_404(ConsultationMedicale, id=pk)
     
     # Vérifier si l'utilisateur est autorisé à modifier cette consultation
-    is_author = (consultation.medecin == request.user.personnel)
-    is_admin = (request.user.personnel.role == 'ADMIN' or request.user.is_superuser)
+    is_author = request.personnel is not None and consultation.medecin_id == request.personnel.id
+    is_admin = (request.role == 'ADMIN' or request.user.is_superuser)
     
     if not (is_author or is_admin):
         messages.error(request, "Vous n'êtes pas autorisé à modifier cette consultation.")
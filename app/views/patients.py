@@ -3,14 +3,21 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseNotModified
 
 from ..models import Patient, DossierMedical, ConsultationMedicale, RendezVous, ExamenLaboratoire, Prescription
 from ..forms import PatientForm, PatientSearchForm
+from ..services.recherche import NOMBRE_MAX_RESULTATS, rechercher_patients_tronque
+from ..services.suggestions import suggestions, etag_suggestions, generation
 from ..middleware.access_middleware import role_required, RoleRequiredMixin
 
+# Affiché quand une recherche trouve plus de patients que la limite
+MESSAGE_TRONQUE = (
+    f"Seuls les {NOMBRE_MAX_RESULTATS} patients les plus pertinents sont affichés. "
+    "Précisez la recherche pour trouver les autres."
+)
+
 
 class PatientListView(RoleRequiredMixin, ListView):
     """Vue pour afficher la liste des patients"""
@@ -19,7 +26,6 @@ class PatientListView(RoleRequiredMixin, ListView):
     context_object_name = 'patients'
     paginate_by = 15
     ordering = ['-date_enregistrement']
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER', 'RECEPTION']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -30,21 +36,19 @@ class PatientListView(RoleRequiredMixin, ListView):
         query = self.request.GET.get('q')
         if query:
             context['query'] = query
+            context['resultats_tronques'] = self.resultats_tronques
             
         return context
     
     def get_queryset(self):
         queryset = super().get_queryset()
         
-        # Filtrer par terme de recherche si présent
+        # Filtrer par terme de recherche si présent (triés par pertinence)
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(nom__icontains=query) | 
-                Q(prenom__icontains=query) | 
-                Q(id_patient__icontains=query) |
-                Q(telephone__icontains=query)
-            )
+            queryset, self.resultats_tronques = rechercher_patients_tronque(query)
+            if self.resultats_tronques:
+                messages.info(self.request, MESSAGE_TRONQUE)
             
         return queryset
 
@@ -54,11 +58,10 @@ class PatientDetailView(RoleRequiredMixin, DetailView):
     model = Patient
     template_name = 'patients/fiche.html'
     context_object_name = 'patient'
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER', 'RECEPTION']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        patient = self.get_object()
+        patient = self.object
         
         # Vérifier si le patient a un dossier médical
         try:
@@ -66,7 +69,7 @@ class PatientDetailView(RoleRequiredMixin, DetailView):
             context['dossier_medical'] = dossier
             
             # Consultations médicales
-            context['consultations'] = ConsultationMedicale.objects.filter(
+            context['consultations'] = ConsultationMedicale.objects.avec_relations().filter(
                 dossier=dossier
             ).order_by('-date_consultation')[:5]
             
@@ -75,34 +78,30 @@ class PatientDetailView(RoleRequiredMixin, DetailView):
             context['consultations'] = []
         
         # Rendez-vous
-        context['rendez_vous'] = RendezVous.objects.filter(
+        context['rendez_vous'] = RendezVous.objects.avec_relations().filter(
             patient=patient
         ).order_by('-date_heure')[:5]
         
         # Prochains rendez-vous
-        context['prochains_rdv'] = RendezVous.objects.filter(
+        context['prochains_rdv'] = RendezVous.objects.avec_relations().filter(
             patient=patient,
             date_heure__gte=timezone.now()
         ).order_by('date_heure')[:3]
         
         # Examens de laboratoire
-        context['examens'] = ExamenLaboratoire.objects.filter(
+        context['examens'] = ExamenLaboratoire.objects.avec_relations().filter(
             patient=patient
         ).order_by('-date_demande')[:5]
         
         # Prescriptions
-        context['prescriptions'] = Prescription.objects.filter(
+        context['prescriptions'] = Prescription.objects.avec_relations().filter(
             patient=patient
         ).order_by('-date_prescription')[:5]
         
         # Accès aux fonctionnalités selon le rôle
-        try:
-            role = self.request.user.personnel.role
-            context['can_edit'] = role in ['ADMIN', 'RECEPTION']
-            context['is_medecin'] = role == 'MEDECIN'
-        except:
-            context['can_edit'] = self.request.user.is_superuser
-            context['is_medecin'] = False
+        role = self.request.role
+        context['can_edit'] = role in ['ADMIN', 'RECEPTION']
+        context['is_medecin'] = role == 'MEDECIN'
             
         return context
 
@@ -113,7 +112,6 @@ class PatientCreateView(RoleRequiredMixin, CreateView):
     form_class = PatientForm
     template_name = 'patients/formulaire.html'
     success_url = reverse_lazy('patient_list')
-    roles_allowed = ['ADMIN', 'RECEPTION']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -136,13 +134,12 @@ class PatientUpdateView(RoleRequiredMixin, UpdateView):
     model = Patient
     form_class = PatientForm
     template_name = 'patients/formulaire.html'
-    roles_allowed = ['ADMIN', 'RECEPTION']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['titre'] = 'Modifier les informations du patient'
         context['action'] = 'Enregistrer'
-        context['patient'] = self.get_object()
+        context['patient'] = self.object
         return context
     
     def get_success_url(self):
@@ -155,7 +152,7 @@ class PatientUpdateView(RoleRequiredMixin, UpdateView):
 
 
 @login_required
-@role_required(['ADMIN', 'MEDECIN', 'INFIRMIER', 'RECEPTION'])
+@role_required()
 def patient_search_view(request):
     """Vue pour rechercher des patients"""
     if request.method == 'GET':
@@ -163,15 +160,10 @@ def patient_search_view(request):
         query = request.GET.get('query', '')
         
         if query:
-            # Recherche de patients correspondant au critère
-            patients = Patient.objects.filter(
-                Q(nom__icontains=query) | 
-                Q(prenom__icontains=query) | 
-                Q(id_patient__icontains=query) |
-                Q(telephone__icontains=query)
-            ).order_by('nom', 'prenom')
+            # Recherche de patients correspondant au critère (voir services/recherche.py)
+            patients, resultats_tronques = rechercher_patients_tronque(query)
         else:
-            patients = Patient.objects.none()
+            patients, resultats_tronques = Patient.objects.none(), False
             
         # Si c'est une requête AJAX, renvoyer JSON
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -193,8 +185,11 @@ def patient_search_view(request):
             'form': form,
             'patients': patients,
             'query': query,
-            'total_results': patients.count()
+            'total_results': patients.count(),
+            'resultats_tronques': resultats_tronques,
         }
+        if resultats_tronques:
+            messages.info(request, MESSAGE_TRONQUE)
         return render(request, 'patients/recherche.html', context)
     
     # Si méthode POST ou autre, rediriger vers formulaire vide
@@ -202,7 +197,29 @@ def patient_search_view(request):
 
 
 @login_required
-@role_required(['ADMIN', 'RECEPTION'])
+@role_required()
+def patient_typeahead(request):
+    """
+    Suggestions de patients pour la saisie semi-automatique.
+    Réponse JSON compacte : {"url": modèle d'URL de la fiche, "r": [[id, nom, prénom, identifiant, naissance], ...]}
+    """
+    query = request.GET.get('q', '')
+    gen = generation()
+    etag = etag_suggestions(query, gen)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({
+            'url': reverse('patient_detail', kwargs={'pk': 0}),
+            'r': suggestions(query, gen),
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@role_required()
 def patient_create(request):
     """Vue fonctionnelle alternative pour créer un patient"""
     if request.method == 'POST':
@@ -0,0 +1,191 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse_lazy
+from django.views.generic import CreateView, ListView, TemplateView
+from django.http import JsonResponse
+from django.utils import timezone
+
+from datetime import datetime, timedelta
+import json
+from ..models import Medicament, MouvementStock, Patient, Prescription, StockMedicament
+from ..services.catalogue import catalogue
+from ..services.historique_stock import consommation, stock_a
+from ..services.reapprovisionnement import suggestions_en_cache
+from ..services.stock import (
+    DispensationImpossible, StockInsuffisant, VenteImpossible, dispenser_prescription, vendre
+)
+from ..forms.forms import MouvementStockForm
+from ..middleware.access_middleware import role_required, RoleRequiredMixin
+
+
+def _manques(erreur):
+    return [
+        {'medicament_id': manque.medicament.pk, 'disponible': manque.disponible, 'demande': manque.demande}
+        for manque in erreur.manques
+    ]
+
+
+@login_required
+@role_required()
+def prescription_dispenser(request, pk):
+    """
+    Vue API pour délivrer en une fois tous les médicaments d'une prescription.
+    Paramètre POST facturer=1 pour créer la facture des médicaments.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': "Méthode non autorisée"}, status=405)
+    
+    prescription = get_object_or_404(Prescription, pk=pk)
+    try:
+        mouvements, facture = dispenser_prescription(
+            prescription, request.personnel, facturer=bool(request.POST.get('facturer'))
+        )
+    except DispensationImpossible as e:
+        return JsonResponse({'success': False, 'message': str(e), 'manques': _manques(e)}, status=409)
+    
+    return JsonResponse({
+        'success': True,
+        'message': f"{len(mouvements)} médicament(s) délivré(s)",
+        'facture': facture.numero_facture if facture else None,
+    })
+
+
+# ========================================
+# Caisse
+# ========================================
+
+class StockView(RoleRequiredMixin, ListView):
+    """
+    Inventaire de la pharmacie : état des stocks et médicaments à commander,
+    classés par jours de stock restants d'après leur consommation récente.
+    Accessible aux pharmaciens et administrateurs.
+    """
+    model = StockMedicament
+    template_name = 'pharmacie/inventaire.html'
+    context_object_name = 'stocks'
+    paginate_by = 20
+    
+    def get_queryset(self):
+        return StockMedicament.objects.avec_relations().order_by('medicament__nom')
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['suggestions'] = suggestions_en_cache(limite=50)
+        return context
+
+
+class MouvementStockCreateView(RoleRequiredMixin, CreateView):
+    """
+    Vue pour enregistrer une entrée ou une sortie de stock.
+    Accessible aux pharmaciens et administrateurs.
+    """
+    model = MouvementStock
+    form_class = MouvementStockForm
+    template_name = 'pharmacie/formulaire.html'
+    success_url = reverse_lazy('stock_list')
+    
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['personnel'] = self.request.personnel
+        return kwargs
+    
+    def form_valid(self, form):
+        try:
+            self.object = form.save()
+        except StockInsuffisant as e:
+            # Stock baissé entre la validation du formulaire et l'UPDATE conditionnel
+            form.add_error('quantite', str(e))
+            return self.form_invalid(form)
+        messages.success(self.request, "Le mouvement de stock a été enregistré.")
+        return redirect(self.get_success_url())
+
+
+class POSView(RoleRequiredMixin, TemplateView):
+    """
+    Caisse de la pharmacie : recherche des produits (pos_recherche) et
+    encaissement du panier (pos_vente).
+    Accessible aux pharmaciens et administrateurs.
+    """
+    template_name = 'pharmacie/pos.html'
+
+
+@login_required
+@role_required()
+def pos_recherche(request):
+    """
+    Vue API de recherche des produits de la caisse par préfixe du nom ou du
+    code (paramètre q), servie depuis le catalogue en mémoire.
+    """
+    return JsonResponse({'produits': catalogue.rechercher(request.GET.get('q', ''))})
+
+
+@login_required
+@role_required()
+def pos_vente(request):
+    """
+    Vue API d'encaissement d'un panier. Corps JSON :
+    {"lignes": [{"medicament": id, "quantite": n}, ...], "patient": id ou null}.
+    Une facture payée est créée lorsque le client est un patient.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': "Méthode non autorisée"}, status=405)
+    
+    try:
+        donnees = json.loads(request.body)
+        panier = [(int(ligne['medicament']), int(ligne['quantite'])) for ligne in donnees['lignes']]
+        patient_id = int(donnees['patient']) if donnees.get('patient') else None
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'success': False, 'message': "Panier invalide"}, status=400)
+    
+    if patient_id and not Patient.objects.filter(pk=patient_id).exists():
+        return JsonResponse({'success': False, 'message': "Patient introuvable"}, status=400)
+    
+    try:
+        mouvements, facture, total = vendre(panier, request.personnel, patient_id)
+    except VenteImpossible as e:
+        return JsonResponse({'success': False, 'message': str(e), 'manques': _manques(e)}, status=409)
+    
+    return JsonResponse({
+        'success': True,
+        'message': f"Vente enregistrée : {len(mouvements)} ligne(s)",
+        'total': str(total),
+        'facture': facture.numero_facture if facture else None,
+    })
+
+
+# ========================================
+# Historique des stocks
+# ========================================
+
+# Période de consommation maximale (jours) de stock_historique
+JOURS_HISTORIQUE_MAX = 3650
+
+@login_required
+@role_required()
+def stock_historique(request):
+    """
+    Vue API du stock d'un médicament à un instant donné et de sa consommation
+    sur les jours précédents. Paramètres : medicament, instant
+    (AAAA-MM-JJTHH:MM, par défaut maintenant) et jours (par défaut 90).
+    """
+    try:
+        medicament = get_object_or_404(Medicament, pk=int(request.GET.get('medicament')))
+        instant = timezone.now()
+        if request.GET.get('instant'):
+            instant = timezone.make_aware(datetime.strptime(request.GET['instant'], '%Y-%m-%dT%H:%M'))
+        jours = int(request.GET.get('jours', 90))
+        if not 1 <= jours <= JOURS_HISTORIQUE_MAX:
+            raise ValueError
+        debut = instant - timedelta(days=jours)
+    except (TypeError, ValueError, OverflowError):
+        return JsonResponse({'success': False, 'message': "Paramètres invalides"}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'medicament': medicament.pk,
+        'instant': timezone.localtime(instant).isoformat(),
+        'stock': stock_a(medicament.pk, instant),
+        'consommation': consommation(debut, instant, [medicament.pk]).get(medicament.pk, 0),
+        'jours': jours,
+    })
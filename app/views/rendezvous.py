@@ -1,16 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, View
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, FormView, View
 from django.urls import reverse_lazy, reverse
 from django.utils import timezone
 from django.db.models import Q
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, HttpResponseNotModified, StreamingHttpResponse
 
 from datetime import datetime, timedelta
+import asyncio
 import calendar
-from ..models import RendezVous, Patient, Personnel
-from ..forms import RendezVousForm
+import json
+from ..models import RendezVous, Patient, Personnel, FileAttente
+from ..services.periodes import bornes_jour, bornes_mois, dans_periode
+from ..services.calendrier import etag_mois, flux_mois, rdv_du_mois
+from ..services.disponibilite import fin_rdv, premier_conflit
+from ..services.transitions import changer_statuts
+from ..services.evenements import broker, concerne, evenement_rdv
+from ..services.file_attente import (
+    STATUTS_PRESENTS, FileIndisponible, appeler_suivant, changer_priorite, enregistrer_arrivee, etat_file,
+    rendez_vous_en_file, retirer, terminer_consultation
+)
+from ..services.reservation import CreneauIndisponible, creer_serie, enregistrer_rendezvous
+from ..services.agenda import HORS_HORAIRES, LIBRE, etat_creneau, creneaux_libres as calculer_creneaux_libres
+from ..forms import RendezVousForm, SerieRendezVousForm
 from ..middleware.access_middleware import role_required, RoleRequiredMixin
 
 
@@ -20,7 +35,6 @@ class CalendrierRendezVousView(RoleRequiredMixin, View):
     Accessible aux médecins, infirmiers, réceptionnistes et administrateurs.
     """
     template_name = 'rendezvous/calendrier.html'
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER', 'RECEPTION']
     
     def get(self, request):
         # Récupérer le mois/année à afficher
@@ -30,20 +44,12 @@ class CalendrierRendezVousView(RoleRequiredMixin, View):
         # Récupérer le filtre médecin si présent
         medecin_id = request.GET.get('medecin')
         
-        # Calculer les dates de début et fin du mois
+        # Calculer le calendrier du mois
         cal = calendar.monthcalendar(year, month)
-        first_day = datetime(year, month, 1)
-        
-        # Trouver le dernier jour du mois
-        if month == 12:
-            last_day = datetime(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            last_day = datetime(year, month + 1, 1) - timedelta(days=1)
         
         # Récupérer tous les rendez-vous du mois
-        rdvs = RendezVous.objects.filter(
-            date_heure__gte=first_day,
-            date_heure__lt=datetime(last_day.year, last_day.month, last_day.day) + timedelta(days=1)
+        rdvs = RendezVous.objects.avec_relations().filter(
+            dans_periode('date_heure', bornes_mois(datetime(year, month, 1).date()))
         )
         
         # Filtrer par médecin si demandé
@@ -51,22 +57,19 @@ class CalendrierRendezVousView(RoleRequiredMixin, View):
             rdvs = rdvs.filter(medecin_id=medecin_id)
         
         # Si l'utilisateur est un médecin, montrer seulement ses rendez-vous
-        try:
-            if request.user.personnel.role == 'MEDECIN':
-                rdvs = rdvs.filter(medecin=request.user.personnel)
-        except:
-            pass
+        if request.role == 'MEDECIN':
+            rdvs = rdvs.filter(medecin=request.personnel)
         
         # Organiser les rendez-vous par date
         rdvs_by_date = {}
         for rdv in rdvs:
-            date_key = rdv.date_heure.strftime('%Y-%m-%d')
+            date_key = timezone.localtime(rdv.date_heure).strftime('%Y-%m-%d')
             if date_key not in rdvs_by_date:
                 rdvs_by_date[date_key] = []
             rdvs_by_date[date_key].append(rdv)
         
         # Liste des médecins pour le filtre
-        medecins = Personnel.objects.filter(role='MEDECIN').order_by('user__last_name')
+        medecins = Personnel.objects.avec_relations().filter(role='MEDECIN').order_by('user__last_name')
         
         # Préparer le contexte
         context = {
@@ -95,17 +98,16 @@ class RendezVousListView(RoleRequiredMixin, ListView):
     template_name = 'rendezvous/liste.html'
     context_object_name = 'rendez_vous'
     paginate_by = 15
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER', 'RECEPTION']
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().avec_relations()
         
         # Filtrer par date si spécifiée
         date_filtre = self.request.GET.get('date')
         if date_filtre:
             try:
                 date_obj = datetime.strptime(date_filtre, '%Y-%m-%d').date()
-                queryset = queryset.filter(date_heure__date=date_obj)
+                queryset = queryset.filter(dans_periode('date_heure', bornes_jour(date_obj)))
             except ValueError:
                 pass
         
@@ -125,11 +127,8 @@ class RendezVousListView(RoleRequiredMixin, ListView):
             queryset = queryset.filter(patient_id=patient_id)
         
         # Si l'utilisateur est un médecin, montrer seulement ses rendez-vous
-        try:
-            if self.request.user.personnel.role == 'MEDECIN':
-                queryset = queryset.filter(medecin=self.request.user.personnel)
-        except:
-            pass
+        if self.request.role == 'MEDECIN':
+            queryset = queryset.filter(medecin=self.request.personnel)
         
         # Filtrer par recherche si spécifiée
         query = self.request.GET.get('q')
@@ -155,16 +154,12 @@ class RendezVousListView(RoleRequiredMixin, ListView):
         
         # Listes pour les filtres dropdown
         context['statuts'] = RendezVous.STATUS_CHOICES
-        context['medecins'] = Personnel.objects.filter(role='MEDECIN').order_by('user__last_name')
+        context['medecins'] = Personnel.objects.avec_relations().filter(role='MEDECIN').order_by('user__last_name')
         
         # Vérifier le rôle de l'utilisateur pour les permissions
-        try:
-            role = self.request.user.personnel.role
-            context['can_create'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
-            context['can_edit'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
-        except:
-            context['can_create'] = self.request.user.is_superuser
-            context['can_edit'] = self.request.user.is_superuser
+        role = self.request.role
+        context['can_create'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
+        context['can_edit'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
         
         return context
 
@@ -177,7 +172,6 @@ class RendezVousCreateView(RoleRequiredMixin, CreateView):
     model = RendezVous
     form_class = RendezVousForm
     template_name = 'rendezvous/formulaire.html'
-    roles_allowed = ['ADMIN', 'RECEPTION', 'MEDECIN']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -194,11 +188,8 @@ class RendezVousCreateView(RoleRequiredMixin, CreateView):
                 pass
         
         # Préselectionner le médecin si l'utilisateur est un médecin
-        try:
-            if self.request.user.personnel.role == 'MEDECIN':
-                context['medecin_preselectionne'] = self.request.user.personnel
-        except:
-            pass
+        if self.request.role == 'MEDECIN':
+            context['medecin_preselectionne'] = self.request.personnel
         
         return context
     
@@ -211,18 +202,19 @@ class RendezVousCreateView(RoleRequiredMixin, CreateView):
             initial['patient'] = patient_id
         
         # Préselectionner le médecin si l'utilisateur est un médecin
-        try:
-            if self.request.user.personnel.role == 'MEDECIN':
-                initial['medecin'] = self.request.user.personnel.id
-        except:
-            pass
+        if self.request.role == 'MEDECIN':
+            initial['medecin'] = self.request.personnel.id
         
         return initial
     
     def form_valid(self, form):
-        response = super().form_valid(form)
+        try:
+            self.object = enregistrer_rendezvous(form)
+        except CreneauIndisponible as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
         messages.success(self.request, "Le rendez-vous a été créé avec succès.")
-        return response
+        return redirect(self.get_success_url())
     
     def get_success_url(self):
         # Rediriger vers la vue détaillée du rendez-vous ou la liste
@@ -234,6 +226,45 @@ class RendezVousCreateView(RoleRequiredMixin, CreateView):
             return reverse('rendezvous_list')
 
 
+class RendezVousSerieCreateView(RoleRequiredMixin, FormView):
+    """
+    Vue pour créer une série de rendez-vous récurrents (suivis chroniques).
+    Toutes les occurrences sont vérifiées puis créées en une seule fois.
+    """
+    form_class = SerieRendezVousForm
+    template_name = 'rendezvous/formulaire.html'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['titre'] = 'Nouvelle série de rendez-vous'
+        context['action'] = 'Créer la série'
+        context['is_serie'] = True
+        return context
+    
+    def get_initial(self):
+        initial = super().get_initial()
+        
+        # Préselectionner le patient si spécifié dans l'URL
+        patient_id = self.request.GET.get('patient')
+        if patient_id:
+            initial['patient'] = patient_id
+        
+        # Préselectionner le médecin si l'utilisateur est un médecin
+        if self.request.role == 'MEDECIN':
+            initial['medecin'] = self.request.personnel.id
+        
+        return initial
+    
+    def form_valid(self, form):
+        try:
+            rendez_vous = creer_serie(form.save(commit=False), form.debuts)
+        except CreneauIndisponible as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
+        messages.success(self.request, f"La série de {len(rendez_vous)} rendez-vous a été créée avec succès.")
+        return redirect('rendezvous_list')
+
+
 class RendezVousUpdateView(RoleRequiredMixin, UpdateView):
     """
     Vue pour modifier un rendez-vous existant.
@@ -242,7 +273,6 @@ class RendezVousUpdateView(RoleRequiredMixin, UpdateView):
     model = RendezVous
     form_class = RendezVousForm
     template_name = 'rendezvous/formulaire.html'
-    roles_allowed = ['ADMIN', 'RECEPTION', 'MEDECIN']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -252,9 +282,13 @@ class RendezVousUpdateView(RoleRequiredMixin, UpdateView):
         return context
     
     def form_valid(self, form):
-        response = super().form_valid(form)
+        try:
+            self.object = enregistrer_rendezvous(form)
+        except CreneauIndisponible as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
         messages.success(self.request, "Le rendez-vous a été mis à jour avec succès.")
-        return response
+        return redirect(self.get_success_url())
     
     def get_success_url(self):
         # Rediriger vers la liste des rendez-vous ou le calendrier
@@ -273,7 +307,6 @@ class RendezVousDuJourView(RoleRequiredMixin, ListView):
     model = RendezVous
     template_name = 'rendezvous/jour.html'
     context_object_name = 'rendez_vous'
-    roles_allowed = ['ADMIN', 'MEDECIN', 'INFIRMIER', 'RECEPTION']
     
     def get_queryset(self):
         # Date par défaut : aujourd'hui
@@ -282,21 +315,18 @@ class RendezVousDuJourView(RoleRequiredMixin, ListView):
             try:
                 date_obj = datetime.strptime(date, '%Y-%m-%d').date()
             except ValueError:
-                date_obj = timezone.now().date()
+                date_obj = timezone.localdate()
         else:
-            date_obj = timezone.now().date()
+            date_obj = timezone.localdate()
         
         # Filtrer les rendez-vous pour cette date
-        queryset = RendezVous.objects.filter(
-            date_heure__date=date_obj
+        queryset = RendezVous.objects.avec_relations().filter(
+            dans_periode('date_heure', bornes_jour(date_obj))
         )
         
         # Si l'utilisateur est un médecin, montrer seulement ses rendez-vous
-        try:
-            if self.request.user.personnel.role == 'MEDECIN':
-                queryset = queryset.filter(medecin=self.request.user.personnel)
-        except:
-            pass
+        if self.request.role == 'MEDECIN':
+            queryset = queryset.filter(medecin=self.request.personnel)
         
         # Trier par heure
         return queryset.order_by('date_heure')
@@ -310,9 +340,9 @@ class RendezVousDuJourView(RoleRequiredMixin, ListView):
             try:
                 context['date_affichee'] = datetime.strptime(date, '%Y-%m-%d').date()
             except ValueError:
-                context['date_affichee'] = timezone.now().date()
+                context['date_affichee'] = timezone.localdate()
         else:
-            context['date_affichee'] = timezone.now().date()
+            context['date_affichee'] = timezone.localdate()
         
         # Calculer dates précédente et suivante pour la navigation
         date_affichee = context['date_affichee']
@@ -320,7 +350,10 @@ class RendezVousDuJourView(RoleRequiredMixin, ListView):
         context['date_suivante'] = date_affichee + timedelta(days=1)
         
         # Vérifier si c'est aujourd'hui
-        context['is_today'] = (date_affichee == timezone.now().date())
+        context['is_today'] = (date_affichee == timezone.localdate())
+        
+        # Intervalle d'interrogation de la page lorsque le flux direct n'est pas servi
+        context['intervalle_actualisation'] = getattr(settings, 'RDV_INTERVALLE_ACTUALISATION', 30)
         
         # Regrouper les rendez-vous par heure
         rdv_par_heure = {}
@@ -332,20 +365,29 @@ class RendezVousDuJourView(RoleRequiredMixin, ListView):
         
         context['rdv_par_heure'] = rdv_par_heure
         
+        # File d'attente du jour : patients arrivés (avec ou sans rendez-vous)
+        if context['is_today']:
+            context['rdv_arrives'] = rendez_vous_en_file([rdv.pk for rdv in self.object_list])
+            if self.request.role == 'MEDECIN':
+                medecins = [self.request.personnel.pk]
+            else:
+                medecins = sorted({rdv.medecin_id for rdv in self.object_list} | set(
+                    FileAttente.objects.filter(
+                        statut__in=STATUTS_PRESENTS, heure_arrivee__gte=bornes_jour(date_affichee)[0]
+                    ).values_list('medecin_id', flat=True)
+                ))
+            context['files_attente'] = [etat_file(medecin_id) for medecin_id in medecins]
+        
         # Vérifier le rôle de l'utilisateur pour les permissions
-        try:
-            role = self.request.user.personnel.role
-            context['can_create'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
-            context['can_edit'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
-        except:
-            context['can_create'] = self.request.user.is_superuser
-            context['can_edit'] = self.request.user.is_superuser
+        role = self.request.role
+        context['can_create'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
+        context['can_edit'] = role in ['ADMIN', 'RECEPTION', 'MEDECIN']
         
         return context
 
 
 @login_required
-@role_required(['ADMIN', 'RECEPTION', 'MEDECIN'])
+@role_required()
 def rendez_vous_create(request, patient_id=None):
     """
     Vue fonctionnelle pour créer un rendez-vous.
@@ -354,14 +396,18 @@ def rendez_vous_create(request, patient_id=None):
     if request.method == 'POST':
         form = RendezVousForm(request.POST)
         if form.is_valid():
-            rendez_vous = form.save()
-            messages.success(request, "Le rendez-vous a été créé avec succès.")
-            
-            # Redirection selon le bouton cliqué
-            if 'stay' in request.POST:
-                return redirect('rendezvous_create')
+            try:
+                rendez_vous = enregistrer_rendezvous(form)
+            except CreneauIndisponible as e:
+                form.add_error(None, str(e))
             else:
-                return redirect('rendezvous_list')
+                messages.success(request, "Le rendez-vous a été créé avec succès.")
+                
+                # Redirection selon le bouton cliqué
+                if 'stay' in request.POST:
+                    return redirect('rendezvous_create')
+                else:
+                    return redirect('rendezvous_list')
     else:
         initial = {}
         
@@ -374,11 +420,8 @@ def rendez_vous_create(request, patient_id=None):
                 pass
         
         # Préselectionner le médecin si l'utilisateur est un médecin
-        try:
-            if request.user.personnel.role == 'MEDECIN':
-                initial['medecin'] = request.user.personnel
-        except:
-            pass
+        if request.role == 'MEDECIN':
+            initial['medecin'] = request.personnel
         
         form = RendezVousForm(initial=initial)
     
@@ -393,37 +436,32 @@ def rendez_vous_create(request, patient_id=None):
 
 
 @login_required
-@role_required(['ADMIN', 'RECEPTION', 'MEDECIN'])
+@role_required()
 def rendez_vous_update_status(request, pk):
     """
     Vue fonctionnelle pour mettre à jour le statut d'un rendez-vous.
     Utilisé pour les actions rapides (marquer comme terminé, annulé, etc.)
     """
     if request.method == 'POST':
-        rendez_vous = get_object_or_404(RendezVous, pk=pk)
+        get_object_or_404(RendezVous, pk=pk)
         nouveau_statut = request.POST.get('statut')
         
-        if nouveau_statut in dict(RendezVous.STATUS_CHOICES).keys():
-            rendez_vous.statut = nouveau_statut
-            rendez_vous.save()
-            
-            # Si c'est une requête AJAX, renvoyer un JSON
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                return JsonResponse({
-                    'success': True,
-                    'message': f"Statut mis à jour : {rendez_vous.get_statut_display()}"
-                })
-            
-            messages.success(request, f"Le statut du rendez-vous a été mis à jour : {rendez_vous.get_statut_display()}")
+        # Même machine à états que les changements groupés
+        try:
+            resultat = changer_statuts([pk], nouveau_statut)[pk]
+            code = 200 if resultat['success'] else 409
+        except ValueError:
+            resultat = {'success': False, 'message': "Statut invalide"}
+            code = 400
+        
+        # Si c'est une requête AJAX, renvoyer un JSON
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({'success': resultat['success'], 'message': resultat['message']}, status=code)
+        
+        if resultat['success']:
+            messages.success(request, f"Le statut du rendez-vous a été mis à jour : {resultat['libelle']}")
         else:
-            # Si c'est une requête AJAX, renvoyer un JSON d'erreur
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                return JsonResponse({
-                    'success': False,
-                    'message': "Statut invalide"
-                }, status=400)
-            
-            messages.error(request, "Statut invalide")
+            messages.error(request, resultat['message'])
     
     # Rediriger selon le paramètre return_to
     return_to = request.GET.get('return_to', 'list')
@@ -436,7 +474,206 @@ def rendez_vous_update_status(request, pk):
 
 
 @login_required
-@role_required(['ADMIN', 'MEDECIN', 'INFIRMIER', 'RECEPTION'])
+@role_required()
+def rendez_vous_statut_groupe(request):
+    """
+    Vue API pour changer le statut de plusieurs rendez-vous en une fois
+    (clôture de la journée). Paramètres POST : ids (répété) et statut.
+    Retourne le résultat de chaque rendez-vous : {"resultats": {id: {...}}}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': "Méthode non autorisée"}, status=405)
+    
+    try:
+        ids = [int(pk) for pk in request.POST.getlist('ids')]
+        resultats = changer_statuts(ids, request.POST.get('statut'))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': "Paramètres invalides"}, status=400)
+    
+    modifies = sum(1 for resultat in resultats.values() if resultat['success'])
+    return JsonResponse({
+        'success': modifies > 0,
+        'message': f"{modifies} rendez-vous sur {len(resultats)} mis à jour",
+        'resultats': resultats,
+    })
+
+
+# Intervalle (secondes) des commentaires envoyés pour garder le flux ouvert
+INTERVALLE_MAINTIEN_FLUX = 20
+
+# Durée (secondes) après laquelle le serveur ferme le flux ; le navigateur
+# se reconnecte alors de lui-même
+DUREE_MAX_FLUX = getattr(settings, 'RDV_FLUX_DUREE_MAX', 300)
+
+
+def flux_disponible(request):
+    """
+    Le flux direct n'est servi que sous ASGI et si RDV_FLUX_DIRECT est actif :
+    sous WSGI, chaque flux ouvert occuperait un thread du serveur.
+    """
+    return getattr(settings, 'RDV_FLUX_DIRECT', False) and isinstance(request, ASGIRequest)
+
+
+@login_required
+@role_required()
+async def rendez_vous_flux(request):
+    """
+    Flux server-sent events des rendez-vous créés, modifiés, supprimés ou
+    changés de statut, pour mettre à jour en direct les rendez-vous du jour.
+    Paramètres : medecin et jour (AAAA-MM-JJ) pour filtrer les événements.
+    Un médecin ne reçoit que les événements de ses propres rendez-vous.
+    
+    Répond 204 lorsque le flux n'est pas disponible : le navigateur ne se
+    reconnecte pas et la page interroge rendez_vous_jour_donnees à la place.
+    """
+    if not flux_disponible(request):
+        return HttpResponse(status=204)
+    
+    medecin_id = request.GET.get('medecin')
+    if request.role == 'MEDECIN':
+        medecin_id = request.personnel.pk
+    jour = request.GET.get('jour')
+    
+    async def evenements():
+        boucle = asyncio.get_running_loop()
+        fin = boucle.time() + DUREE_MAX_FLUX
+        abonnement = broker().abonner()
+        try:
+            yield "retry: 5000\n\n"
+            while (restant := fin - boucle.time()) > 0:
+                try:
+                    evenement = await asyncio.wait_for(
+                        abonnement.recevoir(), min(INTERVALLE_MAINTIEN_FLUX, restant)
+                    )
+                except asyncio.TimeoutError:
+                    yield ": maintien\n\n"
+                    continue
+                if concerne(evenement, medecin_id, jour):
+                    yield f"event: {evenement['type']}\ndata: {json.dumps(evenement)}\n\n"
+        finally:
+            abonnement.fermer()
+    
+    response = StreamingHttpResponse(evenements(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Désactiver la mise en tampon des proxys (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@role_required()
+def rendez_vous_jour_donnees(request):
+    """
+    Rendez-vous d'un jour au format des événements du flux direct, pour les
+    pages servies sans flux (WSGI) qui les interrogent périodiquement.
+    Paramètres : jour (AAAA-MM-JJ), medecin. Répond 304 si rien n'a changé.
+    """
+    try:
+        jour = datetime.strptime(request.GET['jour'], '%Y-%m-%d').date() if request.GET.get('jour') else timezone.localdate()
+        medecin_id = int(request.GET['medecin']) if request.GET.get('medecin') else None
+    except ValueError:
+        return JsonResponse({'message': "Paramètres invalides"}, status=400)
+    
+    # Si l'utilisateur est un médecin, montrer seulement ses rendez-vous
+    if request.role == 'MEDECIN':
+        medecin_id = request.personnel.pk
+    rdvs = RendezVous.objects.filter(dans_periode('date_heure', bornes_jour(jour)))
+    if medecin_id:
+        rdvs = rdvs.filter(medecin_id=medecin_id)
+    
+    etag = etag_mois(rdvs)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({
+            'jour': jour.isoformat(),
+            'rdv': [evenement_rdv('modifie', rdv) for rdv in rdvs.select_related('patient').order_by('date_heure')],
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Années acceptées par le flux du calendrier
+ANNEE_MIN = 1900
+ANNEE_MAX = 2100
+
+
+@login_required
+@role_required()
+def calendrier_donnees(request):
+    """
+    Flux JSON d'un mois du calendrier : nombre de rendez-vous par jour et
+    rendez-vous compacts [id, début, durée, statut, initiales, médecin].
+    Paramètres : year, month, medecin. Répond 304 si le mois n'a pas changé.
+    """
+    try:
+        year = int(request.GET.get('year', timezone.localdate().year))
+        month = int(request.GET.get('month', timezone.localdate().month))
+        medecin_id = int(request.GET['medecin']) if request.GET.get('medecin') else None
+        if not (ANNEE_MIN <= year <= ANNEE_MAX and 1 <= month <= 12):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'message': "Paramètres invalides"}, status=400)
+    
+    # Si l'utilisateur est un médecin, montrer seulement ses rendez-vous
+    if request.role == 'MEDECIN':
+        medecin_id = request.personnel.pk
+    rdvs = rdv_du_mois(year, month, medecin_id)
+    
+    etag = etag_mois(rdvs)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({'year': year, 'month': month, **flux_mois(rdvs)})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@role_required()
+def creneaux_libres(request):
+    """
+    Vue API retournant en un seul appel les créneaux libres d'un médecin (ou de
+    tous les médecins si aucun n'est indiqué) sur une période, pour une durée.
+    Paramètres : medecin, debut et fin (AAAA-MM-JJ), duree (minutes).
+    """
+    try:
+        premier_jour = datetime.strptime(request.GET['debut'], '%Y-%m-%d').date() if request.GET.get('debut') else timezone.localdate()
+        dernier_jour = datetime.strptime(request.GET['fin'], '%Y-%m-%d').date() if request.GET.get('fin') else premier_jour
+        duree = int(request.GET.get('duree', 30))
+        medecin_id = int(request.GET['medecin']) if request.GET.get('medecin') else None
+    except ValueError:
+        return JsonResponse({'message': "Paramètres invalides"}, status=400)
+    
+    if not (5 <= duree <= 480) or dernier_jour < premier_jour or (dernier_jour - premier_jour).days > 31:
+        return JsonResponse({'message': "Période ou durée invalide"}, status=400)
+    
+    medecins = Personnel.objects.avec_relations().filter(role='MEDECIN').order_by('user__last_name')
+    if medecin_id:
+        medecins = medecins.filter(pk=medecin_id)
+    medecins = list(medecins)
+    
+    creneaux = calculer_creneaux_libres([medecin.pk for medecin in medecins], premier_jour, dernier_jour, duree)
+    return JsonResponse({
+        'duree': duree,
+        'medecins': [
+            {
+                'id': medecin.pk,
+                'nom': str(medecin),
+                'creneaux': {
+                    jour.isoformat(): [f"{debut.hour:02d}:{debut.minute:02d}" for debut in debuts]
+                    for jour, debuts in creneaux[medecin.pk].items()
+                },
+            }
+            for medecin in medecins
+        ],
+    })
+
+
+@login_required
+@role_required()
 def check_disponibilite(request):
     """
     Vue API pour vérifier la disponibilité d'un médecin à une date/heure donnée.
@@ -446,7 +683,6 @@ def check_disponibilite(request):
         medecin_id = request.GET.get('medecin')
         date_str = request.GET.get('date')
         heure_str = request.GET.get('heure')
-        duree = int(request.GET.get('duree', 30))
         rdv_id = request.GET.get('rdv_id')  # Pour exclure le RDV en cours d'édition
         
         if not (medecin_id and date_str and heure_str):
@@ -456,9 +692,12 @@ def check_disponibilite(request):
             }, status=400)
         
         try:
+            duree = int(request.GET.get('duree', 30))
+            if not 5 <= duree <= 480:
+                raise ValueError
+            
             # Construire la date et l'heure
-            date_heure = datetime.strptime(f"{date_str} {heure_str}", '%Y-%m-%d %H:%M')
-            fin_rdv = date_heure + timedelta(minutes=duree)
+            date_heure = timezone.make_aware(datetime.strptime(f"{date_str} {heure_str}", '%Y-%m-%d %H:%M'))
             
             # Vérifier si la date est dans le passé
             if date_heure < timezone.now():
@@ -467,24 +706,22 @@ def check_disponibilite(request):
                     'message': "La date est dans le passé"
                 })
             
-            # Vérifier les conflits avec d'autres rendez-vous
-            conflits = RendezVous.objects.filter(
-                medecin_id=medecin_id,
-                date_heure__lt=fin_rdv,
-                statut__in=['PLANIFIE', 'CONFIRME']
-            )
-            
-            # Exclure le RDV en cours d'édition
-            if rdv_id:
-                conflits = conflits.exclude(pk=rdv_id)
+            # Horaires et occupation lus dans la grille précalculée du médecin
+            etat = etat_creneau(int(medecin_id), date_heure, fin_rdv(date_heure, duree))
+            if etat == HORS_HORAIRES:
+                return JsonResponse({
+                    'disponible': False,
+                    'message': "Le médecin ne consulte pas à cette heure"
+                })
             
-            for rdv in conflits:
-                fin_existant = rdv.date_heure + timedelta(minutes=rdv.duree)
-                if fin_existant > date_heure:
-                    return JsonResponse({
-                        'disponible': False,
-                        'message': f"Le médecin a déjà un rendez-vous à cette heure avec {rdv.patient.nom} {rdv.patient.prenom}"
-                    })
+            # La base n'est interrogée que pour nommer le patient en conflit, ou
+            # pour écarter le RDV en cours d'édition, que la grille compte comme occupé
+            rdv = premier_conflit(medecin_id, date_heure, duree, exclure=rdv_id) if etat != LIBRE else None
+            if rdv is not None:
+                return JsonResponse({
+                    'disponible': False,
+                    'message': f"Le médecin a déjà un rendez-vous à cette heure avec {rdv.patient.nom} {rdv.patient.prenom}"
+                })
             
             # Si on arrive ici, c'est que la plage est disponible
             return JsonResponse({
@@ -495,7 +732,7 @@ def check_disponibilite(request):
         except ValueError:
             return JsonResponse({
                 'disponible': False,
-                'message': "Format de date ou heure invalide"
+                'message': "Format de date, d'heure ou de durée invalide"
             }, status=400)
         except Exception as e:
             return JsonResponse({
@@ -506,4 +743,123 @@ def check_disponibilite(request):
     return JsonResponse({
         'disponible': False,
         'message': "Méthode non autorisée"
-    }, status=405)
\ No newline at end of file
+    }, status=405)
+
+# ========================================
+# File d'attente
+# ========================================
+
+def _medecin_file(request):
+    """
+    Médecin dont la file est demandée ; un médecin ne gère que la sienne.
+    Lève ValueError si le paramètre medecin ne désigne pas un médecin.
+    """
+    if request.role == 'MEDECIN':
+        return request.personnel.pk
+    medecin_id = int(request.POST.get('medecin') or request.GET.get('medecin'))
+    if not Personnel.objects.filter(pk=medecin_id, role='MEDECIN').exists():
+        raise ValueError(f"Médecin inconnu : {medecin_id}")
+    return medecin_id
+
+
+def _reponse_file(medecin_id, message, **donnees):
+    return JsonResponse({'success': True, 'message': message, 'file': etat_file(medecin_id), **donnees})
+
+
+@login_required
+@role_required()
+def file_attente_etat(request):
+    """
+    Vue API de l'état de la file d'attente d'un médecin (paramètre medecin) :
+    consultation en cours, patients en attente avec leur attente estimée.
+    """
+    try:
+        medecin_id = _medecin_file(request)
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': "Médecin invalide"}, status=400)
+    return JsonResponse({'success': True, 'file': etat_file(medecin_id)})
+
+
+@login_required
+@role_required()
+def file_attente_arrivee(request):
+    """
+    Vue API pour enregistrer l'arrivée d'un patient. Paramètres POST :
+    rendez_vous (patient arrivé à son rendez-vous) ou patient et medecin
+    (patient sans rendez-vous), et priorite (1 urgent à 3 normal).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': "Méthode non autorisée"}, status=405)
+    
+    try:
+        priorite = int(request.POST.get('priorite', 3))
+        rendez_vous = None
+        if request.POST.get('rendez_vous'):
+            rendez_vous = get_object_or_404(RendezVous, pk=int(request.POST['rendez_vous']))
+            passage = enregistrer_arrivee(priorite=priorite, rendez_vous=rendez_vous)
+        else:
+            patient = get_object_or_404(Patient, pk=int(request.POST.get('patient')))
+            passage = enregistrer_arrivee(patient.pk, _medecin_file(request), priorite)
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': "Paramètres invalides"}, status=400)
+    except FileIndisponible as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    
+    return _reponse_file(passage.medecin_id, "Arrivée enregistrée", passage=passage.pk)
+
+
+@login_required
+@role_required()
+def file_attente_appel(request):
+    """
+    Vue API pour appeler le patient suivant d'un médecin. La consultation en
+    cours est close ; avec terminer=1, aucun patient n'est appelé.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': "Méthode non autorisée"}, status=405)
+    
+    try:
+        medecin_id = _medecin_file(request)
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': "Médecin invalide"}, status=400)
+    
+    if request.POST.get('terminer'):
+        terminer_consultation(medecin_id)
+        return _reponse_file(medecin_id, "Consultation terminée")
+    try:
+        passage = appeler_suivant(medecin_id)
+    except FileIndisponible as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    if passage is None:
+        return _reponse_file(medecin_id, "Aucun patient en attente", appele=None)
+    return _reponse_file(
+        medecin_id, f"Patient appelé : {passage.patient.nom} {passage.patient.prenom}", appele=passage.pk
+    )
+
+
+@login_required
+@role_required()
+def file_attente_triage(request, pk):
+    """
+    Vue API pour modifier la priorité d'un patient en attente (paramètre
+    POST priorite) ou le retirer de la file (depart=1).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': "Méthode non autorisée"}, status=405)
+    
+    passage = get_object_or_404(FileAttente, pk=pk)
+    if request.role == 'MEDECIN' and passage.medecin_id != request.personnel.pk:
+        return JsonResponse({'success': False, 'message': "Ce patient n'attend pas pour vous"}, status=403)
+    try:
+        if request.POST.get('depart'):
+            retirer(pk)
+            message = "Patient retiré de la file"
+        else:
+            changer_priorite(pk, int(request.POST.get('priorite')))
+            message = "Priorité mise à jour"
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': "Priorité invalide"}, status=400)
+    except FileIndisponible as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    
+    return _reponse_file(passage.medecin_id, message)
@@ -74,13 +74,116 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite : les transactions prennent le verrou d'écriture dès leur début
+# (IMMEDIATE), une écriture concurrente attend alors au plus `timeout`
+# secondes au lieu d'échouer aussitôt. La base de test est un fichier pour
+# que les tests de concurrence partagent la base entre threads.
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+        "TEST": {
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        },
+    }
+}
+
+
+# Authentification
+# Le profil personnel est chargé avec l'utilisateur (voir app/backends.py).
+# ModelBackend reste déclaré : les sessions ouvertes avant l'ajout de
+# PersonnelBackend y sont rattachées et resteraient sinon invalides.
+
+AUTHENTICATION_BACKENDS = [
+    "app.backends.PersonnelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "kliniklib",
     }
 }
 
+# Le cache en mémoire est propre à chaque processus : les invalidations
+# (grilles de disponibilité, suggestions de patients, catalogue de la caisse)
+# n'atteignent que le processus qui fait la modification. Les durées de vie
+# ci-dessous bornent le retard des autres workers ; avec un cache partagé
+# (django-redis), elles peuvent être allongées.
+
+# Durée de vie (secondes) des statistiques du tableau de bord en cache
+DASHBOARD_CACHE_TIMEOUT = 30
+
+# Durée de vie (secondes) des grilles de disponibilité des médecins en cache
+GRILLE_CACHE_TIMEOUT = 60
+
+# Durée de validité (secondes) des suggestions de patients gardées par processus
+PATIENT_TYPEAHEAD_CACHE_TIMEOUT = 60
+
+# Durée maximale (secondes) entre deux chargements complets du catalogue de
+# la caisse gardé par chaque processus
+CATALOGUE_CACHE_TIMEOUT = 30
+
+# Moteur de recherche des patients (voir app/services/recherche.py)
+PATIENT_SEARCH_BACKEND = "app.services.recherche.RechercheIndexee"
+
+# Nombre maximal de patients retournés par une recherche
+PATIENT_SEARCH_MAX_RESULTS = 200
+
+# Horaires de consultation par défaut des médecins (jours : 0 = lundi)
+RDV_HEURE_OUVERTURE = "08:00"
+RDV_HEURE_FERMETURE = "18:00"
+RDV_JOURS_OUVRES = (0, 1, 2, 3, 4, 5)
+
+# Pas (minutes) entre deux débuts de créneaux proposés
+RDV_PAS_CRENEAUX = 15
+
+# Délai (minutes) après la fin d'un rendez-vous non clôturé avant qu'il ne
+# soit marqué absent par la commande marquer_absences
+RDV_DELAI_ABSENCE = 120
+
+# Broker des événements de rendez-vous diffusés en direct (voir
+# app/services/evenements.py) ; le broker en mémoire suppose un seul worker ASGI
+RDV_EVENTS_BROKER = "app.services.evenements.BrokerMemoire"
+
+# Flux direct (server-sent events) des rendez-vous : à n'activer que sous un
+# serveur ASGI (uvicorn config.asgi:application). Sous WSGI (gunicorn), chaque
+# flux ouvert occuperait un thread ; les pages interrogent alors le serveur
+# toutes les RDV_INTERVALLE_ACTUALISATION secondes. Le serveur ferme chaque
+# flux après RDV_FLUX_DUREE_MAX secondes et le navigateur se reconnecte.
+RDV_FLUX_DIRECT = False
+RDV_FLUX_DUREE_MAX = 300
+RDV_INTERVALLE_ACTUALISATION = 30
+
+# File d'attente : durée de consultation supposée (minutes) tant qu'aucune n'a
+# été mesurée, et nombre de consultations de la moyenne glissante
+FILE_ATTENTE_DUREE_DEFAUT = 15
+FILE_ATTENTE_FENETRE = 20
+
+# Réapprovisionnement (voir app/services/reapprovisionnement.py) : jours
+# d'historique, estimation de la demande ('lissage' exponentiel de facteur
+# REAPPRO_ALPHA ou 'moyenne' des REAPPRO_FENETRE derniers jours), délai de
+# livraison et couverture visée après livraison (jours)
+REAPPRO_HISTORIQUE = 90
+REAPPRO_METHODE = 'lissage'
+REAPPRO_ALPHA = 0.2
+REAPPRO_FENETRE = 28
+REAPPRO_DELAI = 7
+REAPPRO_COUVERTURE = 30
+
+# Durée de vie (secondes) des suggestions de réapprovisionnement affichées
+# par l'inventaire de la pharmacie
+REAPPRO_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
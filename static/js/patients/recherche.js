@@ -6,11 +6,77 @@ document.addEventListener('DOMContentLoaded', function() {
     const searchResults = document.getElementById('search-results');
     const resultsContainer = document.getElementById('results-container');
     let searchTimeout;
+    // Requête en cours, annulée si l'utilisateur continue de saisir
+    let controleur = null;
+    // Réponses déjà reçues pendant cette visite de la page
+    const reponses = new Map();
+
+    function echapper(texte) {
+        const div = document.createElement('div');
+        div.textContent = texte;
+        return div.innerHTML;
+    }
+
+    function afficherResultats(data) {
+        // Vider les résultats précédents
+        searchResults.innerHTML = '';
+        
+        if (data.r.length === 0) {
+            searchResults.innerHTML = '<div class="alert alert-info">Aucun patient trouvé.</div>';
+            return;
+        }
+
+        // Créer la table de résultats
+        const table = document.createElement('table');
+        table.className = 'table table-hover';
+        
+        // En-tête de la table
+        const thead = document.createElement('thead');
+        thead.innerHTML = `
+            <tr>
+                <th>ID</th>
+                <th>Nom</th>
+                <th>Prénom</th>
+                <th>Date de naissance</th>
+                <th>Actions</th>
+            </tr>
+        `;
+        table.appendChild(thead);
+
+        // Corps de la table avec les résultats [id, nom, prénom, identifiant, naissance]
+        const tbody = document.createElement('tbody');
+        
+        data.r.forEach(([id, nom, prenom, idPatient, dateNaissance]) => {
+            const url = data.url.replace('/0/', `/${id}/`);
+            const tr = document.createElement('tr');
+            tr.innerHTML = `
+                <td>${echapper(idPatient)}</td>
+                <td>${echapper(nom)}</td>
+                <td>${echapper(prenom)}</td>
+                <td>${dateNaissance}</td>
+                <td>
+                    <a href="${url}" class="btn btn-sm btn-primary">
+                        <i class="fas fa-eye"></i> Voir
+                    </a>
+                </td>
+            `;
+            tbody.appendChild(tr);
+        });
+        
+        table.appendChild(tbody);
+        searchResults.appendChild(table);
+    }
 
     // Fonction pour effectuer la recherche AJAX
     function performSearch() {
         const query = searchInput.value.trim();
         
+        // Annuler la requête précédente si elle n'est pas terminée
+        if (controleur) {
+            controleur.abort();
+            controleur = null;
+        }
+        
         // Ne rien faire si la requête est vide ou trop courte
         if (query.length < 2) {
             searchResults.innerHTML = '';
@@ -18,66 +84,36 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
+        resultsContainer.style.display = 'block';
+        
+        // Réponse déjà connue : affichage immédiat
+        const cle = query.toLowerCase();
+        if (reponses.has(cle)) {
+            afficherResultats(reponses.get(cle));
+            return;
+        }
+
         // Afficher un indicateur de chargement
         searchResults.innerHTML = '<div class="text-center"><div class="spinner-border text-primary" role="status"></div></div>';
-        resultsContainer.style.display = 'block';
 
-        // Effectuer la requête AJAX
-        fetch(`/patients/recherche/?query=${encodeURIComponent(query)}`, {
+        // Effectuer la requête AJAX (le navigateur revalide avec l'ETag)
+        controleur = new AbortController();
+        fetch(`/patients/typeahead/?q=${encodeURIComponent(query)}`, {
             headers: {
                 'X-Requested-With': 'XMLHttpRequest'
-            }
+            },
+            signal: controleur.signal
         })
         .then(response => response.json())
         .then(data => {
-            // Vider les résultats précédents
-            searchResults.innerHTML = '';
-            
-            if (data.length === 0) {
-                searchResults.innerHTML = '<div class="alert alert-info">Aucun patient trouvé.</div>';
-                return;
-            }
-
-            // Créer la table de résultats
-            const table = document.createElement('table');
-            table.className = 'table table-hover';
-            
-            // En-tête de la table
-            const thead = document.createElement('thead');
-            thead.innerHTML = `
-                <tr>
-                    <th>ID</th>
-                    <th>Nom</th>
-                    <th>Prénom</th>
-                    <th>Date de naissance</th>
-                    <th>Actions</th>
-                </tr>
-            `;
-            table.appendChild(thead);
-
-            // Corps de la table avec les résultats
-            const tbody = document.createElement('tbody');
-            
-            data.forEach(patient => {
-                const tr = document.createElement('tr');
-                tr.innerHTML = `
-                    <td>${patient.id_patient}</td>
-                    <td>${patient.nom}</td>
-                    <td>${patient.prenom}</td>
-                    <td>${patient.date_naissance}</td>
-                    <td>
-                        <a href="${patient.url}" class="btn btn-sm btn-primary">
-                            <i class="fas fa-eye"></i> Voir
-                        </a>
-                    </td>
-                `;
-                tbody.appendChild(tr);
-            });
-            
-            table.appendChild(tbody);
-            searchResults.appendChild(table);
+            controleur = null;
+            reponses.set(cle, data);
+            afficherResultats(data);
         })
         .catch(error => {
+            if (error.name === 'AbortError') {
+                return;
+            }
             console.error('Erreur lors de la recherche:', error);
             searchResults.innerHTML = '<div class="alert alert-danger">Une erreur est survenue lors de la recherche.</div>';
         });
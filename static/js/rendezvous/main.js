@@ -5,9 +5,22 @@ document.addEventListener('DOMContentLoaded', function() {
     // Vérification de disponibilité lors de la sélection d'une date/heure
     setupDisponibiliteCheck();
     
+    // Liste des créneaux libres du médecin pour la date choisie
+    setupCreneauxLibres();
+    
+    // Calendrier chargé mois par mois depuis le flux JSON
+    setupCalendrier();
+    
     // Mise à jour rapide du statut des rendez-vous
     setupStatusUpdate();
     
+    // Changement de statut de plusieurs rendez-vous sélectionnés
+    setupStatutGroupe();
+    
+    // Mise à jour en direct des rendez-vous du jour
+    setupFluxDirect();
+    setupFileAttente();
+    
     // Initialisation des éléments d'interface
     setupDateTimePickers();
 });
@@ -73,6 +86,73 @@ function setupDisponibiliteCheck() {
     dureeInput.addEventListener('change', checkDisponibilite);
 }
 
+/**
+ * Affiche les créneaux libres du médecin sélectionné pour la date choisie,
+ * en un seul appel, et remplit l'heure au clic sur un créneau
+ */
+function setupCreneauxLibres() {
+    const medecinSelect = document.getElementById('id_medecin');
+    const dateInput = document.getElementById('id_date_heure_0');
+    const heureInput = document.getElementById('id_date_heure_1');
+    const dureeInput = document.getElementById('id_duree');
+    const creneauxInfo = document.getElementById('creneaux-libres');
+    
+    // Si les éléments n'existent pas, on ne fait rien
+    if (!medecinSelect || !dateInput || !heureInput || !dureeInput || !creneauxInfo) {
+        return;
+    }
+    
+    function chargerCreneaux() {
+        const medecinId = medecinSelect.value;
+        const date = dateInput.value;
+        const duree = dureeInput.value || 30;
+        
+        if (!medecinId || !date) {
+            creneauxInfo.innerHTML = '';
+            return;
+        }
+        
+        const url = `/rendezvous/creneaux-libres/?medecin=${medecinId}&debut=${date}&fin=${date}&duree=${duree}`;
+        
+        fetch(url, {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            const medecin = data.medecins && data.medecins[0];
+            const creneaux = medecin ? (medecin.creneaux[date] || []) : [];
+            
+            if (creneaux.length === 0) {
+                creneauxInfo.innerHTML = '<div class="alert alert-warning">Aucun créneau libre ce jour.</div>';
+                return;
+            }
+            
+            creneauxInfo.innerHTML = creneaux.map(heure =>
+                `<button type="button" class="btn btn-sm btn-outline-primary me-1 mb-1 creneau-btn" data-heure="${heure}">${heure}</button>`
+            ).join('');
+        })
+        .catch(error => {
+            console.error('Erreur:', error);
+            creneauxInfo.innerHTML = '<div class="alert alert-warning">Erreur lors du chargement des créneaux</div>';
+        });
+    }
+    
+    // Un clic sur un créneau remplit l'heure du rendez-vous
+    creneauxInfo.addEventListener('click', function(e) {
+        const bouton = e.target.closest('.creneau-btn');
+        if (bouton) {
+            heureInput.value = bouton.dataset.heure;
+            heureInput.dispatchEvent(new Event('change'));
+        }
+    });
+    
+    medecinSelect.addEventListener('change', chargerCreneaux);
+    dateInput.addEventListener('change', chargerCreneaux);
+    dureeInput.addEventListener('change', chargerCreneaux);
+}
+
 /**
  * Configure la mise à jour rapide du statut des rendez-vous
  */
@@ -112,11 +192,12 @@ function setupStatusUpdate() {
                             'PLANIFIE': 'bg-info',
                             'CONFIRME': 'bg-primary',
                             'TERMINE': 'bg-success',
-                            'ANNULE': 'bg-danger'
+                            'ANNULE': 'bg-danger',
+                            'ABSENT': 'bg-warning'
                         };
                         
                         // Supprimer les classes existantes
-                        statusBadge.classList.remove('bg-info', 'bg-primary', 'bg-success', 'bg-danger');
+                        statusBadge.classList.remove('bg-info', 'bg-primary', 'bg-success', 'bg-danger', 'bg-warning');
                         
                         // Ajouter la nouvelle classe
                         if (statusClasses[newStatus]) {
@@ -167,6 +248,372 @@ function setupStatusUpdate() {
     });
 }
 
+/**
+ * Configure le changement de statut groupé dans la vue du jour : cases
+ * .rdv-select (value = id du rendez-vous), case #rdv-select-all et boutons
+ * .statut-groupe-btn (data-status = statut cible)
+ */
+function setupStatutGroupe() {
+    const cases = Array.from(document.querySelectorAll('.rdv-select'));
+    const boutons = document.querySelectorAll('.statut-groupe-btn');
+    const toutSelectionner = document.getElementById('rdv-select-all');
+    const compteur = document.getElementById('rdv-selection-count');
+    
+    if (cases.length === 0 || boutons.length === 0) {
+        return;
+    }
+    
+    const classesStatut = {
+        'PLANIFIE': 'bg-info',
+        'CONFIRME': 'bg-primary',
+        'TERMINE': 'bg-success',
+        'ANNULE': 'bg-danger',
+        'ABSENT': 'bg-warning'
+    };
+    
+    function selection() {
+        return cases.filter(c => c.checked && !c.disabled).map(c => c.value);
+    }
+    
+    function majActions() {
+        const nombre = selection().length;
+        boutons.forEach(btn => btn.disabled = nombre === 0);
+        if (compteur) {
+            compteur.textContent = nombre;
+        }
+    }
+    
+    if (toutSelectionner) {
+        toutSelectionner.addEventListener('change', function() {
+            cases.forEach(c => {
+                if (!c.disabled) {
+                    c.checked = toutSelectionner.checked;
+                }
+            });
+            majActions();
+        });
+    }
+    cases.forEach(c => c.addEventListener('change', majActions));
+    
+    boutons.forEach(bouton => {
+        bouton.addEventListener('click', function(e) {
+            e.preventDefault();
+            
+            const ids = selection();
+            const statut = this.dataset.status;
+            if (ids.length === 0) {
+                return;
+            }
+            
+            const formData = new FormData();
+            ids.forEach(id => formData.append('ids', id));
+            formData.append('statut', statut);
+            formData.append('csrfmiddlewaretoken', document.querySelector('input[name="csrfmiddlewaretoken"]').value);
+            
+            fetch('/rendezvous/statut-groupe/', {
+                method: 'POST',
+                body: formData,
+                headers: {
+                    'X-Requested-With': 'XMLHttpRequest'
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.resultats) {
+                    alert("Erreur lors de la mise à jour des statuts: " + data.message);
+                    return;
+                }
+                
+                const echecs = [];
+                Object.entries(data.resultats).forEach(([id, resultat]) => {
+                    const caseRdv = cases.find(c => c.value === id);
+                    if (!resultat.success) {
+                        echecs.push(resultat.message);
+                        return;
+                    }
+                    
+                    // Mettre à jour le badge de statut
+                    const badge = document.querySelector(`#rdv-status-${id}`);
+                    if (badge) {
+                        badge.classList.remove('bg-info', 'bg-primary', 'bg-success', 'bg-danger', 'bg-warning');
+                        if (classesStatut[resultat.statut]) {
+                            badge.classList.add(classesStatut[resultat.statut]);
+                        }
+                        badge.textContent = resultat.libelle;
+                    }
+                    
+                    // Un statut terminal ne peut plus être modifié
+                    if (caseRdv && (resultat.statut === 'TERMINE' || resultat.statut === 'ANNULE')) {
+                        caseRdv.checked = false;
+                        caseRdv.disabled = true;
+                        document.querySelectorAll(`.status-update-btn[data-rdv-id="${id}"]`).forEach(btn => btn.disabled = true);
+                    }
+                });
+                
+                if (toutSelectionner) {
+                    toutSelectionner.checked = false;
+                }
+                majActions();
+                
+                if (echecs.length) {
+                    alert(data.message + "\n" + echecs.join("\n"));
+                }
+            })
+            .catch(error => {
+                console.error('Erreur:', error);
+                alert("Une erreur est survenue lors de la mise à jour des statuts.");
+            });
+        });
+    });
+    
+    majActions();
+}
+
+/**
+ * Met à jour en direct les rendez-vous du jour (#rdv-jour, attributs
+ * data-jour, data-medecin et data-intervalle) à partir du flux d'événements
+ * du serveur. Sans flux (serveur WSGI, réponse 204), les rendez-vous du
+ * jour sont interrogés toutes les data-intervalle secondes.
+ * Chaque événement est aussi relayé sur document ("rdv:evenement") pour
+ * les autres panneaux de la page.
+ */
+function setupFluxDirect() {
+    const tableau = document.getElementById('rdv-jour');
+    if (!tableau) {
+        return;
+    }
+    
+    const jour = tableau.dataset.jour;
+    const medecinId = tableau.dataset.medecin || '';
+    const params = new URLSearchParams({jour});
+    if (medecinId) {
+        params.set('medecin', medecinId);
+    }
+    
+    const classesStatut = {
+        'PLANIFIE': 'bg-info',
+        'CONFIRME': 'bg-primary',
+        'TERMINE': 'bg-success',
+        'ANNULE': 'bg-danger',
+        'ABSENT': 'bg-warning'
+    };
+    
+    function surLeTableau(position) {
+        return position.jour === jour && (!medecinId || String(position.medecin_id) === medecinId);
+    }
+    
+    function majBadge(id, statut, libelle) {
+        const badge = document.getElementById(`rdv-status-${id}`);
+        if (badge) {
+            badge.classList.remove('bg-info', 'bg-primary', 'bg-success', 'bg-danger', 'bg-warning');
+            if (classesStatut[statut]) {
+                badge.classList.add(classesStatut[statut]);
+            }
+            badge.textContent = libelle;
+        }
+    }
+    
+    function afficherLigne(ev) {
+        let ligne = document.getElementById(`rdv-row-${ev.id}`);
+        if (!ligne) {
+            ligne = document.createElement('tr');
+            ligne.id = `rdv-row-${ev.id}`;
+        } else {
+            ligne.remove();
+        }
+        ligne.dataset.heure = ev.heure;
+        ligne.innerHTML =
+            `<td>${ev.heure}</td><td>${echapper(ev.patient)}</td><td>${echapper(ev.motif)}</td>` +
+            `<td>${ev.duree} min</td><td><span id="rdv-status-${ev.id}" class="badge"></span></td>`;
+        
+        // Insérer à sa place dans l'ordre des heures
+        const corps = tableau.querySelector('tbody') || tableau;
+        const suivante = Array.from(corps.querySelectorAll('tr[data-heure]')).find(tr => tr.dataset.heure > ev.heure);
+        corps.insertBefore(ligne, suivante || null);
+        majBadge(ev.id, ev.statut, ev.libelle);
+    }
+    
+    function relayer(ev) {
+        document.dispatchEvent(new CustomEvent('rdv:evenement', {detail: ev}));
+    }
+    
+    // Interrogation périodique, revalidée par ETag
+    function interroger() {
+        const intervalle = (parseInt(tableau.dataset.intervalle, 10) || 30) * 1000;
+        let etag = null;
+        
+        function actualiser() {
+            const headers = {'X-Requested-With': 'XMLHttpRequest'};
+            if (etag) {
+                headers['If-None-Match'] = etag;
+            }
+            fetch(`/rendezvous/jour/donnees/?${params.toString()}`, {headers, cache: 'no-store'})
+                .then(response => {
+                    if (response.status === 304 || !response.ok) {
+                        return null;
+                    }
+                    etag = response.headers.get('ETag');
+                    return response.json();
+                })
+                .then(data => {
+                    if (data) {
+                        const presents = new Set(data.rdv.map(ev => `rdv-row-${ev.id}`));
+                        tableau.querySelectorAll('tr[id^="rdv-row-"]').forEach(ligne => {
+                            if (!presents.has(ligne.id)) {
+                                ligne.remove();
+                            }
+                        });
+                        data.rdv.forEach(afficherLigne);
+                    }
+                    // Les files d'attente sont redessinées à chaque passage
+                    document.querySelectorAll('.file-attente[data-medecin]').forEach(file => {
+                        relayer({type: 'file', medecin_id: file.dataset.medecin});
+                    });
+                })
+                .finally(() => setTimeout(actualiser, intervalle));
+        }
+        
+        setTimeout(actualiser, intervalle);
+    }
+    
+    if (!window.EventSource) {
+        interroger();
+        return;
+    }
+    
+    const source = new EventSource(`/rendezvous/flux/?${params.toString()}`);
+    
+    // Flux indisponible (204) : le navigateur ne se reconnecte pas
+    source.addEventListener('error', function() {
+        if (source.readyState === EventSource.CLOSED) {
+            interroger();
+        }
+    });
+    
+    ['cree', 'modifie'].forEach(type => source.addEventListener(type, function(e) {
+        const ev = JSON.parse(e.data);
+        if (surLeTableau(ev)) {
+            afficherLigne(ev);
+        } else {
+            // Rendez-vous déplacé vers un autre jour ou un autre médecin
+            const ligne = document.getElementById(`rdv-row-${ev.id}`);
+            if (ligne) {
+                ligne.remove();
+            }
+        }
+        relayer(ev);
+    }));
+    
+    source.addEventListener('statut', function(e) {
+        const ev = JSON.parse(e.data);
+        majBadge(ev.id, ev.statut, ev.libelle);
+        relayer(ev);
+    });
+    
+    source.addEventListener('supprime', function(e) {
+        const ev = JSON.parse(e.data);
+        const ligne = document.getElementById(`rdv-row-${ev.id}`);
+        if (ligne) {
+            ligne.remove();
+        }
+        relayer(ev);
+    });
+    
+    // File d'attente : traitée par setupFileAttente
+    source.addEventListener('file', function(e) {
+        relayer(JSON.parse(e.data));
+    });
+    
+    // Création groupée (série) : le détail n'est pas transmis, la page est rechargée
+    source.addEventListener('lot', function(e) {
+        const ev = JSON.parse(e.data);
+        relayer(ev);
+        if (surLeTableau(ev)) {
+            window.location.reload();
+        }
+    });
+}
+
+/**
+ * File d'attente du jour : arrivée des patients, triage et appel du suivant.
+ * Chaque file est un élément .file-attente[data-medecin] ; elle est
+ * redessinée après chaque action et à chaque événement "file" du flux direct.
+ */
+function setupFileAttente() {
+    const files = document.querySelectorAll('.file-attente[data-medecin]');
+    const boutonsArrivee = document.querySelectorAll('.btn-arrivee[data-rdv]');
+    if (files.length === 0 && boutonsArrivee.length === 0) {
+        return;
+    }
+    
+    function poster(url, donnees) {
+        const formData = new FormData();
+        Object.entries(donnees).forEach(([cle, valeur]) => formData.append(cle, valeur));
+        formData.append('csrfmiddlewaretoken', document.querySelector('input[name="csrfmiddlewaretoken"]').value);
+        return fetch(url, {
+            method: 'POST',
+            body: formData,
+            headers: {'X-Requested-With': 'XMLHttpRequest'}
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                alert(data.message);
+            } else if (data.file) {
+                afficherFile(data.file);
+            }
+            return data;
+        });
+    }
+    
+    function afficherFile(etat) {
+        const conteneur = document.querySelector(`.file-attente[data-medecin="${etat.medecin_id}"]`);
+        if (!conteneur) {
+            return;
+        }
+        const enCours = etat.en_cours
+            ? `<div class="file-en-cours">En consultation : ${echapper(etat.en_cours.patient)}</div>`
+            : '';
+        const lignes = etat.attente.map(p =>
+            `<li class="list-group-item" data-passage="${p.id}">` +
+            `<span class="badge bg-${p.priorite === 1 ? 'danger' : p.priorite === 2 ? 'warning' : 'secondary'}">${echapper(p.libelle_priorite)}</span> ` +
+            `${echapper(p.patient)} <small>${p.heure_rendez_vous ? 'RDV ' + p.heure_rendez_vous : 'arrivé à ' + p.heure_arrivee}` +
+            ` · ~${p.attente_estimee} min</small></li>`
+        ).join('');
+        conteneur.innerHTML = enCours +
+            `<ol class="list-group">${lignes || '<li class="list-group-item">Aucun patient en attente</li>'}</ol>` +
+            `<small>Durée moyenne d'une consultation : ${etat.duree_moyenne} min</small>`;
+    }
+    
+    function rafraichir(medecinId) {
+        fetch(`/rendezvous/file/?medecin=${medecinId}`, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.json())
+            .then(data => data.success && afficherFile(data.file));
+    }
+    
+    boutonsArrivee.forEach(bouton => bouton.addEventListener('click', function() {
+        poster('/rendezvous/file/arrivee/', {rendez_vous: this.dataset.rdv, priorite: this.dataset.priorite || 3})
+            .then(data => data.success && (this.disabled = true));
+    }));
+    
+    document.querySelectorAll('.btn-appel-suivant[data-medecin]').forEach(bouton => {
+        bouton.addEventListener('click', () => poster('/rendezvous/file/appel/', {medecin: bouton.dataset.medecin}));
+    });
+    
+    // Changement de priorité par la liste .priorite-passage[data-passage]
+    document.addEventListener('change', function(e) {
+        if (e.target.matches('.priorite-passage[data-passage]')) {
+            poster(`/rendezvous/file/${e.target.dataset.passage}/triage/`, {priorite: e.target.value});
+        }
+    });
+    
+    document.addEventListener('rdv:evenement', function(e) {
+        if (e.detail.type === 'file') {
+            rafraichir(e.detail.medecin_id);
+        }
+    });
+}
+
 /**
  * Configure les sélecteurs de date et d'heure
  */
@@ -197,13 +644,184 @@ function setupDateTimePickers() {
 /**
  * Fonctions pour le calendrier des rendez-vous
  */
+// Mois déjà chargés : clé des paramètres -> {etag, data}
+const moisCalendrier = new Map();
+
+// Calendrier affiché par setupCalendrier, s'il est présent sur la page
+let calendrierCourant = null;
+
+const CLASSES_STATUT = {
+    PLANIFIE: 'bg-primary',
+    CONFIRME: 'bg-success',
+    TERMINE: 'bg-secondary',
+    ANNULE: 'bg-danger',
+    ABSENT: 'bg-warning'
+};
+
+// Charge un mois du flux JSON, en revalidant par ETag un mois déjà en mémoire
+function chargerMois(year, month, medecinId) {
+    const params = new URLSearchParams({year, month});
+    if (medecinId) {
+        params.set('medecin', medecinId);
+    }
+    const cle = params.toString();
+    const enCache = moisCalendrier.get(cle);
+    
+    const headers = {'X-Requested-With': 'XMLHttpRequest'};
+    if (enCache) {
+        headers['If-None-Match'] = enCache.etag;
+    }
+    
+    return fetch(`/rendezvous/calendrier/donnees/?${cle}`, {headers, cache: 'no-store'})
+        .then(response => {
+            if (response.status === 304 && enCache) {
+                return enCache.data;
+            }
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.json().then(data => {
+                moisCalendrier.set(cle, {etag: response.headers.get('ETag'), data});
+                return data;
+            });
+        });
+}
+
+/**
+ * Affiche le calendrier dans #calendrier-rdv (attributs data-year, data-month
+ * et data-medecin) et remplace la navigation par des chargements JSON
+ */
+function setupCalendrier() {
+    const conteneur = document.getElementById('calendrier-rdv');
+    if (!conteneur) {
+        return;
+    }
+    
+    calendrierCourant = {
+        year: parseInt(conteneur.dataset.year, 10),
+        month: parseInt(conteneur.dataset.month, 10),
+        medecinId: conteneur.dataset.medecin || '',
+        afficher: afficherMois
+    };
+    
+    function cellule(jour, data, parJour) {
+        const iso = `${data.year}-${String(data.month).padStart(2, '0')}-${String(jour).padStart(2, '0')}`;
+        const rdvs = parJour[iso] || [];
+        const nombre = data.jours[iso] || 0;
+        const badge = nombre ? `<span class="badge bg-info float-end">${nombre}</span>` : '';
+        const liste = rdvs.map(([id, debut, duree, statut, initiales]) =>
+            `<div class="badge ${CLASSES_STATUT[statut] || 'bg-light'} d-block text-start mb-1 rdv-item" role="button" data-rdv="${id}">` +
+            `${debut.slice(11)} ${echapper(initiales)} (${duree} min)</div>`
+        ).join('');
+        return `<td data-jour="${iso}"><div class="fw-bold">${jour}${badge}</div>${liste}</td>`;
+    }
+    
+    function dessiner(data) {
+        const parJour = {};
+        data.rdv.forEach(rdv => {
+            const jour = rdv[1].slice(0, 10);
+            (parJour[jour] = parJour[jour] || []).push(rdv);
+        });
+        
+        // Semaines commençant le lundi
+        const decalage = (new Date(data.year, data.month - 1, 1).getDay() + 6) % 7;
+        const nombreJours = new Date(data.year, data.month, 0).getDate();
+        const cellules = [];
+        for (let i = 0; i < decalage; i++) {
+            cellules.push('<td></td>');
+        }
+        for (let jour = 1; jour <= nombreJours; jour++) {
+            cellules.push(cellule(jour, data, parJour));
+        }
+        while (cellules.length % 7) {
+            cellules.push('<td></td>');
+        }
+        
+        const semaines = [];
+        for (let i = 0; i < cellules.length; i += 7) {
+            semaines.push(`<tr>${cellules.slice(i, i + 7).join('')}</tr>`);
+        }
+        const entetes = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim'].map(j => `<th>${j}</th>`).join('');
+        conteneur.innerHTML = `<table class="table table-bordered calendrier"><thead><tr>${entetes}</tr></thead><tbody>${semaines.join('')}</tbody></table>`;
+    }
+    
+    function afficherMois(year, month, medecinId) {
+        calendrierCourant.year = year;
+        calendrierCourant.month = month;
+        calendrierCourant.medecinId = medecinId;
+        
+        const params = new URLSearchParams({year, month});
+        if (medecinId) {
+            params.set('medecin', medecinId);
+        }
+        history.replaceState(null, '', `/rendezvous/calendrier/?${params.toString()}`);
+        
+        const titre = document.getElementById('calendrier-titre');
+        if (titre) {
+            titre.textContent = new Date(year, month - 1, 1).toLocaleDateString('fr-FR', {month: 'long', year: 'numeric'});
+        }
+        
+        chargerMois(year, month, medecinId)
+            .then(data => {
+                // Ignorer une réponse arrivée après un autre changement de mois
+                if (calendrierCourant.year !== year || calendrierCourant.month !== month) {
+                    return;
+                }
+                dessiner(data);
+                
+                // Précharger les mois voisins pour une navigation immédiate
+                const precedent = month > 1 ? [year, month - 1] : [year - 1, 12];
+                const suivant = month < 12 ? [year, month + 1] : [year + 1, 1];
+                [precedent, suivant].forEach(([y, m]) => chargerMois(y, m, medecinId).catch(() => {}));
+            })
+            .catch(error => {
+                console.error('Erreur:', error);
+                conteneur.innerHTML = '<div class="alert alert-warning">Erreur lors du chargement du calendrier</div>';
+            });
+    }
+    
+    conteneur.addEventListener('click', function(e) {
+        const item = e.target.closest('.rdv-item');
+        if (item) {
+            showRdvDetails(item.dataset.rdv);
+        }
+    });
+    
+    afficherMois(calendrierCourant.year, calendrierCourant.month, calendrierCourant.medecinId);
+}
+
+// Échappe un texte avant de l'insérer dans du HTML
+function echapper(texte) {
+    const div = document.createElement('div');
+    div.textContent = texte;
+    return div.innerHTML;
+}
+
 // Fonction pour naviguer entre les mois du calendrier
 function changeMonth(year, month) {
+    if (calendrierCourant) {
+        calendrierCourant.afficher(year, month, calendrierCourant.medecinId);
+        return;
+    }
     window.location.href = `/rendezvous/calendrier/?year=${year}&month=${month}`;
 }
 
+// Fonction pour avancer ou reculer d'un nombre de mois depuis le mois affiché
+function navigateMonth(delta) {
+    const urlParams = new URLSearchParams(window.location.search);
+    const aujourdhui = new Date();
+    const year = calendrierCourant ? calendrierCourant.year : parseInt(urlParams.get('year') || aujourdhui.getFullYear(), 10);
+    const month = calendrierCourant ? calendrierCourant.month : parseInt(urlParams.get('month') || aujourdhui.getMonth() + 1, 10);
+    const cible = new Date(year, month - 1 + delta, 1);
+    changeMonth(cible.getFullYear(), cible.getMonth() + 1);
+}
+
 // Fonction pour filtrer par médecin dans le calendrier
 function filterByMedecin(medecinId) {
+    if (calendrierCourant) {
+        calendrierCourant.afficher(calendrierCourant.year, calendrierCourant.month, medecinId);
+        return;
+    }
     const urlParams = new URLSearchParams(window.location.search);
     urlParams.set('medecin', medecinId);
     window.location.href = `/rendezvous/calendrier/?${urlParams.toString()}`;